@@ -0,0 +1,229 @@
+# Load harness for the uppercase echo servers
+# Drives tcp_server/uppercase_server.py and udp_server/udp_uppercase_server.py
+
+from socket import socket, AF_INET, SOCK_STREAM, SOCK_DGRAM, IPPROTO_TCP, TCP_NODELAY
+from socket import timeout as socket_timeout
+import threading
+import time
+
+class EchoHarness:
+    """ Client side load harness for the TCP and UDP uppercase servers.
+        Runs 'concurrency' clients in threads, each with its own socket,
+        sending requests of a given size and verifying that every reply
+        is the request in upper case. With a rate set, requests follow a
+        fixed schedule and latency is measured from the scheduled send
+        time, so a slow server is not hidden by clients waiting for it. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._server_name = "127.0.0.1"
+        self._server_port = 12000
+        self._transport = "tcp"
+        self._concurrency = 1
+        self._request_size = 64     # bytes, newline included for TCP
+        self._requests = 1000       # total, shared by the clients
+        self._rate = 0              # total requests/s, 0 = as fast as possible
+        self._timeout = 1           # seconds to wait for a reply
+        self._lock = threading.Lock()
+        self._latencies = []        # seconds, of all clients in the last run
+        self._counts = {}
+
+    def set_server(self, name, port):
+        self._server_name = name
+        self._server_port = port
+        return self
+
+    def set_transport(self, transport):
+        """ 'tcp' or 'udp' """
+        if transport not in ("tcp", "udp"):
+            raise ValueError(f"Unknown transport: {transport}")
+        self._transport = transport
+        return self
+
+    def set_concurrency(self, concurrency):
+        self._concurrency = concurrency
+        return self
+
+    def set_request_size(self, size):
+        if size < 20:
+            raise ValueError("Request size must be at least 20 bytes")
+        self._request_size = size
+        return self
+
+    def set_requests(self, requests):
+        self._requests = requests
+        return self
+
+    def set_rate(self, rate):
+        self._rate = rate
+        return self
+
+    def set_timeout(self, timeout):
+        self._timeout = timeout     # seconds
+        return self
+
+    def run(self):
+        """ Run all clients, return report """
+        self._latencies = []
+        self._counts = {"ok": 0, "mismatch": 0, "timeout": 0, "error": 0}
+
+        per_client = [
+            self._requests // self._concurrency + (1 if i < self._requests % self._concurrency else 0)
+            for i in range(self._concurrency)
+        ]
+        client_rate = self._rate / self._concurrency if self._rate else 0
+        target = self._tcp_client if self._transport == "tcp" else self._udp_client
+
+        start = time.perf_counter() + 0.1   # common schedule start
+        clients = [
+            threading.Thread(target=target, args=(index, count, client_rate, start))
+            for index, count in enumerate(per_client)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        duration = time.perf_counter() - start
+
+        report = self._report(duration)
+        self._print_status(report)
+        return report
+
+    def _request(self, client, seq):
+        """ Unique request of the configured size, lower case """
+        head = b"%06d:%08d:" % (client, seq)
+        size = self._request_size - (1 if self._transport == "tcp" else 0)
+        request = head + b"x" * (size - len(head))
+        return request + b"\n" if self._transport == "tcp" else request
+
+    def _schedule(self, rate, start, seq):
+        """ Scheduled send time of request seq, waiting for it if ahead.
+            Without a rate, every request is due at start """
+        due = start + seq / rate if rate else start
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return due if rate else time.perf_counter()
+
+    def _tcp_client(self, client, count, rate, start):
+        """ One persistent connection, one request at a time """
+        latencies = []
+        counts = {"ok": 0, "mismatch": 0, "timeout": 0, "error": 0}
+        try:
+            sock = socket(AF_INET, SOCK_STREAM)
+            sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+            sock.settimeout(self._timeout)
+            sock.connect((self._server_name, self._server_port))
+        except OSError:
+            counts["error"] += count
+            self._merge(latencies, counts)
+            return
+
+        with sock:
+            buffer = bytearray()
+            for seq in range(count):
+                request = self._request(client, seq)
+                sent = self._schedule(rate, start, seq)
+                try:
+                    sock.sendall(request)
+                    while b"\n" not in buffer:
+                        data = sock.recv(65536)
+                        if not data:
+                            raise ConnectionError("Server closed connection")
+                        buffer += data
+                except socket_timeout:
+                    counts["timeout"] += count - seq
+                    break
+                except OSError:
+                    counts["error"] += count - seq
+                    break
+                end = buffer.index(b"\n") + 1
+                reply = bytes(buffer[:end])
+                del buffer[:end]
+                latencies.append(time.perf_counter() - sent)
+                counts["ok" if reply == request.upper() else "mismatch"] += 1
+
+        self._merge(latencies, counts)
+
+    def _udp_client(self, client, count, rate, start):
+        """ One socket, one request at a time, lost replies time out """
+        latencies = []
+        counts = {"ok": 0, "mismatch": 0, "timeout": 0, "error": 0}
+        address = (self._server_name, self._server_port)
+
+        with socket(AF_INET, SOCK_DGRAM) as sock:
+            for seq in range(count):
+                request = self._request(client, seq)
+                expected = request.upper()
+                sent = self._schedule(rate, start, seq)
+                deadline = time.perf_counter() + self._timeout
+                try:
+                    sock.sendto(request, address)
+                    while True:
+                        # skip late replies to earlier requests
+                        sock.settimeout(max(0.0001, deadline - time.perf_counter()))
+                        reply, _ = sock.recvfrom(65536)
+                        if reply[:16] == expected[:16]:
+                            break
+                except socket_timeout:
+                    counts["timeout"] += 1
+                    continue
+                except OSError:
+                    counts["error"] += 1
+                    continue
+                latencies.append(time.perf_counter() - sent)
+                counts["ok" if reply == expected else "mismatch"] += 1
+
+        self._merge(latencies, counts)
+
+    def _merge(self, latencies, counts):
+        """ Add results of one client """
+        with self._lock:
+            self._latencies.extend(latencies)
+            for key, value in counts.items():
+                self._counts[key] += value
+
+    def _report(self, duration):
+        latencies = sorted(self._latencies)
+        answered = len(latencies)
+        return {
+            "transport": self._transport,
+            "concurrency": self._concurrency,
+            "request_size": self._request_size,
+            "requests": self._requests,
+            "duration": duration,
+            "throughput": answered / duration if duration > 0 else 0.0,
+            "ok": self._counts["ok"],
+            "mismatch": self._counts["mismatch"],
+            "timeouts": self._counts["timeout"],
+            "errors": self._counts["error"],
+            "latency_p50": percentile(latencies, 50),
+            "latency_p90": percentile(latencies, 90),
+            "latency_p99": percentile(latencies, 99),
+            "latency_p999": percentile(latencies, 99.9),
+        }
+
+    def _print_status(self, report):
+        print(f"{report['transport']}: {report['requests']} requests of {report['request_size']} bytes, "
+              f"{report['concurrency']} clients, {report['duration']:.2f}s")
+        print(f"Throughput: {report['throughput']:.0f} requests/s, ok: {report['ok']}, "
+              f"mismatch: {report['mismatch']}, timeouts: {report['timeouts']}, errors: {report['errors']}")
+        print("Latency p50/p90/p99/p999: " + "/".join(
+            f"{report[key] * 1e3:.3f}" for key in ("latency_p50", "latency_p90", "latency_p99", "latency_p999")
+        ) + "ms")
+
+
+def percentile(sorted_values, p):
+    """ Nearest rank percentile of an already sorted list, 0.0 if empty """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+if __name__ == "__main__":
+    for transport in ("tcp", "udp"):
+        harness = EchoHarness()
+        harness.set_server("127.0.0.1", 12000).set_transport(transport)
+        harness.set_concurrency(16).set_requests(20000).set_request_size(64)
+        harness.run()
@@ -17,12 +17,12 @@ sentence = input('Input lowercase sentence: ')
 
 # send text over the TCP connection
 # there's no need to specify server name & port
-# sentence converted to bytes
-clientSocket.send(sentence.encode())
+# sentence converted to bytes, newline terminated (see tcp_server/uppercase_server.py)
+clientSocket.send((sentence + '\n').encode())
 
 # get modified sentence back from server
 modifiedSentence = clientSocket.recv(1024)
-print ('From Server:', modifiedSentence.decode())
+print ('From Server:', modifiedSentence.decode().rstrip('\n'))
 
 # close the TCP connection
 clientSocket.close()
@@ -0,0 +1,295 @@
+# Concurrent TCP uppercase server
+# Built around the course book TCP server (TCPserver.py)
+
+from concurrent.futures import ThreadPoolExecutor
+import selectors
+from socket import socket, socketpair, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, SHUT_RDWR
+import threading
+import time
+
+class _Connection:
+    """ Buffers of one client connection in selector mode """
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.closing = False    # close when outbuf is sent
+
+
+class UppercaseServer:
+    """ Concurrent TCP uppercase server.
+        Clients send newline terminated sentences over a persistent
+        connection, and get each one back in upper case, newline terminated.
+        A sentence left without newline when the client shuts down
+        its side of the connection is answered as well.
+        Mode 'threads' serves each connection from a bounded thread pool,
+        one worker per connection for its whole lifetime, and refuses
+        connections while all workers are taken (64 by default).
+        Mode 'selector' serves all connections from one thread
+        with a selectors event loop, and stops reading from a client
+        while its unsent replies exceed a high-water mark.
+        Use 'selector' for thousands of concurrent clients,
+        'threads' is limited to as many clients as workers. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._port = 12000
+        self._mode = "threads"
+        self._workers = 64
+        self._backlog = 1024
+        self._max_request = 65536   # bytes, longer sentences close the connection
+        self._recv_size = 65536
+        self._max_output = 1048576  # bytes of unsent replies before reading pauses (selector mode)
+        self._socket = None
+        self._selector = None
+        self._wakeup = None         # (read, write) socket pair to interrupt select
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._active = set()        # open connection sockets (threads mode)
+        self._connections = 0
+        self._refused = 0
+        self._requests = 0
+
+    def set_port(self, port):
+        self._port = port
+        return self
+
+    def set_mode(self, mode):
+        """ 'threads' (at most set_workers() concurrent clients)
+            or 'selector' (thousands of concurrent clients) """
+        if mode not in ("threads", "selector"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self._mode = mode
+        return self
+
+    def set_workers(self, workers):
+        """ Thread pool size, the max number of open connections in threads mode.
+            A worker serves one connection until it closes,
+            connections beyond the limit are closed right after accept """
+        self._workers = workers
+        return self
+
+    def set_backlog(self, backlog):
+        self._backlog = backlog
+        return self
+
+    def set_max_request_size(self, size):
+        self._max_request = size
+        return self
+
+    def set_max_output(self, size):
+        """ Selector mode: unsent reply bytes of one client before
+            the server stops reading its requests, until the client reads """
+        self._max_output = size
+        return self
+
+    def serve(self, timeout=None):
+        """ Serve clients until stop(), or until timeout (seconds) if set """
+        self._stopped = False
+        self._socket = socket(AF_INET, SOCK_STREAM)
+        self._socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self._socket.bind(("", self._port))
+        self._socket.listen(self._backlog)
+        self._socket.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+        self._wakeup = socketpair()
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ, "wakeup")
+        self._selector.register(self._socket, selectors.EVENT_READ, "accept")
+
+        print(f"The TCP server is ready to receive ({self._mode} mode, port {self._port})")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            if self._mode == "threads":
+                with ThreadPoolExecutor(self._workers) as pool:
+                    self._event_loop(deadline, pool)
+                    self._shutdown_active()
+            else:
+                self._event_loop(deadline)
+        finally:
+            self._close()
+            self._print_status()
+
+    def stop(self):
+        """ Stop serving, safe to call from another thread """
+        self._stopped = True
+        if self._wakeup:
+            try:
+                self._wakeup[1].send(b"\0")
+            except OSError:
+                pass    # already closed
+
+    def _event_loop(self, deadline, pool=None):
+        """ Wait for events until stopped or deadline.
+            With a pool, accepted connections are handed to it,
+            else they are served by this loop """
+        while not self._stopped:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+            for key, events in self._selector.select(remaining):
+                if key.data == "wakeup":
+                    key.fileobj.recv(64)
+                elif key.data == "accept":
+                    self._accept(pool)
+                else:
+                    self._on_event(key.data, events)
+
+    def _accept(self, pool):
+        """ Accept all pending connections """
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            self._connections += 1
+            if pool:
+                with self._lock:
+                    full = len(self._active) >= self._workers
+                    if not full:
+                        self._active.add(conn)
+                if full:
+                    # no free worker, the connection would hang unserved
+                    self._refused += 1
+                    conn.close()
+                    continue
+                conn.setblocking(True)
+                pool.submit(self._handle_connection, conn)
+            else:
+                conn.setblocking(False)
+                self._selector.register(conn, selectors.EVENT_READ, _Connection(conn))
+
+    def _handle_connection(self, conn):
+        """ Threads mode: serve one connection until client closes it """
+        buffer = bytearray()
+        try:
+            while True:
+                data = conn.recv(self._recv_size)
+                if not data:
+                    if buffer:
+                        conn.sendall(self._uppercase(bytes(buffer)))
+                        self._count_requests(1)
+                    break
+                buffer += data
+                reply = self._take_requests(buffer)
+                if reply is None:
+                    break   # request too long
+                if reply:
+                    conn.sendall(reply)
+        except OSError:
+            pass    # client reset, or server stopped
+        finally:
+            with self._lock:
+                self._active.discard(conn)
+            conn.close()
+
+    def _on_event(self, connection, events):
+        """ Selector mode: read requests and write replies without blocking """
+        if events & selectors.EVENT_READ and not connection.closing \
+                and len(connection.outbuf) < self._max_output:
+            try:
+                data = connection.socket.recv(self._recv_size)
+            except (BlockingIOError, InterruptedError):
+                data = None
+            except OSError:
+                self._drop(connection)
+                return
+
+            if data == b"":
+                # client closed its side, answer what is left and close
+                if connection.inbuf:
+                    connection.outbuf += self._uppercase(bytes(connection.inbuf))
+                    self._count_requests(1)
+                    connection.inbuf.clear()
+                connection.closing = True
+            elif data:
+                connection.inbuf += data
+                reply = self._take_requests(connection.inbuf)
+                if reply is None:
+                    self._drop(connection)
+                    return
+                connection.outbuf += reply
+
+        if connection.outbuf:
+            try:
+                sent = connection.socket.send(connection.outbuf)
+                del connection.outbuf[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self._drop(connection)
+                return
+
+        if connection.closing and not connection.outbuf:
+            self._drop(connection)
+            return
+
+        # only ask for write events while there is something to write,
+        # and for read events while the client keeps up with the replies.
+        # A client at end of file is always readable, so not after that
+        wanted = selectors.EVENT_WRITE if connection.outbuf else 0
+        if not connection.closing and len(connection.outbuf) < self._max_output:
+            wanted |= selectors.EVENT_READ
+        if self._selector.get_key(connection.socket).events != wanted:
+            self._selector.modify(connection.socket, wanted, connection)
+
+    def _drop(self, connection):
+        self._selector.unregister(connection.socket)
+        connection.socket.close()
+
+    def _take_requests(self, buffer):
+        """ Remove all complete requests from buffer, return their replies.
+            Return None if an incomplete request is longer than allowed """
+        end = buffer.rfind(b"\n") + 1
+        if not end:
+            return None if len(buffer) > self._max_request else b""
+        requests = bytes(buffer[:end])
+        del buffer[:end]
+        if len(buffer) > self._max_request:
+            return None
+        self._count_requests(requests.count(b"\n"))
+        # all complete requests are converted in one go, newlines are kept
+        return self._uppercase(requests)
+
+    def _uppercase(self, data):
+        """ Convert to upper case like str.upper, keeping undecodable bytes """
+        return data.decode("utf-8", "surrogateescape").upper().encode("utf-8", "surrogateescape")
+
+    def _count_requests(self, count):
+        with self._lock:
+            self._requests += count
+
+    def _shutdown_active(self):
+        """ Threads mode: wake workers blocked in recv on open connections """
+        with self._lock:
+            active = list(self._active)
+        for conn in active:
+            try:
+                conn.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _close(self):
+        """ Close all sockets """
+        for key in list(self._selector.get_map().values()):
+            key.fileobj.close()
+        self._selector.close()
+        self._wakeup[1].close()
+        self._wakeup = None
+        print("Sockets closed")
+
+    def _print_status(self):
+        print(f"Connections: {self._connections}, refused: {self._refused}, requests: {self._requests}")
+
+
+if __name__ == "__main__":
+    server = UppercaseServer()
+    server.set_mode("selector")     # thousands of clients, 'threads' serves set_workers() at most
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
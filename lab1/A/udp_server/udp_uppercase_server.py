@@ -0,0 +1,168 @@
+# High-throughput UDP uppercase server
+# Built around the course book UDP server (UDPserver.py)
+
+from multiprocessing import Event, Process, Queue
+from multiprocessing.sharedctypes import RawArray
+import socket
+from socket import AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_REUSEADDR
+import time
+from queue import Empty
+
+class UDPUppercaseServer:
+    """ UDP uppercase server for load tests.
+        Works on bytes (bytes.upper, ASCII only), with no console output
+        per datagram. Runs N worker processes, each with its own socket
+        bound to the same port with SO_REUSEPORT, so the kernel
+        balances datagrams across cores. The main process prints
+        aggregate counters every report interval instead.
+        serve() raises OSError if a worker fails to bind. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._port = 12000
+        self._workers = 1
+        self._report_interval = 1     # seconds, 0 = no reports
+        self._verbose = False
+        self._bufsize = 2048
+        self._counters = None         # packets and bytes per worker
+        self._stop_event = None
+        self._ready = None            # bind result of every worker
+
+    def set_port(self, port):
+        self._port = port
+        return self
+
+    def set_workers(self, workers):
+        """ Number of worker processes, more than 1 needs SO_REUSEPORT """
+        if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+            raise ValueError("SO_REUSEPORT not supported, use 1 worker")
+        self._workers = workers
+        return self
+
+    def set_report_interval(self, interval):
+        self._report_interval = interval
+        return self
+
+    def set_verbose(self, verbose=True):
+        """ Print every datagram like the course book server (debugging only) """
+        self._verbose = verbose
+        return self
+
+    def serve(self, timeout=None):
+        """ Serve until stop(), Ctrl-C, or timeout (seconds) if set """
+        self._counters = RawArray("Q", 2 * self._workers)
+        self._stop_event = Event()
+        self._ready = Queue()
+        workers = [
+            Process(target=self._work, args=(index,), daemon=True)
+            for index in range(self._workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            self._wait_ready(workers)
+            print(f"The UDP server is ready to receive ({self._workers} workers, port {self._port})")
+
+            deadline = None if timeout is None else time.monotonic() + timeout
+            last_packets, last_bytes = 0, 0
+            last_time = time.monotonic()
+            while not self._stop_event.is_set():
+                wait = self._report_interval or 1
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        break
+                self._stop_event.wait(wait)
+                if self._report_interval:
+                    packets, data = self._totals()
+                    now = time.monotonic()
+                    elapsed = now - last_time   # less than wait if stopped early
+                    print(f"{packets} packets, {data} bytes, "
+                          f"{(packets - last_packets) / elapsed:.0f} packets/s, "
+                          f"{(data - last_bytes) * 8 / elapsed / 1e6:.1f} Mbit/s")
+                    last_packets, last_bytes, last_time = packets, data, now
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+            packets, data = self._totals()
+            print(f"Total: {packets} packets, {data} bytes")
+
+    def stop(self):
+        """ Stop serving, safe to call from another thread """
+        if self._stop_event:
+            self._stop_event.set()
+
+    def get_totals(self):
+        """ Packets and bytes echoed so far, by all workers """
+        return self._totals()
+
+    def _wait_ready(self, workers):
+        """ Wait until every worker has bound its socket.
+            Raise OSError for a worker that failed to bind, or exited
+            without reporting """
+        ready = set()
+        while len(ready) < len(workers):
+            try:
+                index, error = self._ready.get(timeout=1)
+            except Empty:
+                for index, worker in enumerate(workers):
+                    if index not in ready and worker.exitcode is not None:
+                        raise OSError(f"Worker {index} exited with code {worker.exitcode}")
+                continue
+            if error:
+                raise OSError(f"Worker {index} could not bind port {self._port}: {error}")
+            ready.add(index)
+
+    def _totals(self):
+        counters = self._counters
+        return sum(counters[0::2]), sum(counters[1::2])
+
+    def _create_socket(self):
+        """ UDP socket bound to port, shared with other workers """
+        server_socket = socket.socket(AF_INET, SOCK_DGRAM)
+        server_socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            server_socket.setsockopt(SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server_socket.bind(("", self._port))
+        return server_socket
+
+    def _work(self, index):
+        """ Worker process: echo datagrams in upper case until terminated.
+            Reports its bind result to the main process first """
+        try:
+            server_socket = self._create_socket()
+        except OSError as e:
+            self._ready.put((index, str(e)))
+            return
+        self._ready.put((index, None))
+        recvfrom = server_socket.recvfrom
+        sendto = server_socket.sendto
+        counters = self._counters
+        packets_slot, bytes_slot = 2 * index, 2 * index + 1
+        bufsize = self._bufsize
+
+        if self._verbose:
+            while True:
+                message, client_address = recvfrom(bufsize)
+                print(message.decode(errors="replace"))
+                print(client_address)
+                sendto(message.upper(), client_address)
+                counters[packets_slot] += 1
+                counters[bytes_slot] += len(message)
+
+        while True:
+            message, client_address = recvfrom(bufsize)
+            sendto(message.upper(), client_address)
+            counters[packets_slot] += 1
+            counters[bytes_slot] += len(message)
+
+
+if __name__ == "__main__":
+    server = UDPUppercaseServer()
+    server.set_workers(4)
+    server.serve()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+import asyncio
+import time
+from custom_web_browser import CustomWebBrowser
+from http_response import HTTPResponseParser
+
+class AsyncFetcher:
+    """ Concurrent batch fetcher on asyncio.
+        Fetches a list of (host, path, query) with at most concurrency
+        requests in flight, and at most per_host connections to each host.
+        Connections are kept alive and reused within a host.
+        Requests are built by CustomWebBrowser, so they look the same
+        on the wire. Failed requests are retried, and results come back
+        as (request, HTTPResponse or exception) as they complete. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._browser = CustomWebBrowser()
+        self._port = 80
+        self._concurrency = 100
+        self._per_host = 6
+        self._timeout = 10          # seconds per attempt
+        self._retries = 2
+        self._retry_delay = 0.1     # seconds, doubled per retry
+        self._recv_size = 65536
+        self._attempt_delay = 0.25  # seconds, Happy Eyeballs (RFC 8305)
+        self._host_limits = {}      # host -> Semaphore
+        self._idle = {}             # host -> list of (reader, writer)
+        self._requests = 0
+        self._failures = 0
+        self._retried = 0
+        self._connections = 0
+
+    def set_browser(self, browser):
+        """ Browser whose headers are used for the requests """
+        self._browser = browser
+        return self
+
+    def set_port(self, port):
+        self._port = port
+        return self
+
+    def set_concurrency(self, concurrency):
+        """ Max requests in flight in total """
+        self._concurrency = concurrency
+        return self
+
+    def set_per_host(self, per_host):
+        """ Max connections (and requests in flight) per host """
+        self._per_host = per_host
+        return self
+
+    def set_timeout(self, timeout):
+        self._timeout = timeout     # seconds per attempt
+        return self
+
+    def set_retries(self, retries):
+        self._retries = retries
+        return self
+
+    async def fetch(self, requests):
+        """ Async generator of (request, response or exception), in completion order """
+        limit = asyncio.Semaphore(self._concurrency)
+        self._host_limits = {}
+        tasks = [asyncio.create_task(self._fetch_one(request, limit)) for request in requests]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._close_idle()
+
+    def run(self, requests, callback=None):
+        """ Fetch requests, return list of (request, response or exception)
+            in completion order. callback(request, result) is called
+            for each as it completes """
+        async def collect():
+            results = []
+            async for request, result in self.fetch(requests):
+                if callback:
+                    callback(request, result)
+                results.append((request, result))
+            return results
+
+        started = time.perf_counter()
+        results = asyncio.run(collect())
+        self._print_status(time.perf_counter() - started)
+        return results
+
+    async def _fetch_one(self, request, limit):
+        """ Fetch one request with retries, return (request, result) """
+        host, path, query = request
+        host_limit = self._host_limits.get(host)
+        if host_limit is None:
+            host_limit = self._host_limits[host] = asyncio.Semaphore(self._per_host)
+
+        error = None
+        for attempt in range(self._retries + 1):
+            if attempt:
+                self._retried += 1
+                await asyncio.sleep(self._retry_delay * 2 ** (attempt - 1))
+            try:
+                async with limit, host_limit:
+                    response = await asyncio.wait_for(self._exchange(host, path, query), self._timeout)
+                self._requests += 1
+                return request, response
+            except (OSError, ValueError, asyncio.TimeoutError) as exc:
+                error = exc
+        self._failures += 1
+        return request, error
+
+    async def _exchange(self, host, path, query):
+        """ Send request and read response on a pooled or new connection.
+            A pooled connection closed by the server is replaced once """
+        header = self._browser._build_header(host, path, query, conn="keep-alive").encode()
+        while True:
+            reader, writer, reused = await self._connect(host)
+            try:
+                writer.write(header)
+                await writer.drain()
+                parser = HTTPResponseParser()
+                received = False
+                while not parser.is_complete():
+                    data = await reader.read(self._recv_size)
+                    if not data:
+                        if reused and not received:
+                            break   # stale connection
+                        parser.feed_eof()
+                        break
+                    received = True
+                    parser.feed(data)
+            except BaseException:
+                writer.close()
+                raise
+
+            if not parser.is_complete():
+                writer.close()
+                continue
+            response = parser.get_response()
+            if response.keep_alive() and not parser.unused():
+                self._idle.setdefault(host, []).append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    async def _connect(self, host):
+        """ Return (reader, writer, reused) """
+        idle = self._idle.get(host)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(
+            host,
+            self._port,
+            happy_eyeballs_delay=self._attempt_delay,
+            interleave=1
+        )
+        self._connections += 1
+        return reader, writer, False
+
+    def _close_idle(self):
+        for idle in self._idle.values():
+            for _, writer in idle:
+                writer.close()
+        self._idle = {}
+
+    def get_stats(self):
+        return {
+            "requests": self._requests,
+            "failures": self._failures,
+            "retries": self._retried,
+            "connections": self._connections,
+        }
+
+    def _print_status(self, elapsed):
+        stats = self.get_stats()
+        rate = stats["requests"] / elapsed if elapsed else 0.0
+        print(f"{stats['requests']} responses, {stats['failures']} failed, "
+              f"{stats['retries']} retries, {stats['connections']} connections "
+              f"in {elapsed:.2f}s ({rate:.1f} req/s)")
+
+
+if __name__ == "__main__":
+    host = "www.ingonline.nu"
+    path = "/tictactoe/index.php"
+    boards = ["xeeeeeeee", "xoeeeeeee", "xoxeeeeee", "xoxoeeeee", "xoxoxeeee", "xoxoxoeee"]
+
+    fetcher = AsyncFetcher()
+    fetcher.set_per_host(4)
+    requests = [(host, path, f"?board={board}") for board in boards]
+    fetcher.run(requests, lambda request, result: print(request[2], result))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import select
+from socket import MSG_PEEK
+import threading
+import time
+from resolver import Resolver, happy_eyeballs_connect
+
+class Connection:
+    """ TCP connection to a host, with bytes received past the last response """
+
+    def __init__(self, host, port, sock):
+        """ Set host, port and connected socket """
+        self.host = host
+        self.port = port
+        self.socket = sock
+        self.leftover = b""         # start of the next response (pipelining)
+        self.requests = 0           # responses read on this connection
+        self.last_used = time.monotonic()
+
+    def is_reused(self):
+        """ True if a response has already been read on this connection """
+        return self.requests > 0
+
+    def is_alive(self):
+        """ False if server closed an idle connection (readable with no data) """
+        try:
+            readable, _, _ = select.select([self.socket], [], [], 0)
+            if not readable:
+                return True
+            return bool(self.socket.recv(1, MSG_PEEK))
+        except (OSError, ValueError):
+            return False
+
+    def close(self):
+        self.socket.close()
+
+
+class ConnectionPool:
+    """ Idle keep-alive connections per (host, port).
+        acquire() returns an idle connection if one is still open,
+        else connects. release() puts a connection back for reuse,
+        or closes it. Safe to share between threads. """
+
+    def __init__(self, max_idle_per_host=4, idle_timeout=30):
+        """ Set limits, idle_timeout in seconds """
+        self._max_idle = max_idle_per_host
+        self._idle_timeout = idle_timeout
+        self._connect_timeout = 10
+        self._attempt_delay = 0.25  # seconds between Happy Eyeballs attempts
+        self._resolver = Resolver()
+        self._idle = {}             # (host, port) -> list of Connection
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._reused = 0
+
+    def set_connect_timeout(self, timeout):
+        self._connect_timeout = timeout     # seconds
+        return self
+
+    def set_attempt_delay(self, delay):
+        """ Seconds before racing the next address, see happy_eyeballs_connect """
+        self._attempt_delay = delay
+        return self
+
+    def set_resolver(self, resolver):
+        self._resolver = resolver
+        return self
+
+    def get_resolver(self):
+        return self._resolver
+
+    def acquire(self, host, port=80):
+        """ Idle connection to host, or a new one """
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                idle = self._idle.get((host, port))
+                connection = idle.pop() if idle else None
+                if connection is None:
+                    self._opened += 1
+                    break
+            if now - connection.last_used < self._idle_timeout and connection.is_alive():
+                with self._lock:
+                    self._reused += 1
+                return connection
+            connection.close()
+
+        return Connection(host, port, self._connect(host, port))
+
+    def release(self, connection, reusable=True):
+        """ Keep connection for reuse, or close it """
+        if reusable and not connection.leftover:
+            connection.last_used = time.monotonic()
+            with self._lock:
+                idle = self._idle.setdefault((connection.host, connection.port), [])
+                if len(idle) < self._max_idle:
+                    idle.append(connection)
+                    return
+        connection.close()
+
+    def close(self):
+        """ Close all idle connections """
+        with self._lock:
+            connections = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for connection in connections:
+            connection.close()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "opened": self._opened,
+                "reused": self._reused,
+                "idle": sum(len(idle) for idle in self._idle.values()),
+            }
+
+    def _connect(self, host, port):
+        """ Resolve host (cached), and connect to the first address that answers """
+        addresses = self._resolver.resolve(host, port)
+        try:
+            return happy_eyeballs_connect(addresses, self._connect_timeout, self._attempt_delay)
+        except OSError:
+            self._resolver.forget(host, port)
+            raise
@@ -1,35 +1,114 @@
 #!/usr/bin/env python3
 
-from socket import *
+from connection_pool import ConnectionPool
+from http_response import HTTPResponseParser
+
+class _StaleConnection(ConnectionError):
+    """ Reused connection closed by server before the response started """
+    pass
+
 
 class CustomWebBrowser:
     """ Simple custom web browser
         Author: Olof Jönsson, oljn22 """
 
     def __init__(self):
-        """ Set name, and create TCP socket """
+        """ Set name, and create connection pool """
         self._name = "CustomWebBrowser/1.0"
-        self._socket = socket(AF_INET, SOCK_STREAM)
+        self._pool = ConnectionPool()
+        self._cache = None
+        self._keep_alive = True
+        self._timeout = 10
+        self._pipeline_depth = 16   # requests in flight per connection
+        self._recv_size = 65536
+        self._verbose = False
+
+    def set_verbose(self, verbose=True):
+        """ Print requests as they are sent """
+        self._verbose = verbose
+        return self
+
+    def set_keep_alive(self, enabled=True):
+        """ Keep connections open for later requests, else one per request """
+        self._keep_alive = enabled
+        return self
+
+    def set_timeout(self, timeout):
+        self._timeout = timeout     # seconds, per socket operation
+        return self
+
+    def set_pipeline_depth(self, depth):
+        """ Max requests sent before reading responses, see request_pages """
+        self._pipeline_depth = depth
+        return self
+
+    def set_pool(self, pool):
+        """ Share a ConnectionPool between browsers """
+        self._pool = pool
+        return self
+
+    def get_pool(self):
+        return self._pool
+
+    def set_resolver(self, resolver):
+        """ Resolver (DNS cache) used by the connection pool """
+        self._pool.set_resolver(resolver)
+        return self
+
+    def set_cache(self, cache):
+        """ HTTPCache for request_page, None disables caching """
+        self._cache = cache
+        return self
+
+    def get_cache(self):
+        return self._cache
 
     def _connect(self, host, port=80):
-        """ Connect to server host"""
-        self._socket.connect((host, port))
+        """ Connection to server host, reused from pool if possible """
+        connection = self._pool.acquire(host, port)
+        connection.socket.settimeout(self._timeout)
+        return connection
 
-    def _send(self, header):
+    def _send(self, connection, header):
         """ Send encoded header into socket """
-        print("<<< SENDING REQUEST >>>\n")
-        print(header)
-        self._socket.send(header.encode())
+        if self._verbose:
+            print("<<< SENDING REQUEST >>>\n")
+            print(header)
+        connection.socket.sendall(header.encode())
+
+    def _receive(self, connection, method="GET", sink=None):
+        """ Receive a complete response from server host.
+            Body is collected in the response, or written to sink.
+            Bytes past the response are kept for the next one """
+        parser = HTTPResponseParser(method, sink)
+        received = bool(connection.leftover)
+        if connection.leftover:
+            parser.feed(connection.leftover)
+        while not parser.is_complete():
+            try:
+                data = connection.socket.recv(self._recv_size)
+            except ConnectionResetError:
+                if not received and connection.is_reused():
+                    raise _StaleConnection("Connection reset by server")
+                raise
+            if not data:
+                if not received and connection.is_reused():
+                    raise _StaleConnection("Connection closed by server")
+                parser.feed_eof()
+                break
+            received = True
+            parser.feed(data)
+        connection.leftover = parser.unused()
+        connection.requests += 1
+        return parser.get_response()
 
-    def _receive_and_print(self):
-        """ Receive response from server host, decode and print """
-        response = self._socket.recv(1024)
-        print("<<< RECEIVING RESPONSE >>>\n")
-        print(response.decode())
+    def _release(self, connection, response):
+        """ Return connection to pool if both sides keep it alive """
+        self._pool.release(connection, self._keep_alive and response.keep_alive())
 
-    def _close(self):
-        """ Close socket """
-        self._socket.close()
+    def close(self):
+        """ Close idle connections """
+        self._pool.close()
 
     def _build_header(
         self,
@@ -39,24 +118,91 @@ class CustomWebBrowser:
         method="GET",
         protocol="HTTP/1.1",
         accept="text/html",
-        conn="close"
+        conn="close",
+        extra_headers=None
     ):
-        """ Build a simple HTTP header """
+        """ Build a simple HTTP header, extra_headers is a dict name -> value """
         header = f"{method} {path}{query} {protocol}\r\n"
         header += f"Host: {host}\r\n"
         header += f"User-Agent: {self._name}\r\n"
         header += f"Accept: {accept}\r\n"
         header += f"Connection: {conn}\r\n"
+        for name, value in (extra_headers or {}).items():
+            header += f"{name}: {value}\r\n"
         header += "\r\n"
 
         return header
 
-    def request_page(self, host, path, query):
-        """ Request a web page """
-        self._connect(host)
-        self._send(self._build_header(host, path, query))
-        self._receive_and_print()
-        self._close()
+    def _connection_header(self):
+        return "keep-alive" if self._keep_alive else "close"
+
+    def request_page(self, host, path, query, sink=None, port=80):
+        """ Request a web page, return the HTTPResponse.
+            With a sink (e.g. an open file) the body is written to it.
+            With a cache, fresh cached pages are returned without a request,
+            and stale ones are revalidated """
+        if self._cache is None:
+            return self._request(host, path, query, sink, port)
+
+        key = f"{host}:{port}{path}{query}"
+        response = self._cache.fetch(key, lambda extra_headers: self._request(host, path, query, None, port, extra_headers))
+        if sink and response.body is not None:
+            sink.write(response.body)
+        return response
+
+    def _request(self, host, path, query, sink=None, port=80, extra_headers=None):
+        """ Send request and receive response.
+            A pooled connection closed by the server is replaced once """
+        header = self._build_header(host, path, query, conn=self._connection_header(), extra_headers=extra_headers)
+        for _ in range(2):
+            connection = self._connect(host, port)
+            try:
+                self._send(connection, header)
+                response = self._receive(connection, sink=sink)
+            except _StaleConnection:
+                connection.close()
+                continue
+            except BaseException:
+                connection.close()
+                raise
+            self._release(connection, response)
+            return response
+        raise ConnectionError(f"Could not get a response from {host}")
+
+    def request_pages(self, host, targets, port=80, pipeline=True):
+        """ Request many pages from one host, return HTTPResponses in order.
+            targets is a list of (path, query).
+            With pipeline, up to pipeline depth requests are sent on a
+            connection before the responses are read (HTTP/1.1 pipelining).
+            Requests left unanswered when the server closes a connection
+            are sent again on a new one """
+        depth = self._pipeline_depth if pipeline and self._keep_alive else 1
+        conn = self._connection_header()
+        responses = []
+        pending = list(targets)
+
+        while pending:
+            connection = self._connect(host, port)
+            batch = pending[:depth]
+            try:
+                for path, query in batch:
+                    self._send(connection, self._build_header(host, path, query, conn=conn))
+                for _ in batch:
+                    response = self._receive(connection)
+                    responses.append(response)
+                    pending.pop(0)
+                    if not response.keep_alive():
+                        break
+            except _StaleConnection:
+                # server closed after some responses, resend the rest
+                connection.close()
+                continue
+            except BaseException:
+                connection.close()
+                raise
+            self._release(connection, response)
+
+        return responses
 
 
 if __name__ == "__main__":
@@ -67,4 +213,20 @@ if __name__ == "__main__":
 
     # Init browser, and request page
     browser = CustomWebBrowser()
-    browser.request_page(host, path, query)
+    browser.set_verbose()
+    response = browser.request_page(host, path, query)
+
+    print("<<< RECEIVING RESPONSE >>>\n")
+    print(response.version, response.status, response.reason)
+    for name, value in response.headers:
+        print(f"{name}: {value}")
+    print()
+    print(response.text())
+
+    # Some board states on the same connection, pipelined
+    boards = ["?board=xeeeeeeee", "?board=xoeeeeeee", "?board=xoxeeeeee"]
+    browser.set_verbose(False)
+    for board, response in zip(boards, browser.request_pages(host, [(path, board) for board in boards])):
+        print(board, response.status, len(response.body), "bytes")
+    print(browser.get_pool().get_stats())
+    browser.close()
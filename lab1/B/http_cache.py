@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from http_response import HTTPResponse
+
+def _parse_date(value):
+    """ Seconds since epoch of an HTTP date, None if missing or invalid """
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _parse_age(value):
+    """ Seconds of an Age header, 0 if missing or invalid (RFC 9111, 5.1) """
+    try:
+        age = int(value or 0)
+    except ValueError:
+        return 0
+    return max(age, 0)
+
+
+def _cache_control(response):
+    """ Cache-Control directives as dict, name -> value or True """
+    directives = {}
+    for part in (response.get_header("Cache-Control") or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') if value else True
+    return directives
+
+
+class CacheEntry:
+    """ Cached response with its freshness lifetime """
+
+    def __init__(self, response, stored_at=None):
+        """ Set response, and compute when it expires """
+        self.response = response
+        self.stored_at = time.time() if stored_at is None else stored_at
+        self.size = len(response.body or b"")
+        self._update_expiry()
+
+    def _update_expiry(self):
+        """ Expiry from max-age or Expires, relative to the Date of the response """
+        response = self.response
+        directives = _cache_control(response)
+        date = _parse_date(response.get_header("Date")) or self.stored_at
+        age = _parse_age(response.get_header("Age"))
+        self.no_cache = "no-cache" in directives
+        self.expires_at = self.stored_at     # stale unless told otherwise
+
+        max_age = directives.get("max-age")
+        if max_age not in (None, True) and max_age.isdigit():
+            self.expires_at = self.stored_at + int(max_age) - age
+        else:
+            expires = _parse_date(response.get_header("Expires"))
+            if expires is not None:
+                self.expires_at = self.stored_at + (expires - date) - age
+
+    def is_fresh(self, now=None):
+        now = time.time() if now is None else now
+        return not self.no_cache and now < self.expires_at
+
+    def validators(self):
+        """ Headers for a conditional request """
+        headers = {}
+        etag = self.response.get_header("ETag")
+        last_modified = self.response.get_header("Last-Modified")
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def revalidated(self, not_modified):
+        """ Update headers and freshness from a 304 response """
+        updated = {name.lower() for name, _ in not_modified.headers}
+        headers = [(name, value) for name, value in self.response.headers if name.lower() not in updated]
+        headers += [(name, value) for name, value in not_modified.headers if name.lower() != "content-length"]
+        self.response = HTTPResponse(
+            self.response.version,
+            self.response.status,
+            self.response.reason,
+            headers,
+            self.response.body
+        )
+        self.stored_at = time.time()
+        self._update_expiry()
+
+    def to_bytes(self):
+        """ JSON line with metadata, followed by the body """
+        response = self.response
+        meta = {
+            "version": response.version,
+            "status": response.status,
+            "reason": response.reason,
+            "headers": response.headers,
+            "stored_at": self.stored_at,
+        }
+        return json.dumps(meta).encode() + b"\n" + (response.body or b"")
+
+    @staticmethod
+    def from_bytes(data):
+        meta, _, body = data.partition(b"\n")
+        meta = json.loads(meta)
+        headers = [tuple(header) for header in meta["headers"]]
+        response = HTTPResponse(meta["version"], meta["status"], meta["reason"], headers, body)
+        return CacheEntry(response, meta["stored_at"])
+
+
+class HTTPCache:
+    """ HTTP response cache for CustomWebBrowser.
+        Keeps responses in an in-memory LRU bounded by body bytes,
+        and optionally in a directory, which survives restarts.
+        Fresh responses (Cache-Control max-age, Expires) are served
+        without a request. Stale ones are revalidated with
+        If-None-Match/If-Modified-Since, and a 304 counts as a hit. """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, directory=None):
+        """ Set memory bound (bytes), and directory for disk store (None = memory only) """
+        self._max_bytes = max_bytes
+        self._directory = directory
+        self._entries = OrderedDict()   # key -> CacheEntry, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._revalidations = 0
+        self._misses = 0
+        self._bytes_saved = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def fetch(self, key, request):
+        """ Response for key, from cache or by request(extra_headers),
+            which must send the request and return its HTTPResponse """
+        entry = self._lookup(key)
+        if entry and entry.is_fresh():
+            with self._lock:
+                self._hits += 1
+                self._bytes_saved += entry.size
+            return entry.response
+
+        response = request(entry.validators() if entry else {})
+
+        if entry and response.status == 304:
+            entry.revalidated(response)
+            self._store(key, entry)
+            with self._lock:
+                self._hits += 1
+                self._revalidations += 1
+                self._bytes_saved += entry.size
+            return entry.response
+
+        with self._lock:
+            self._misses += 1
+        if self._cacheable(response):
+            self._store(key, CacheEntry(response))
+        elif entry:
+            self.remove(key)
+        return response
+
+    def remove(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._bytes -= entry.size
+        path = self._path(key)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def clear(self):
+        """ Remove all entries, from memory and disk """
+        if self._directory:
+            for name in os.listdir(self._directory):
+                if name.endswith(".cache"):
+                    os.remove(os.path.join(self._directory, name))
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "revalidations": self._revalidations,
+                "misses": self._misses,
+                "bytes_saved": self._bytes_saved,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _cacheable(self, response):
+        """ Only complete 200 responses with freshness or validators, not no-store """
+        if response.status != 200 or response.body is None:
+            return False
+        directives = _cache_control(response)
+        if "no-store" in directives:
+            return False
+        return bool(
+            "max-age" in directives
+            or response.get_header("Expires")
+            or response.get_header("ETag")
+            or response.get_header("Last-Modified")
+        )
+
+    def _lookup(self, key):
+        """ Entry from memory, else from disk """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                return entry
+        path = self._path(key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as file:
+                entry = CacheEntry.from_bytes(file.read())
+        except (OSError, ValueError, KeyError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self._remember(key, entry)
+        path = self._path(key)
+        if path:
+            # write to a temporary file first, so readers never see half an entry
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(entry.to_bytes())
+            os.replace(temporary, path)
+
+    def _remember(self, key, entry):
+        """ Put entry in memory, evict least recently used beyond the bound """
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._bytes -= old.size
+            if entry.size > self._max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def _path(self, key):
+        if not self._directory:
+            return None
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self._directory, f"{name}.cache")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+class HTTPResponse:
+    """ HTTP response: status, headers and body.
+        Body is None if it was streamed to a sink. """
+
+    def __init__(self, version, status, reason, headers, body):
+        """ Set response fields, headers as list of (name, value) """
+        self.version = version
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def get_header(self, name, default=None):
+        """ Value of header (case insensitive), last one if repeated """
+        name = name.lower()
+        for header, value in reversed(self.headers):
+            if header.lower() == name:
+                return value
+        return default
+
+    def keep_alive(self):
+        """ True if the server lets the connection be reused """
+        connection = (self.get_header("Connection") or "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def text(self, encoding="utf-8"):
+        """ Body decoded as text """
+        return bytes(self.body or b"").decode(encoding, errors="replace")
+
+    def __repr__(self):
+        return f"<HTTPResponse {self.status} {self.reason}>"
+
+
+class HTTPResponseParser:
+    """ Incremental HTTP/1.1 response parser.
+        Bytes are fed as they arrive, in pieces of any size.
+        The body is read by Content-Length, chunked transfer coding,
+        or until the connection closes, and collected in a growable
+        buffer or written to a sink (anything with a write() method).
+        Bytes after a complete response are kept in unused(). """
+
+    def __init__(self, method="GET", sink=None, max_header_size=65536):
+        """ Method of the request (HEAD responses have no body) """
+        self._method = method
+        self._sink = sink
+        self._max_header_size = max_header_size
+        self._buffer = bytearray()
+        self._scan = 0              # where to continue searching in head
+        self._state = "head"        # head, length, chunk_size, chunk_data, chunk_end, trailer, close, done
+        self._remaining = 0         # bytes left of body or chunk
+        self._body = bytearray()
+        self._version = None
+        self._status = None
+        self._reason = None
+        self._headers = []
+
+    def feed(self, data):
+        """ Parse received bytes """
+        if self._state == "done":
+            self._buffer += data
+            return
+        if self._state == "close" and not self._buffer:
+            self._write(data)
+            return
+        self._buffer += data
+        self._parse()
+
+    def feed_eof(self):
+        """ Connection closed by server """
+        if self._state == "close":
+            self._state = "done"
+        elif self._state != "done":
+            raise ConnectionError("Connection closed before response was complete")
+
+    def is_complete(self):
+        return self._state == "done"
+
+    def unused(self):
+        """ Bytes received after the complete response """
+        return bytes(self._buffer) if self._state == "done" else b""
+
+    def get_response(self):
+        """ Parsed response, once complete """
+        if self._state != "done":
+            raise ValueError("Response is not complete")
+        body = None if self._sink else bytes(self._body)
+        return HTTPResponse(self._version, self._status, self._reason, self._headers, body)
+
+    def _write(self, data):
+        if self._sink:
+            self._sink.write(bytes(data))
+        else:
+            self._body += data
+
+    def _write_from_buffer(self, size):
+        """ Write first size bytes of buffer to body, and remove them """
+        with memoryview(self._buffer) as view, view[:size] as data:
+            self._write(data)
+        del self._buffer[:size]
+
+    def _parse(self):
+        """ Consume as much of the buffer as the current state allows """
+        buffer = self._buffer
+        while True:
+            state = self._state
+
+            if state == "head":
+                end = buffer.find(b"\r\n\r\n", self._scan)
+                if end < 0:
+                    if len(buffer) > self._max_header_size:
+                        raise ValueError("Response header too large")
+                    self._scan = max(0, len(buffer) - 3)
+                    return
+                head = bytes(buffer[:end])
+                del buffer[:end + 4]
+                self._scan = 0
+                self._parse_head(head)
+
+            elif state == "length":
+                if not buffer:
+                    return
+                take = min(self._remaining, len(buffer))
+                self._write_from_buffer(take)
+                self._remaining -= take
+                if not self._remaining:
+                    self._state = "done"
+
+            elif state == "chunk_size":
+                end = buffer.find(b"\r\n")
+                if end < 0:
+                    return
+                size = buffer[:end].split(b";")[0].strip()
+                del buffer[:end + 2]
+                self._remaining = int(size, 16)
+                self._state = "chunk_data" if self._remaining else "trailer"
+
+            elif state == "chunk_data":
+                if not buffer:
+                    return
+                take = min(self._remaining, len(buffer))
+                self._write_from_buffer(take)
+                self._remaining -= take
+                if not self._remaining:
+                    self._state = "chunk_end"
+
+            elif state == "chunk_end":
+                if len(buffer) < 2:
+                    return
+                del buffer[:2]      # CRLF after chunk data
+                self._state = "chunk_size"
+
+            elif state == "trailer":
+                end = buffer.find(b"\r\n")
+                if end < 0:
+                    return
+                if end > 0:
+                    # trailer header, added to headers
+                    self._headers.append(self._parse_header_line(bytes(buffer[:end])))
+                del buffer[:end + 2]
+                if end == 0:
+                    self._state = "done"
+
+            elif state == "close":
+                if buffer:
+                    self._write(buffer)
+                    buffer.clear()
+                return
+
+            else:   # done
+                return
+
+    def _parse_head(self, head):
+        """ Parse status line and headers, and choose how to read the body """
+        lines = head.decode("iso-8859-1").split("\r\n")
+        version, status, *reason = lines[0].split(" ", 2)
+        self._version = version
+        self._status = int(status)
+        self._reason = reason[0] if reason else ""
+        self._headers = [self._parse_header_line(line) for line in lines[1:] if line]
+
+        if 100 <= self._status < 200 and self._status != 101:
+            # informational, the real response follows
+            self._state = "head"
+            return
+
+        response = HTTPResponse(self._version, self._status, self._reason, self._headers, None)
+        transfer_encoding = (response.get_header("Transfer-Encoding") or "").lower()
+        content_length = response.get_header("Content-Length")
+
+        if self._method == "HEAD" or self._status in (204, 304):
+            self._state = "done"
+        elif "chunked" in transfer_encoding:
+            self._state = "chunk_size"
+        elif content_length is not None:
+            self._remaining = int(content_length)
+            self._state = "length" if self._remaining else "done"
+        else:
+            self._state = "close"
+
+    def _parse_header_line(self, line):
+        if isinstance(line, bytes):
+            line = line.decode("iso-8859-1")
+        name, _, value = line.partition(":")
+        return name.strip(), value.strip()
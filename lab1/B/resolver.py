@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+import errno
+import os
+import selectors
+from socket import socket, getaddrinfo, AF_UNSPEC, SOCK_STREAM, SOL_SOCKET, SO_ERROR
+import threading
+import time
+
+def _getaddrinfo(host, port):
+    """ Default resolve function: list of (family, sockaddr), system order """
+    return [(family, sockaddr) for family, _, _, _, sockaddr in getaddrinfo(host, port, AF_UNSPEC, SOCK_STREAM)]
+
+
+class Resolver:
+    """ Host name resolution with a TTL bounded cache.
+        The resolve function, resolve(host, port) -> list of (family, sockaddr),
+        can be replaced, e.g. by a stub in tests. getaddrinfo gives no TTL,
+        so every answer is kept for the same time. """
+
+    def __init__(self, ttl=300, resolve=None):
+        """ Set TTL (seconds) and resolve function (default getaddrinfo) """
+        self._ttl = ttl
+        self._resolve = resolve or _getaddrinfo
+        self._cache = {}            # (host, port) -> (expires, addresses)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def set_ttl(self, ttl):
+        self._ttl = ttl
+        return self
+
+    def resolve(self, host, port):
+        """ Addresses of host, from cache if not expired """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get((host, port))
+            if cached and cached[0] > now:
+                self._hits += 1
+                return cached[1]
+            self._misses += 1
+
+        addresses = list(self._resolve(host, port))
+        if not addresses:
+            raise OSError(f"No addresses for {host}")
+        with self._lock:
+            self._cache[(host, port)] = (now + self._ttl, addresses)
+        return addresses
+
+    def forget(self, host, port):
+        """ Drop cached addresses, e.g. when none of them could be reached """
+        with self._lock:
+            self._cache.pop((host, port), None)
+
+    def get_stats(self):
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "entries": len(self._cache)}
+
+
+def interleave(addresses):
+    """ Alternate address families, starting with the first one (RFC 8305, 4) """
+    if not addresses:
+        return []
+    first = addresses[0][0]
+    preferred = [address for address in addresses if address[0] == first]
+    others = [address for address in addresses if address[0] != first]
+    result = []
+    for index in range(max(len(preferred), len(others))):
+        result += preferred[index:index + 1] + others[index:index + 1]
+    return result
+
+
+def happy_eyeballs_connect(addresses, timeout=10, attempt_delay=0.25):
+    """ Connect to the first address that answers (Happy Eyeballs, RFC 8305).
+        Attempts start attempt_delay apart, or at once when the previous
+        one fails, in interleaved family order, and race each other.
+        Return the connected socket (blocking), close all others.
+        Raise TimeoutError after timeout seconds, or the last error
+        if every address failed """
+    addresses = interleave(addresses)
+    deadline = time.monotonic() + timeout
+    selector = selectors.DefaultSelector()
+    next_attempt = 0.0
+    error = None
+
+    try:
+        while True:
+            now = time.monotonic()
+
+            if addresses and (not selector.get_map() or now >= next_attempt):
+                family, sockaddr = addresses.pop(0)
+                sock = socket(family, SOCK_STREAM)
+                sock.setblocking(False)
+                result = sock.connect_ex(sockaddr)
+                if result == 0:
+                    sock.setblocking(True)
+                    return sock
+                if result in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                    selector.register(sock, selectors.EVENT_WRITE)
+                    next_attempt = now + attempt_delay
+                else:
+                    error = OSError(result, os.strerror(result), sockaddr)
+                    sock.close()
+                continue
+
+            if not selector.get_map():
+                raise error or OSError("No addresses to connect to")
+            if now >= deadline:
+                raise TimeoutError("Connect timed out")
+
+            wait = deadline - now
+            if addresses:
+                wait = min(wait, max(0.0, next_attempt - now))
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                selector.unregister(sock)
+                result = sock.getsockopt(SOL_SOCKET, SO_ERROR)
+                if result == 0:
+                    sock.setblocking(True)
+                    return sock
+                error = OSError(result, os.strerror(result))
+                sock.close()
+                next_attempt = now  # start the next attempt at once
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+
+
+if __name__ == "__main__":
+    # Self check against local listeners, with a stub resolver:
+    # a refused first address, a stalled first address (full backlog,
+    # SYNs go unanswered), and IPv6 next to IPv4 where available
+    from socket import AF_INET, AF_INET6, has_ipv6
+
+    def listener(family, host, backlog=8):
+        sock = socket(family, SOCK_STREAM)
+        sock.bind((host, 0))
+        sock.listen(backlog)
+        return sock
+
+    def stalled(family, host):
+        """ Listener whose backlog is full, connects to it hang """
+        sock = listener(family, host, 0)
+        fillers = []
+        for _ in range(8):
+            filler = socket(family, SOCK_STREAM)
+            filler.setblocking(False)
+            filler.connect_ex(sock.getsockname()[:2])
+            fillers.append(filler)
+        time.sleep(0.1)
+        return sock, fillers
+
+    v4 = listener(AF_INET, "127.0.0.1")
+    v4_address = (AF_INET, v4.getsockname())
+    refused = listener(AF_INET, "127.0.0.1")
+    refused_address = (AF_INET, refused.getsockname())
+    refused.close()     # nothing listens there any more
+    dead, fillers = stalled(AF_INET, "127.0.0.1")
+    dead_address = (AF_INET, dead.getsockname())
+
+    answers = {"refused.test": [refused_address, v4_address], "dead.test": [dead_address, v4_address]}
+    if has_ipv6:
+        try:
+            v6 = listener(AF_INET6, "::1")
+            answers["dual.test"] = [dead_address, (AF_INET6, v6.getsockname()), v4_address]
+        except OSError:
+            print("No IPv6 loopback, skipping dual stack check")
+
+    calls = []
+
+    def stub(host, port):
+        calls.append(host)
+        return answers[host]
+
+    resolver = Resolver(ttl=60, resolve=stub)
+    for host in answers:
+        started = time.monotonic()
+        sock = happy_eyeballs_connect(resolver.resolve(host, 80), timeout=5, attempt_delay=0.2)
+        elapsed = time.monotonic() - started
+        peer = sock.getpeername()
+        sock.close()
+        expected = answers[host][1][1]
+        assert peer[:2] == expected[:2], f"{host}: connected to {peer}, expected {expected}"
+        assert elapsed < 1, f"{host}: first address delayed the connect by more than the attempt delay"
+        print(f"{host}: connected to {peer[0]} port {peer[1]} in {elapsed * 1e3:.0f}ms")
+
+    resolver.resolve("dead.test", 80)
+    assert calls.count("dead.test") == 1, "cached answer was resolved again"
+    resolver.forget("dead.test", 80)
+    resolver.resolve("dead.test", 80)
+    assert calls.count("dead.test") == 2, "forgotten answer was not resolved again"
+    print("Resolver:", resolver.get_stats())
+
+    try:
+        happy_eyeballs_connect([refused_address], timeout=1)
+        raise AssertionError("connect to a refused address succeeded")
+    except ConnectionRefusedError:
+        print("Only refused address: ConnectionRefusedError")
+    try:
+        happy_eyeballs_connect([dead_address], timeout=0.5)
+        raise AssertionError("connect to a stalled address succeeded")
+    except TimeoutError:
+        print("Only stalled address: TimeoutError")
+    print("All checks passed")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+import asyncio
+from receiver import Receiver
+from framer import create_framer, FramingError
+from sequence_log import SequenceLog
+
+class PeerStream(Receiver):
+    """ Receiver state for one sender in an AsyncReceiver.
+        Has no socket of its own, payloads are handed to _process()
+        by the protocols, so sequence, delay and log handling
+        are exactly those of Receiver. """
+
+    def __init__(self, peer):
+        """ Set peer ('tcp' or 'udp', host, port) """
+        self._peer = peer
+        super().__init__()
+        self._log_path = None
+
+    def get_peer(self):
+        return self._peer
+
+    def _create_socket(self):
+        """ Sockets are owned by AsyncReceiver """
+        pass
+
+    def _prepare(self):
+        pass
+
+    def _receive(self):
+        pass
+
+    def open_log(self):
+        """ Start sequence log, if a log path is set """
+        if self._log_path:
+            self._sequence_log = SequenceLog(self._log_path, self._log_format)
+
+    def close(self):
+        """ Flush log when stream ends """
+        self._close()
+
+
+class _TCPStreamProtocol(asyncio.BufferedProtocol):
+    """ One TCP connection, read straight into the framer buffer """
+
+    def __init__(self, receiver):
+        self._receiver = receiver
+        self._framer = create_framer(receiver._framing)
+        self._stream = None
+
+    def connection_made(self, transport):
+        host, port = transport.get_extra_info("peername")[:2]
+        self._transport = transport
+        self._receiver._connections.add(transport)
+        self._stream = self._receiver._get_stream(("tcp", host, port))
+
+    def get_buffer(self, sizehint):
+        return self._framer.get_buffer()
+
+    def buffer_updated(self, nbytes):
+        self._framer.buffer_updated(nbytes)
+        process = self._stream._process
+        try:
+            messages = self._framer.messages()
+        except FramingError as e:
+            self._protocol_error(e)
+            return
+        for payload in messages:
+            process(payload)
+
+    def eof_received(self):
+        try:
+            self._framer.messages()     # raises if the stream ended broken
+        except FramingError as e:
+            self._protocol_error(e)
+
+    def _protocol_error(self, error):
+        host, port = self._stream.get_peer()[1:]
+        print(f"PROTOCOL ERROR from {host}:{port}: {error}")
+        self._transport.close()
+
+    def connection_lost(self, exc):
+        self._receiver._connections.discard(self._transport)
+        self._stream.close()
+
+
+class _UDPStreamProtocol(asyncio.DatagramProtocol):
+    """ UDP datagrams from any number of senders, told apart by address """
+
+    def __init__(self, receiver):
+        self._receiver = receiver
+        self._streams = {}      # address -> PeerStream, saves building peer key
+
+    def datagram_received(self, data, addr):
+        stream = self._streams.get(addr)
+        if stream is None:
+            stream = self._streams[addr] = self._receiver._get_stream(("udp", addr[0], addr[1]))
+        stream._process(data)
+
+
+class AsyncReceiver:
+    """ asyncio stream receiver for many concurrent senders.
+        Accepts TCP connections and UDP datagrams on the same port,
+        and keeps separate Receiver state and statistics per sender. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._port = 12000
+        self._timeout = 60
+        self._transport = "both"
+        self._framing = "auto"
+        self._timestamps = False
+        self._log_dir = None
+        self._backlog = 1024
+        self._streams = {}      # peer -> PeerStream
+        self._connections = set()   # open TCP transports
+        self._loop = None
+        self._stop_event = None
+
+    def set_port(self, port):
+        self._port = port
+        return self
+
+    def set_timeout(self, timeout):
+        self._timeout = timeout     # seconds
+        return self
+
+    def set_transport(self, transport):
+        """ 'tcp', 'udp' or 'both' """
+        if transport not in ("tcp", "udp", "both"):
+            raise ValueError(f"Unknown transport: {transport}")
+        self._transport = transport
+        return self
+
+    def set_framing(self, framing):
+        """ TCP framing, see TCPReceiver.set_framing """
+        self._framing = framing
+        return self
+
+    def set_timestamps(self, enabled=True):
+        """ Measure delay and jitter per sender, see Receiver.set_timestamps """
+        self._timestamps = enabled
+        return self
+
+    def set_log_dir(self, path):
+        """ Log sequences per sender to files in path, None disables logging """
+        self._log_dir = path
+        return self
+
+    def listen(self):
+        """ Receive streams until timeout or stop() """
+        print(f"Listening on port {self._port} ({self._transport}). Timeout: {self._timeout}s")
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._print_status()
+
+    def stop(self):
+        """ Stop listening, safe to call from another thread """
+        loop = self._loop
+        if loop:
+            loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def _serve(self):
+        """ Open servers, wait for timeout or stop, then close everything """
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        server = None
+        udp_transport = None
+
+        try:
+            if self._transport in ("tcp", "both"):
+                server = await self._loop.create_server(
+                    lambda: _TCPStreamProtocol(self),
+                    port=self._port,
+                    backlog=self._backlog,
+                    reuse_address=True
+                )
+            if self._transport in ("udp", "both"):
+                udp_transport, _ = await self._loop.create_datagram_endpoint(
+                    lambda: _UDPStreamProtocol(self),
+                    local_addr=("0.0.0.0", self._port)
+                )
+
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self._timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        finally:
+            if server:
+                server.close()
+                for connection in list(self._connections):
+                    connection.close()
+                await server.wait_closed()
+            if udp_transport:
+                udp_transport.close()
+            for stream in self._streams.values():
+                stream.close()
+            self._loop = None
+            print("Sockets closed")
+
+    def _get_stream(self, peer):
+        """ State of a sender, created on first packet or connection.
+            A reconnect from the same address continues the same stream """
+        stream = self._streams.get(peer)
+        if stream:
+            return stream
+        stream = PeerStream(peer).set_timestamps(self._timestamps)
+        if self._log_dir:
+            transport, host, port = peer
+            stream.set_log(f"{self._log_dir}/sequence-{transport}-{host}-{port}.log")
+            stream.open_log()
+        self._streams[peer] = stream
+        return stream
+
+    def get_stats(self):
+        """ Statistics per sender, keyed by (transport, host, port) """
+        return {peer: stream.get_stats() for peer, stream in self._streams.items()}
+
+    def _print_status(self):
+        total_received = 0
+        total_lost = 0
+        for (transport, host, port), stats in self.get_stats().items():
+            total_received += stats["received"]
+            total_lost += stats["lost"]
+            print(f"{transport} {host}:{port} received: {stats['received']}, "
+                  f"out of order: {stats['out_of_order']}, lost: {stats['lost']}")
+        print(f"Streams: {len(self._streams)}, packets received: {total_received}, lost: {total_lost}")
+
+
+if __name__ == "__main__":
+    timeout = 35
+
+    async_receiver = AsyncReceiver()
+    async_receiver.set_timeout(timeout)
+    async_receiver.listen()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+
+import contextlib
+import io
+import json
+import os
+from multiprocessing import Process, Queue, Pipe
+import platform
+from queue import Empty
+import subprocess
+import threading
+import time
+from metrics import SamplingProfiler
+from tcp_receiver import TCPReceiver
+from tcp_sender import TCPSender
+from udp_receiver import UDPReceiver
+from udp_sender import UDPSender
+
+RECEIVERS = {"tcp": TCPReceiver, "udp": UDPReceiver}
+SENDERS = {"tcp": TCPSender, "udp": UDPSender}
+
+
+def _quiet(enabled):
+    """ Context that swallows prints of senders and receivers if enabled """
+    return contextlib.redirect_stdout(io.StringIO()) if enabled else contextlib.nullcontext()
+
+
+def _create_receiver(config):
+    receiver = RECEIVERS[config["transport"]]()
+    receiver.set_port(config["port"]).set_timeout(config["receiver_timeout"])
+    receiver.set_log(None)
+    if config["batch_size"] > 1:
+        receiver.set_batch_size(config["batch_size"])
+    return receiver
+
+
+def _create_sender(config):
+    sender = SENDERS[config["transport"]]()
+    sender.set_receiver("127.0.0.1", config["port"])
+    sender.set_stream_frequency(config["frequency"]).set_timeout(config["duration"])
+    sender.set_payload_size(config["payload_size"])
+    sender.set_wire_format(config["wire_format"])
+    if config["burst_size"] > 1:
+        sender.set_burst_size(config["burst_size"])
+    return sender
+
+
+def _receive(receiver, wait_for_stop):
+    """ Listen until wait_for_stop() returns, return (stats, cpu time of this thread) """
+    watcher = threading.Thread(target=lambda: (wait_for_stop(), receiver.stop()), daemon=True)
+    watcher.start()
+    started = time.thread_time()
+    receiver.listen()
+    return receiver.get_stats(), time.thread_time() - started
+
+
+def _send(sender):
+    """ Stream, return (stats, cpu time of this thread, wall time, time in send calls).
+        The thread CPU time includes the pacer spinning until each deadline,
+        the CPU time of the send calls is sampled apart by a profiler """
+    profiler = SamplingProfiler(every=10, clock=time.thread_time_ns)
+    sender.set_profiler(profiler)
+    started = time.thread_time()
+    wall = time.perf_counter()
+    sender.stream()
+    cpu, elapsed = time.thread_time() - started, time.perf_counter() - wall
+    # only one of _send and _send_burst is called, per burst size
+    send_time = sum(method["total"] for method in profiler.stats().values())
+    return sender.get_stats(), cpu, elapsed, send_time
+
+
+def _attempt(run):
+    """ (None, what run() returns), or (error message, None) if it raised """
+    try:
+        return None, run()
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", None
+
+
+def _receiver_process(config, stop, results):
+    """ Worker process: run receiver until anything arrives on the stop pipe,
+        put (role, error, result) in results, also if it fails, so the parent
+        never waits for nothing. A pipe, as a multiprocessing Event can hang
+        set() when a process exits while waiting for it """
+    def wait_for_stop():
+        try:
+            stop.recv()
+        except EOFError:
+            pass
+
+    with _quiet(config["quiet"]):
+        results.put(("receiver",) + _attempt(lambda: _receive(_create_receiver(config), wait_for_stop)))
+
+
+def _sender_process(config, results):
+    """ Worker process: stream, put (role, error, result) in results """
+    with _quiet(config["quiet"]):
+        results.put(("sender",) + _attempt(lambda: _send(_create_sender(config))))
+
+
+class Benchmark:
+    """ Loopback benchmark of the lab2 senders and receivers.
+        Runs a receiver and a sender on 127.0.0.1 for every combination
+        of transport, stream frequency and payload size, in threads of
+        this process or in separate processes. Records sent and received
+        packets per second, goodput, CPU time per packet, loss and
+        reordering, and writes them to a JSON file to compare versions.
+        On the sender side, the CPU time of the send calls per packet is
+        the cost of sending. Its total CPU time per packet also counts the
+        pacer busy waiting for deadlines, which dominates at low rates.
+        A run whose sender or receiver fails is recorded with its error,
+        and the sweep goes on. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._port = 12000
+        self._transports = ["udp", "tcp"]
+        self._frequencies = [1000, 10000]
+        self._payload_sizes = [64, 1460]
+        self._duration = 3          # seconds per run
+        self._mode = "processes"
+        self._wire_format = "binary"    # text sequence numbers wrap at 99999
+        self._output = "benchmark.json"
+        self._quiet = True
+        self._burst_size = 1        # UDP datagrams per sendmmsg
+        self._batch_size = 1        # UDP datagrams per recvmmsg
+        self._startup_delay = 0.3   # seconds for receiver to bind
+        self._drain_time = 0.3      # seconds for receiver to empty queues after sender
+
+    def set_port(self, port):
+        """ First port, each run uses the next one """
+        self._port = port
+        return self
+
+    def set_transports(self, transports):
+        for transport in transports:
+            if transport not in SENDERS:
+                raise ValueError(f"Unknown transport: {transport}")
+        self._transports = list(transports)
+        return self
+
+    def set_frequencies(self, frequencies):
+        self._frequencies = list(frequencies)
+        return self
+
+    def set_payload_sizes(self, sizes):
+        """ Total payload sizes in bytes, see Sender.set_payload_size """
+        self._payload_sizes = list(sizes)
+        return self
+
+    def set_duration(self, duration):
+        self._duration = duration   # seconds per run
+        return self
+
+    def set_mode(self, mode):
+        """ 'threads' (receiver and sender in this process) or 'processes' """
+        if mode not in ("threads", "processes"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self._mode = mode
+        return self
+
+    def set_wire_format(self, wire_format):
+        """ 'text' or 'binary', see Sender.set_wire_format """
+        self._wire_format = wire_format
+        return self
+
+    def set_batching(self, burst_size=1, batch_size=1):
+        """ UDP only: datagrams per send (see UDPSender.set_burst_size)
+            and per receive (see UDPReceiver.set_batch_size) syscall """
+        if "tcp" in self._transports and burst_size > 1:
+            raise ValueError("Burst size is UDP only, set transports to ['udp']!")
+        self._burst_size = burst_size
+        self._batch_size = batch_size
+        return self
+
+    def set_output(self, path):
+        """ JSON file for the results, None to only return them """
+        self._output = path
+        return self
+
+    def set_quiet(self, quiet=True):
+        """ Hide the prints of senders and receivers """
+        self._quiet = quiet
+        return self
+
+    def run(self):
+        """ Run all combinations, write and return the report """
+        runs = []
+        port = self._port
+        for transport in self._transports:
+            for frequency in self._frequencies:
+                for payload_size in self._payload_sizes:
+                    config = {
+                        "transport": transport,
+                        "port": port,
+                        "frequency": frequency,
+                        "payload_size": payload_size,
+                        "duration": self._duration,
+                        "receiver_timeout": self._duration + self._startup_delay + 30,
+                        "wire_format": self._wire_format,
+                        "burst_size": self._burst_size if transport == "udp" else 1,
+                        "batch_size": self._batch_size if transport == "udp" else 1,
+                        "quiet": self._quiet,
+                    }
+                    port += 1
+                    result = self._run_one(config)
+                    self._print_run(result)
+                    runs.append(result)
+
+        report = {"meta": self._meta(), "runs": runs}
+        if self._output:
+            with open(self._output, "w") as file:
+                json.dump(report, file, indent=2)
+            print(f"Results written to {self._output}")
+        return report
+
+    def _run_one(self, config):
+        """ One receiver and sender pair, return result of the run.
+            The sender is not started if the receiver failed to start """
+        if self._mode == "threads":
+            finished = {}
+            stop = threading.Event()
+            with _quiet(config["quiet"]):
+                def listen():
+                    finished["receiver"] = _attempt(lambda: _receive(_create_receiver(config), stop.wait))
+
+                thread = threading.Thread(target=listen)
+                thread.start()
+                time.sleep(self._startup_delay)
+                if thread.is_alive():
+                    finished["sender"] = _attempt(lambda: _send(_create_sender(config)))
+                    time.sleep(self._drain_time)
+                stop.set()
+                thread.join()
+        else:
+            results = Queue()
+            stop, stop_sender = Pipe(duplex=False)
+            receiver = Process(target=_receiver_process, args=(config, stop, results))
+            receiver.start()
+            time.sleep(self._startup_delay)
+
+            # a TCP receiver may finish first, when the sender closes
+            finished = {}
+            if receiver.is_alive():
+                sender = Process(target=_sender_process, args=(config, results))
+                sender.start()
+                self._collect("sender", sender, results, finished)
+                sender.join()
+                time.sleep(self._drain_time)
+            try:
+                stop_sender.send(True)
+            except OSError:
+                pass    # receiver already done
+            self._collect("receiver", receiver, results, finished)
+            receiver.join()
+
+        for role in ("receiver", "sender"):
+            error = finished.get(role, ("not started", None))[0]
+            if error:
+                return self._failed(config, role, error)
+        return self._result(config, *finished["sender"][1], *finished["receiver"][1])
+
+    def _collect(self, role, process, results, finished):
+        """ Put results in finished by role, until role has reported.
+            A process that exited without reporting (killed, crashed in
+            the interpreter) is recorded as failed instead of waited for """
+        while role not in finished:
+            try:
+                name, *result = results.get(timeout=1)
+                finished[name] = result
+            except Empty:
+                if process.exitcode is not None:
+                    # let a result put just before exit arrive first
+                    try:
+                        name, *result = results.get(timeout=1)
+                        finished[name] = result
+                    except Empty:
+                        finished[role] = (f"exit code {process.exitcode}", None)
+
+    def _failed(self, config, role, error):
+        """ Result of a run that failed """
+        return {
+            "transport": config["transport"],
+            "mode": self._mode,
+            "frequency": config["frequency"],
+            "payload_size": config["payload_size"],
+            "burst_size": config["burst_size"],
+            "batch_size": config["batch_size"],
+            "error": f"{role}: {error}",
+        }
+
+    def _result(self, config, sender_stats, sender_cpu, elapsed, send_time, receiver_stats, receiver_cpu):
+        sent = sender_stats["packets_sent"]
+        received = receiver_stats["received"]
+        unique = received - receiver_stats["duplicates"]
+        payload_size = sender_stats.get("payload_size", config["payload_size"])
+        return {
+            "transport": config["transport"],
+            "mode": self._mode,
+            "frequency": config["frequency"],
+            "payload_size": payload_size,
+            "burst_size": config["burst_size"],
+            "batch_size": config["batch_size"],
+            "duration": elapsed,
+            "packets_sent": sent,
+            "packets_received": received,
+            "send_rate": sent / elapsed if elapsed else 0.0,
+            "receive_rate": received / elapsed if elapsed else 0.0,
+            "goodput_bps": unique * payload_size * 8 / elapsed if elapsed else 0.0,
+            "sender_send_cpu_per_packet": send_time / sent if sent else None,
+            "sender_cpu_with_pacing_per_packet": sender_cpu / sent if sent else None,
+            "receiver_cpu_per_packet": receiver_cpu / received if received else None,
+            "loss_rate": max(sent - unique, 0) / sent if sent else 0.0,
+            "lost": receiver_stats["lost"],
+            "out_of_order": receiver_stats["out_of_order"],
+            "reordered": receiver_stats["reordered"],
+            "duplicates": receiver_stats["duplicates"],
+            "send_jitter_p99": sender_stats.get("jitter_p99"),
+        }
+
+    def _meta(self):
+        """ What was measured, to tell reports of different versions apart """
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                capture_output=True,
+                text=True,
+                check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": self._mode,
+            "wire_format": self._wire_format,
+            "duration": self._duration,
+        }
+
+    def _print_run(self, result):
+        if "error" in result:
+            print(f"{result['transport']} {result['frequency']}Hz {result['payload_size']}B: "
+                  f"FAILED, {result['error']}")
+            return
+        print(f"{result['transport']} {result['frequency']}Hz {result['payload_size']}B: "
+              f"{result['receive_rate']:.0f} pkt/s received, "
+              f"goodput {result['goodput_bps'] / 1e6:.2f} Mbit/s, "
+              f"loss {result['loss_rate']:.2%}, reordered {result['reordered']}, "
+              f"CPU/pkt send {(result['sender_send_cpu_per_packet'] or 0) * 1e6:.1f}us, "
+              f"CPU/pkt send with pacing {(result['sender_cpu_with_pacing_per_packet'] or 0) * 1e6:.1f}us "
+              f"receive {(result['receiver_cpu_per_packet'] or 0) * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    benchmark = Benchmark()
+    benchmark.set_frequencies([1000, 10000, 50000]).set_payload_sizes([64, 512, 1460])
+    benchmark.run()
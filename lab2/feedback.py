@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+from abc import ABC, abstractmethod
+import struct
+
+# Feedback report, sent by the receiver to the sender every interval.
+# All fields big endian:
+#   magic       2 bytes     FEEDBACK_MAGIC, differs from the stream MAGIC (see wire.py)
+#   version     uint8
+#   flags       uint8       FLAG_DELAY if delay is set
+#   number      uint32      report number, to ignore reordered reports
+#   received    uint64      packets received so far
+#   lost        uint64      packets lost so far
+#   delay       int64       mean one-way delay (ns) in the interval, any clock offset included
+# Counters are cumulative, so a lost report only delays the information.
+
+FEEDBACK_MAGIC = b"\xa7\x1f"
+FEEDBACK_VERSION = 1
+FLAG_DELAY = 0x01
+REPORT = struct.Struct("!2sBBIQQq")
+
+
+def is_report(payload):
+    return payload[:2] == FEEDBACK_MAGIC
+
+
+def pack_report(number, received, lost, delay_ns):
+    """ Report as bytes, delay_ns None if not measured """
+    flags = FLAG_DELAY if delay_ns is not None else 0
+    return REPORT.pack(FEEDBACK_MAGIC, FEEDBACK_VERSION, flags, number, received, lost, delay_ns or 0)
+
+
+def parse_report(payload):
+    """ Return (number, received, lost, delay_ns or None).
+        Raise ValueError if payload is not a supported report """
+    if len(payload) < REPORT.size:
+        raise ValueError("Payload shorter than report")
+    magic, version, flags, number, received, lost, delay_ns = REPORT.unpack_from(payload)
+    if magic != FEEDBACK_MAGIC:
+        raise ValueError("Not a feedback report")
+    if version != FEEDBACK_VERSION:
+        raise ValueError(f"Unsupported feedback version: {version}")
+    return number, received, lost, delay_ns if flags & FLAG_DELAY else None
+
+
+class FeedbackReporter:
+    """ Receiver side of the feedback channel.
+        Collects one-way delays between reports, and builds reports
+        from the cumulative stream statistics. """
+
+    def __init__(self):
+        self._number = 0
+        self._delay_total = 0
+        self._delay_count = 0
+
+    def add_delay(self, delay_ns):
+        self._delay_total += delay_ns
+        self._delay_count += 1
+
+    def report(self, stream_stats):
+        """ Next report (bytes) from StreamStats.stats() """
+        self._number += 1
+        delay = self._delay_total // self._delay_count if self._delay_count else None
+        self._delay_total = self._delay_count = 0
+        return pack_report(self._number, stream_stats["received"], stream_stats["lost"], delay)
+
+    def get_reports(self):
+        return self._number
+
+
+class FeedbackTracker:
+    """ Sender side of the feedback channel.
+        Turns the cumulative counters of successive reports into loss
+        per interval, and the one-way delay into queueing delay: delay
+        above the lowest seen, so a constant clock offset cancels out. """
+
+    def __init__(self):
+        self._number = 0
+        self._received = 0
+        self._lost = 0
+        self._base_delay = None
+        self._reports = 0
+        self._ignored = 0
+
+    def update(self, payload):
+        """ Return (loss fraction, queueing delay in seconds or None) of a report,
+            or None if it is invalid or older than the last one """
+        try:
+            number, received, lost, delay_ns = parse_report(payload)
+        except ValueError:
+            self._ignored += 1
+            return None
+        if number <= self._number:
+            self._ignored += 1
+            return None
+        self._number = number
+        self._reports += 1
+
+        new_received = max(received - self._received, 0)
+        # lost can shrink, when late packets fill gaps
+        new_lost = max(lost - self._lost, 0)
+        self._received, self._lost = received, lost
+        total = new_received + new_lost
+        loss = new_lost / total if total else 0.0
+
+        queueing = None
+        if delay_ns is not None:
+            if self._base_delay is None or delay_ns < self._base_delay:
+                self._base_delay = delay_ns
+            queueing = (delay_ns - self._base_delay) / 1e9
+        return loss, queueing
+
+    def stats(self):
+        return {"reports": self._reports, "reports_ignored": self._ignored}
+
+
+class RateController(ABC):
+    """ Abstract sender rate controller.
+        Called with the current rate (packets per second) and the
+        feedback of one interval, returns the new rate, within limits.
+        Subclasses implement _update() """
+
+    def __init__(self, min_rate=10, max_rate=1000000):
+        """ Set rate limits (packets per second) """
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._timeout_decrease = 0.5
+
+    def set_limits(self, min_rate, max_rate):
+        if not 0 < min_rate <= max_rate:
+            raise ValueError("Rate limits must be positive, min <= max!")
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        return self
+
+    def update(self, rate, loss, queueing_delay):
+        """ New rate from loss fraction and queueing delay (seconds, None if unknown) """
+        return self._limit(self._update(rate, loss, queueing_delay))
+
+    def timeout(self, rate):
+        """ New rate when no feedback arrives, the path may be congested hard """
+        return self._limit(rate * self._timeout_decrease)
+
+    @abstractmethod
+    def _update(self, rate, loss, queueing_delay):
+        pass
+
+    def _limit(self, rate):
+        return min(max(rate, self._min_rate), self._max_rate)
+
+
+class AIMDController(RateController):
+    """ Additive increase, multiplicative decrease on loss.
+        Probes for capacity by 'increase' packets per second each report
+        without loss, and backs off by 'decrease' on loss """
+
+    def __init__(self, increase=100, decrease=0.5, loss_threshold=0.0, **limits):
+        """ Set step (packets per second), decrease factor, and the loss
+            fraction per interval tolerated before decreasing """
+        super().__init__(**limits)
+        self._increase = increase
+        self._decrease = decrease
+        self._loss_threshold = loss_threshold
+
+    def set_increase(self, increase):
+        self._increase = increase
+        return self
+
+    def set_decrease(self, decrease):
+        if not 0 < decrease < 1:
+            raise ValueError("Decrease factor must be between 0 and 1!")
+        self._decrease = decrease
+        return self
+
+    def set_loss_threshold(self, threshold):
+        self._loss_threshold = threshold
+        return self
+
+    def _update(self, rate, loss, queueing_delay):
+        if loss > self._loss_threshold:
+            return rate * self._decrease
+        return rate + self._increase
+
+
+class DelayController(RateController):
+    """ Delay based control, in the spirit of LEDBAT.
+        Keeps queueing delay near a target: rate grows by up to 'gain'
+        per report while the queue is short, and shrinks proportionally
+        as it grows past the target, usually before anything is lost.
+        Loss still decreases multiplicatively. Needs send timestamps,
+        without delay samples it falls back to additive increase """
+
+    def __init__(self, target=0.005, gain=0.1, decrease=0.5, increase=100, **limits):
+        """ Set target queueing delay (seconds), max relative change per report,
+            decrease factor on loss, and additive step without delay samples """
+        super().__init__(**limits)
+        self._target = target
+        self._gain = gain
+        self._decrease = decrease
+        self._increase = increase
+
+    def set_target(self, target):
+        if target <= 0:
+            raise ValueError("Target delay must be positive!")
+        self._target = target
+        return self
+
+    def set_gain(self, gain):
+        self._gain = gain
+        return self
+
+    def _update(self, rate, loss, queueing_delay):
+        if loss > 0:
+            return rate * self._decrease
+        if queueing_delay is None:
+            return rate + self._increase
+        off_target = max((self._target - queueing_delay) / self._target, -1.0)
+        return rate * (1 + self._gain * off_target)
+
+
+def create_controller(name, **options):
+    """ Create controller by name: 'aimd' or 'delay' """
+    if name == "aimd":
+        return AIMDController(**options)
+    if name == "delay":
+        return DelayController(**options)
+    raise ValueError(f"Unknown rate controller: {name}")
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+from abc import ABC, abstractmethod
+import struct
+import wire
+
+class FramingError(ValueError):
+    """ The stream does not follow the framing, it can not be split further """
+    pass
+
+
+class StreamFramer(ABC):
+    """ Abstract message framer for a byte stream.
+        Receives straight into a reusable buffer with recv_into(),
+        and splits out complete messages, keeping partial ones
+        until the rest arrives.
+        Subclasses must implement _split() for their framing. """
+
+    def __init__(self, bufsize=65536):
+        """ Allocate receive buffer """
+        self._buffer = bytearray(bufsize)
+        self._view = memoryview(self._buffer)
+        self._start = 0     # first unconsumed byte
+        self._end = 0       # end of received data
+
+    def recv_into(self, sock):
+        """ Receive from socket into free buffer space.
+            Return number of bytes received, 0 if peer closed """
+        received = sock.recv_into(self.get_buffer())
+        self.buffer_updated(received)
+        return received
+
+    def get_buffer(self):
+        """ Free buffer space to receive into, as a writable view
+            (fits asyncio.BufferedProtocol.get_buffer) """
+        if self._end == len(self._buffer):
+            self._make_room()
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes):
+        """ Register nbytes written into the view from get_buffer() """
+        self._end += nbytes
+
+    def feed(self, data):
+        """ Copy data into buffer (for sources other than a socket) """
+        if len(self._buffer) - self._end < len(data):
+            self._make_room(len(data))
+        self._view[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def messages(self):
+        """ Return list of complete messages as memoryviews into the buffer.
+            Views are only valid until the next recv_into() or feed().
+            Raise FramingError if the stream breaks the framing. Messages
+            in front of the break are returned first, the next call raises """
+        messages = self._split()
+        if self._start == self._end:
+            # everything consumed, start over at beginning of buffer
+            self._start = self._end = 0
+            self._reset_scan()
+        return messages
+
+    def pending(self):
+        """ Number of buffered bytes belonging to an incomplete message """
+        return self._end - self._start
+
+    def _make_room(self, needed=1):
+        """ Move partial message to front of buffer,
+            grow buffer if there is still not room for 'needed' bytes """
+        pending = self._end - self._start
+        if self._start > 0:
+            self._view[:pending] = self._view[self._start:self._end]
+            self._move_scan(-self._start)
+            self._start, self._end = 0, pending
+        if len(self._buffer) - self._end < needed:
+            # message larger than buffer, copy to a bigger buffer
+            # (resizing in place is not allowed while views are exported)
+            buffer = bytearray(max(2 * len(self._buffer), self._end + needed))
+            buffer[:self._end] = self._view[:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+
+    def _reset_scan(self):
+        """ Hook for framers that remember a scan position """
+        pass
+
+    def _move_scan(self, offset):
+        """ Hook for framers that remember a scan position """
+        pass
+
+    @abstractmethod
+    def _split(self):
+        """ Consume and return complete messages from _start to _end.
+            Must be implemented by subclass """
+        pass
+
+
+class TerminatorFramer(StreamFramer):
+    """ Messages end with a terminator, e.g. '10001;AAAA....####'.
+        Returned messages exclude the terminator. """
+
+    def __init__(self, terminator=b"####", bufsize=65536):
+        """ Set terminator """
+        super().__init__(bufsize)
+        self._terminator = terminator
+        self._scan = 0  # where to continue searching for terminator
+
+    def _split(self):
+        """ Split on terminator, never rescanning bytes already searched """
+        messages = []
+        term_len = len(self._terminator)
+        pos = max(self._start, self._scan)
+        while True:
+            index = self._buffer.find(self._terminator, pos, self._end)
+            if index < 0:
+                break
+            messages.append(self._view[self._start:index])
+            self._start = pos = index + term_len
+        self._scan = max(self._start, self._end - term_len + 1)
+        return messages
+
+    def _reset_scan(self):
+        self._scan = 0
+
+    def _move_scan(self, offset):
+        self._scan = max(0, self._scan + offset)
+
+
+class LengthPrefixFramer(StreamFramer):
+    """ Messages are preceded by a 4 byte big endian length """
+
+    _prefix = struct.Struct("!I")
+
+    def _split(self):
+        """ Split on length prefixes """
+        messages = []
+        prefix_size = self._prefix.size
+        while self._end - self._start >= prefix_size:
+            length, = self._prefix.unpack_from(self._buffer, self._start)
+            begin = self._start + prefix_size
+            if self._end - begin < length:
+                break
+            messages.append(self._view[begin:begin + length])
+            self._start = begin + length
+        return messages
+
+
+class BinaryHeaderFramer(StreamFramer):
+    """ Messages in binary wire format, framed by the header length field.
+        Returned messages include the header. """
+
+    def _split(self):
+        """ Split on header length fields, up to an invalid header """
+        messages = []
+        header_size = wire.HEADER.size
+        while self._end - self._start >= header_size:
+            try:
+                seq, _, length = wire.parse_header(self._view[self._start:self._start + header_size])
+                if length < header_size:
+                    raise ValueError(f"Invalid message length {length} (sequence {seq})")
+            except ValueError as e:
+                if messages:
+                    break   # _start stays at the invalid header, raised next call
+                raise FramingError(f"Invalid message header: {e}") from None
+            if self._end - self._start < length:
+                break
+            messages.append(self._view[self._start:self._start + length])
+            self._start += length
+        return messages
+
+
+class AutoFramer(TerminatorFramer, BinaryHeaderFramer, LengthPrefixFramer):
+    """ Detects framing from the first byte of the stream: binary wire
+        format if it starts the header magic, length prefix if it is 0
+        (the high byte of a length below 16 MiB), terminator if it is an
+        ASCII digit (a text sequence number). Any other first byte raises
+        FramingError, such streams need their framing set explicitly. """
+
+    def __init__(self, terminator=b"####", bufsize=65536):
+        super().__init__(terminator, bufsize)
+        self._split_framing = None      # _split of the detected framing
+
+    def _split(self):
+        if self._split_framing is None:
+            if self._end == self._start:
+                return []
+            first = self._buffer[self._start]
+            if first == wire.MAGIC[0]:
+                self._split_framing = BinaryHeaderFramer._split
+            elif first == 0:
+                self._split_framing = LengthPrefixFramer._split
+            elif 0x30 <= first <= 0x39:
+                self._split_framing = TerminatorFramer._split
+            else:
+                raise FramingError(f"Can not detect framing from first byte 0x{first:02x}, set it explicitly")
+        return self._split_framing(self)
+
+
+def create_framer(framing, terminator=b"####"):
+    """ Create framer by name: 'auto', 'terminator', 'length' or 'binary' """
+    if framing == "auto":
+        return AutoFramer(terminator)
+    if framing == "terminator":
+        return TerminatorFramer(terminator)
+    if framing == "length":
+        return LengthPrefixFramer()
+    if framing == "binary":
+        return BinaryHeaderFramer()
+    raise ValueError(f"Unknown framing: {framing}")
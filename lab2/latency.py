@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+class LogHistogram:
+    """ Histogram of non-negative integers, of fixed size whatever the count.
+        Log-linear: 16 sub-buckets per power of two (< 6.25% relative
+        error), values below 32 are exact. """
+
+    SUB_BUCKETS = 16
+    BUCKETS = SUB_BUCKETS * 64
+
+    def __init__(self):
+        self._counts = [0] * self.BUCKETS
+        self._count = 0
+
+    def add(self, value):
+        self._counts[self._bucket(value)] += 1
+        self._count += 1
+
+    def _bucket(self, value):
+        """ Index of the bucket of a value """
+        shift = max(0, value.bit_length() - 5)
+        return min(shift * self.SUB_BUCKETS + (value >> shift), self.BUCKETS - 1)
+
+    def _bucket_value(self, index):
+        """ Midpoint of the values in a bucket """
+        if index < 2 * self.SUB_BUCKETS:
+            return index
+        shift = index // self.SUB_BUCKETS - 1
+        low = (index - shift * self.SUB_BUCKETS) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def percentile(self, p):
+        """ Approximate nearest rank percentile, 0 if empty """
+        rank = max(1, round(p / 100 * self._count))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return self._bucket_value(index)
+        return 0
+
+
+class LatencyStats:
+    """ Online one-way delay and jitter statistics.
+        Interarrival jitter is computed as in RFC 3550 (section 6.4.1),
+        delay percentiles come from a LogHistogram of microseconds.
+        Delays depend on sender and receiver clocks being in sync,
+        negative delays (clock offset) are counted and recorded as 0. """
+
+    def __init__(self):
+        """ Reset counters and histogram """
+        self._count = 0
+        self._negative = 0
+        self._min = None
+        self._max = None
+        self._total = 0
+        self._jitter = 0.0
+        self._last_transit = None
+        self._histogram = LogHistogram()
+
+    def update(self, send_ns, receive_ns):
+        """ Register one packet by its send and receive times (ns) """
+        transit = receive_ns - send_ns
+
+        if self._last_transit is not None:
+            # J(i) = J(i-1) + (|D(i-1,i)| - J(i-1)) / 16
+            self._jitter += (abs(transit - self._last_transit) - self._jitter) / 16
+        self._last_transit = transit
+
+        if transit < 0:
+            self._negative += 1
+            transit = 0
+        if self._min is None or transit < self._min:
+            self._min = transit
+        if self._max is None or transit > self._max:
+            self._max = transit
+        self._total += transit
+        self._count += 1
+        self._histogram.add(transit // 1000)
+
+    def percentile(self, p):
+        """ Approximate delay percentile in seconds """
+        return self._histogram.percentile(p) / 1e6
+
+    def stats(self):
+        """ Delay and jitter statistics (seconds) as a dict """
+        if not self._count:
+            return {"samples": 0}
+        return {
+            "samples": self._count,
+            "negative_delays": self._negative,
+            "delay_min": self._min / 1e9,
+            "delay_mean": self._total / self._count / 1e9,
+            "delay_max": self._max / 1e9,
+            "delay_p50": self.percentile(50),
+            "delay_p90": self.percentile(90),
+            "delay_p99": self.percentile(99),
+            "jitter": self._jitter / 1e9,
+        }
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+import heapq
+import random
+import selectors
+import threading
+import time
+from socket import socket, AF_INET, SOCK_DGRAM
+
+class LinkEmulator:
+    """ Impaired UDP link, for loopback tests.
+        Relays datagrams from senders to a receiver through an emulated
+        bottleneck: random drops, a capacity (packets per second) with a
+        tail drop queue, and a fixed plus random delay. Datagrams from the
+        receiver (feedback reports) go back to the last sender unimpaired.
+        Runs in a background thread. """
+
+    def __init__(self):
+        """ Set defaults, a transparent link """
+        self._port = 12001
+        self._forward = ("127.0.0.1", 12000)
+        self._drop_rate = 0.0
+        self._capacity = None       # packets per second, None = unlimited
+        self._queue_size = 100      # packets
+        self._delay = 0.0           # seconds
+        self._jitter = 0.0          # seconds, uniform, may reorder
+        self._random = random.Random()
+        self._sockets = None
+        self._thread = None
+        self._stopped = False
+        self._scheduled = []        # heap of (release time, number, payload)
+        self._link_free = 0.0       # time the bottleneck has sent its queue
+        self._sender = None
+        self._counters = dict.fromkeys(
+            ("received", "forwarded", "dropped", "queue_drops", "returned"), 0
+        )
+
+    def set_port(self, port):
+        """ Port senders send to """
+        self._port = port
+        return self
+
+    def set_forward(self, name, port):
+        """ Receiver to relay to """
+        self._forward = (name, port)
+        return self
+
+    def set_drop_rate(self, rate):
+        """ Fraction of datagrams dropped at random """
+        if not 0 <= rate <= 1:
+            raise ValueError("Drop rate must be between 0 and 1!")
+        self._drop_rate = rate
+        return self
+
+    def set_capacity(self, capacity, queue_size=100):
+        """ Bottleneck of 'capacity' packets per second, queueing at most
+            queue_size packets. None for unlimited """
+        self._capacity = capacity
+        self._queue_size = queue_size
+        return self
+
+    def set_delay(self, delay, jitter=0.0):
+        """ Delay added to every datagram, plus up to jitter (seconds) at random """
+        self._delay = delay
+        self._jitter = jitter
+        return self
+
+    def set_seed(self, seed):
+        """ Seed of drops and jitter, for repeatable runs """
+        self._random.seed(seed)
+        return self
+
+    def start(self):
+        """ Bind, and relay in a background thread until stop() """
+        inbound = socket(AF_INET, SOCK_DGRAM)
+        inbound.bind(("", self._port))
+        outbound = socket(AF_INET, SOCK_DGRAM)
+        outbound.connect(self._forward)
+        self._sockets = (inbound, outbound)
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._stopped = True
+        self._thread.join()
+        self._thread = None
+        for sock in self._sockets:
+            sock.close()
+
+    def get_stats(self):
+        return dict(self._counters)
+
+    def _run(self):
+        inbound, outbound = self._sockets
+        selector = selectors.DefaultSelector()
+        for sock in self._sockets:
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ)
+        try:
+            while not self._stopped:
+                timeout = 0.05      # check stop flag this often
+                if self._scheduled:
+                    timeout = min(timeout, max(self._scheduled[0][0] - time.perf_counter(), 0))
+                for key, _ in selector.select(timeout):
+                    if key.fileobj is inbound:
+                        self._on_inbound(inbound)
+                    else:
+                        self._on_outbound(inbound, outbound)
+                self._release(outbound)
+        finally:
+            selector.close()
+
+    def _on_inbound(self, inbound):
+        """ Datagrams from senders, into the link """
+        while True:
+            try:
+                payload, self._sender = inbound.recvfrom(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._counters["received"] += 1
+            if self._drop_rate and self._random.random() < self._drop_rate:
+                self._counters["dropped"] += 1
+                continue
+
+            now = time.perf_counter()
+            departure = now
+            if self._capacity:
+                start = max(now, self._link_free)
+                if (start - now) * self._capacity >= self._queue_size:
+                    self._counters["queue_drops"] += 1
+                    continue
+                self._link_free = departure = start + 1 / self._capacity
+            release = departure + self._delay
+            if self._jitter:
+                release += self._random.random() * self._jitter
+            heapq.heappush(self._scheduled, (release, self._counters["received"], payload))
+
+    def _on_outbound(self, inbound, outbound):
+        """ Datagrams from the receiver, back to the sender """
+        while True:
+            try:
+                payload = outbound.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionError:
+                continue    # ICMP error from an earlier forward
+            if self._sender:
+                inbound.sendto(payload, self._sender)
+                self._counters["returned"] += 1
+
+    def _release(self, outbound):
+        """ Forward datagrams that are due """
+        now = time.perf_counter()
+        while self._scheduled and self._scheduled[0][0] <= now:
+            _, _, payload = heapq.heappop(self._scheduled)
+            try:
+                outbound.send(payload)
+                self._counters["forwarded"] += 1
+            except (BlockingIOError, ConnectionError):
+                self._counters["queue_drops"] += 1
+
+
+if __name__ == "__main__":
+    # Find the rate a 2000 packets/s bottleneck sustains
+    from feedback import AIMDController
+    from udp_receiver import UDPReceiver
+    from udp_sender import UDPSender
+
+    duration = 10
+    link = LinkEmulator().set_port(12001).set_forward("127.0.0.1", 12000)
+    link.set_capacity(2000, queue_size=50).set_delay(0.01).start()
+
+    receiver = UDPReceiver().set_port(12000).set_timeout(duration + 2).set_feedback(0.05)
+    receiver.set_log(None).set_diagnostics_interval(5)
+    listener = threading.Thread(target=receiver.listen)
+    listener.start()
+    time.sleep(0.2)
+
+    sender = UDPSender().set_receiver("127.0.0.1", 12001).set_wire_format("binary")
+    sender.set_stream_frequency(500).set_timeout(duration)
+    sender.set_rate_controller(AIMDController(increase=50))
+    sender.stream()
+    receiver.stop()
+    listener.join()
+    link.stop()
+    print("Link:", link.get_stats())
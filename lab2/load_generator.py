@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+from multiprocessing import Process, Queue
+from queue import Empty
+import time
+from tcp_sender import TCPSender
+from udp_sender import UDPSender
+
+SENDERS = {"tcp": TCPSender, "udp": UDPSender}
+
+
+def _run_sender(config, index, start_time, results):
+    """ Worker process: stream with one sender, put its statistics in results,
+        or the error it failed with, so the parent never waits for nothing """
+    try:
+        results.put(_stream(config, index, start_time))
+    except Exception as e:
+        results.put({"index": index, "error": f"{type(e).__name__}: {e}"})
+
+
+def _stream(config, index, start_time):
+    sender = SENDERS[config["transport"]]()
+    sender.set_receiver(config["receiver_name"], config["receiver_port"])
+    sender.set_stream_frequency(config["frequency"])
+    sender.set_timeout(config["timeout"])
+    sender.set_sequence_start(config["sequence_start"] + index * config["sequence_stride"])
+    sender.set_timestamps(config["timestamps"])
+    sender.set_wire_format(config["wire_format"])
+    if config["payload_size"]:
+        sender.set_payload_size(config["payload_size"])
+    if config["burst_size"] > 1:
+        sender.set_burst_size(config["burst_size"])
+    sender.set_start_time(start_time)
+
+    started = time.process_time()
+    sender.stream()
+    stats = sender.get_stats()
+    stats["index"] = index
+    stats["cpu_time"] = time.process_time() - started
+    return stats
+
+
+class LoadGenerator:
+    """ Parallel sender fleet.
+        Runs one TCPSender or UDPSender per process, each with its own
+        socket, share of the total rate and sequence number space,
+        starting at the same time. Merges their statistics. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._transport = "udp"
+        self._receiver_name = None
+        self._receiver_port = None
+        self._frequency = 1000
+        self._timeout = 60
+        self._processes = 2
+        self._sequence_start = 10001
+        self._sequence_stride = 0   # 0 = same sequence space per sender
+        self._payload_size = None
+        self._burst_size = 1
+        self._timestamps = False
+        self._wire_format = "text"
+        self._startup_delay = 1     # seconds for processes to get ready
+
+    def set_transport(self, transport):
+        """ 'tcp' or 'udp' """
+        if transport not in SENDERS:
+            raise ValueError(f"Unknown transport: {transport}")
+        self._transport = transport
+        return self
+
+    def set_receiver(self, name, port):
+        self._receiver_name = name
+        self._receiver_port = port
+        return self
+
+    def set_stream_frequency(self, freq):
+        """ Total frequency, shared equally by the processes """
+        self._frequency = freq
+        return self
+
+    def set_timeout(self, timeout):
+        self._timeout = timeout     # seconds
+        return self
+
+    def set_processes(self, processes):
+        self._processes = processes
+        return self
+
+    def set_sequence_stride(self, stride):
+        """ Sender i starts at sequence start + i * stride.
+            Use with receivers that do not tell senders apart.
+            Selects the binary wire format, as text sequence numbers
+            wrap at 99999 into the range of another sender """
+        self._sequence_stride = stride
+        if stride:
+            self._wire_format = "binary"
+        return self
+
+    def set_payload_size(self, size):
+        self._payload_size = size
+        return self
+
+    def set_burst_size(self, size):
+        """ Packets per pacing tick (udp only, checked by run()) """
+        self._burst_size = size
+        return self
+
+    def set_timestamps(self, enabled=True):
+        self._timestamps = enabled
+        return self
+
+    def set_wire_format(self, wire_format):
+        """ 'text' or 'binary', see Sender.set_wire_format """
+        self._wire_format = wire_format
+        return self
+
+    def run(self):
+        """ Start senders, wait for them, return merged report """
+        if not self._receiver_name or not self._receiver_port:
+            raise Exception("Set receiver (name and port) before streaming!")
+        if self._burst_size > 1 and self._transport != "udp":
+            raise ValueError("Burst size is only supported by udp senders!")
+        if self._sequence_stride and self._wire_format != "binary":
+            raise ValueError("Sequence stride needs the binary wire format, text sequence numbers wrap!")
+
+        config = {
+            "transport": self._transport,
+            "receiver_name": self._receiver_name,
+            "receiver_port": self._receiver_port,
+            "frequency": self._frequency / self._processes,
+            "timeout": self._timeout,
+            "sequence_start": self._sequence_start,
+            "sequence_stride": self._sequence_stride,
+            "payload_size": self._payload_size,
+            "burst_size": self._burst_size,
+            "timestamps": self._timestamps,
+            "wire_format": self._wire_format,
+        }
+
+        print(f"Starting {self._processes} {self._transport} senders "
+              f"at {config['frequency']:.1f}Hz each")
+
+        results = Queue()
+        start_time = time.time() + self._startup_delay
+        processes = [
+            Process(target=_run_sender, args=(config, index, start_time, results))
+            for index in range(self._processes)
+        ]
+        for process in processes:
+            process.start()
+
+        senders = self._collect(processes, results)
+        for process in processes:
+            process.join()
+
+        report = self._merge([stats for stats in senders if "error" not in stats])
+        report["failed"] = [stats for stats in senders if "error" in stats]
+        self._print_status(report)
+        return report
+
+    def _collect(self, processes, results):
+        """ Statistics of every sender by index. A process that exited
+            without reporting (killed, crashed in the interpreter) is
+            reported as failed instead of being waited for """
+        senders = {}
+        while len(senders) < len(processes):
+            try:
+                stats = results.get(timeout=1)
+                senders[stats["index"]] = stats
+            except Empty:
+                for index, process in enumerate(processes):
+                    if index not in senders and process.exitcode is not None:
+                        # let a result put just before exit arrive first
+                        try:
+                            stats = results.get(timeout=1)
+                            senders[stats["index"]] = stats
+                        except Empty:
+                            senders[index] = {"index": index, "error": f"exit code {process.exitcode}"}
+                        break
+        return [senders[index] for index in sorted(senders)]
+
+    def _merge(self, senders):
+        """ Merge per process statistics into one report """
+        packets = sum(stats["packets_sent"] for stats in senders)
+        target = sum(stats.get("target_rate", 0) for stats in senders)
+        achieved = sum(stats.get("achieved_rate", 0) for stats in senders)
+        return {
+            "processes": len(senders),
+            "packets_sent": packets,
+            "target_rate": target,
+            "achieved_rate": achieved,
+            "rate_error": (achieved - target) / target if target else 0.0,
+            "jitter_p99_max": max((stats.get("jitter_p99", 0) for stats in senders), default=0),
+            "overruns": sum(stats.get("overruns", 0) for stats in senders),
+            "cpu_time": sum(stats["cpu_time"] for stats in senders),
+            "senders": senders,
+        }
+
+    def _print_status(self, report):
+        print(f"{report['packets_sent']} packets sent by {report['processes']} processes")
+        print(f"Rate: {report['achieved_rate']:.1f}Hz "
+              f"(target {report['target_rate']:.1f}Hz, error {report['rate_error']:+.3%})")
+        print(f"Jitter p99 (worst sender): {report['jitter_p99_max'] * 1e6:.1f}us, "
+              f"CPU time: {report['cpu_time']:.2f}s")
+        for failed in report["failed"]:
+            print(f"Sender {failed['index']} failed: {failed['error']}")
+
+
+if __name__ == "__main__":
+    rec_name = "127.0.0.1"
+    rec_port = 12000
+    freq = 20000
+    timeout = 30
+
+    load_generator = LoadGenerator()
+    load_generator.set_receiver(rec_name, rec_port).set_stream_frequency(freq).set_timeout(timeout)
+    load_generator.set_processes(4)
+    load_generator.run()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+class Diagnostics:
+    """ Rate limited diagnostic prints.
+        At most one message per key and interval is printed, the rest
+        are counted and reported with the next one, so a burst of
+        events never floods the output from the hot path. """
+
+    def __init__(self, interval=1.0):
+        """ Set min seconds between messages of the same key """
+        self._interval = interval
+        self._last = {}         # key -> monotonic time of last print
+        self._suppressed = {}   # key -> messages not printed since
+
+    def set_interval(self, interval):
+        self._interval = interval
+        return self
+
+    def log(self, key, message, *args):
+        """ Print message.format(*args), unless one of key was printed less
+            than interval ago. Formatting is left until it is printed,
+            so a suppressed message costs a dict lookup """
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last < self._interval:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+        self._last[key] = now
+        if args:
+            message = message.format(*args)
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            message += f" ({suppressed} more since last)"
+        print(message)
+
+    def suppressed(self):
+        """ Messages not printed since the last one, per key """
+        return dict(self._suppressed)
+
+
+class SamplingProfiler:
+    """ Timing hooks for hot path methods.
+        Replaces methods of an object by wrappers that count every
+        call, and time every n:th, so overhead stays low at high rates. """
+
+    def __init__(self, every=100, clock=time.perf_counter_ns):
+        """ Time one call in 'every', with clock (ns): wall time by default,
+            time.thread_time_ns for CPU time, which leaves out time the
+            thread was preempted while in the call """
+        self._every = every
+        self._clock = clock
+        self._stats = {}        # name -> [calls, sampled, total ns, max ns]
+
+    def instrument(self, obj, names):
+        """ Wrap methods 'names' of obj (on the instance, the class is untouched) """
+        for name in names:
+            setattr(obj, name, self._wrap(name, getattr(obj, name)))
+        return self
+
+    def uninstrument(self, obj, names):
+        for name in names:
+            obj.__dict__.pop(name, None)
+
+    def _wrap(self, name, function):
+        stats = self._stats.setdefault(name, [0, 0, 0, 0])
+        every = self._every
+        clock = self._clock
+
+        def wrapper(*args):
+            stats[0] += 1
+            if stats[0] % every:
+                return function(*args)
+            started = clock()
+            try:
+                return function(*args)
+            finally:
+                elapsed = clock() - started
+                stats[1] += 1
+                stats[2] += elapsed
+                if elapsed > stats[3]:
+                    stats[3] = elapsed
+
+        return wrapper
+
+    def counters(self):
+        """ Flat counters for Metrics, per method """
+        counters = {}
+        for name, (calls, sampled, total, maximum) in self._stats.items():
+            name = name.strip("_")
+            counters[f"profile_{name}_calls"] = calls
+            counters[f"profile_{name}_sampled"] = sampled
+            counters[f"profile_{name}_sampled_ns"] = total
+        return counters
+
+    def stats(self):
+        """ Per method: calls, mean and max time of sampled calls (seconds),
+            and estimated total time """
+        stats = {}
+        for name, (calls, sampled, total, maximum) in self._stats.items():
+            mean = total / sampled / 1e9 if sampled else 0.0
+            stats[name] = {
+                "calls": calls,
+                "sampled": sampled,
+                "mean": mean,
+                "max": maximum / 1e9,
+                "total": mean * calls,
+            }
+        return stats
+
+    def print_stats(self):
+        for name, stats in self.stats().items():
+            print(f"Profile {name}: {stats['calls']} calls, mean {stats['mean'] * 1e6:.2f}us, "
+                  f"max {stats['max'] * 1e6:.2f}us, total ~{stats['total']:.3f}s")
+
+
+class Metrics:
+    """ Periodic snapshots of counters.
+        A background thread reads the cumulative counters of a source
+        every interval, and computes per second rates of each.
+        The hot path only increments plain integers it already has,
+        nothing is locked. Snapshots can be appended to a JSON lines
+        file, and served as Prometheus text on localhost. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._interval = 1.0
+        self._jsonl_path = None
+        self._prometheus_port = None
+        self._prefix = "telecom"
+        self._source = None
+        self._labels = {}
+        self._latest = {}
+        self._previous = None
+        self._file = None
+        self._server = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()   # snapshot vs HTTP handler, not the hot path
+
+    def set_interval(self, interval):
+        self._interval = interval   # seconds
+        return self
+
+    def set_jsonl(self, path):
+        """ Append one JSON object per snapshot to path """
+        self._jsonl_path = path
+        return self
+
+    def set_prometheus(self, port):
+        """ Serve metrics as Prometheus text on http://127.0.0.1:port/metrics """
+        self._prometheus_port = port
+        return self
+
+    def set_prefix(self, prefix):
+        """ Prefix of Prometheus metric names """
+        self._prefix = prefix
+        return self
+
+    def start(self, source, labels=None):
+        """ Snapshot source() (dict of cumulative counters) every interval """
+        self._source = source
+        self._labels = labels or {}
+        self._previous = None
+        self._stop.clear()
+        if self._jsonl_path:
+            self._file = open(self._jsonl_path, "a")
+        if self._prometheus_port is not None:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self._prometheus_port), self._handler())
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.snapshot()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Take a last snapshot, close file and endpoint """
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.snapshot()
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def get_port(self):
+        """ Port of the Prometheus endpoint (useful with port 0) """
+        return self._server.server_address[1] if self._server else None
+
+    def get_latest(self):
+        with self._lock:
+            return dict(self._latest)
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self.snapshot()
+
+    def snapshot(self):
+        """ Read counters, compute rates since last snapshot, export """
+        now = time.monotonic()
+        counters = self._source()
+        snapshot = {"time": time.time(), **self._labels, **counters}
+        if self._previous:
+            then, previous = self._previous
+            elapsed = now - then
+            snapshot["interval"] = elapsed
+            for name, value in counters.items():
+                if name in previous and elapsed > 0:
+                    snapshot[f"{name}_per_s"] = (value - previous[name]) / elapsed
+        self._previous = (now, counters)
+
+        with self._lock:
+            self._latest = snapshot
+        if self._file:
+            self._file.write(json.dumps(snapshot) + "\n")
+            self._file.flush()
+        return snapshot
+
+    def prometheus_text(self):
+        """ Latest snapshot in Prometheus text exposition format """
+        snapshot = self.get_latest()
+        labels = ",".join(f'{name}="{value}"' for name, value in self._labels.items())
+        labels = f"{{{labels}}}" if labels else ""
+        lines = []
+        for name, value in snapshot.items():
+            if name in self._labels or name == "time" or not isinstance(value, (int, float)):
+                continue
+            kind = "gauge" if name.endswith("_per_s") or name == "interval" else "counter"
+            metric = f"{self._prefix}_{name}"
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _handler(self):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass    # no access log on stderr
+
+        return Handler
+
+
+class Instrumented:
+    """ Metrics, profiling and rate limited diagnostics,
+        shared by Sender and Receiver """
+
+    def __init__(self):
+        """ Nothing instrumented by default """
+        self._metrics = None
+        self._profiler = None
+        self._diagnostics = Diagnostics()
+        self._instrumented = False
+
+    def set_metrics(self, metrics):
+        """ Metrics started and stopped with the stream, None disables """
+        self._metrics = metrics
+        return self
+
+    def set_profiler(self, profiler):
+        """ SamplingProfiler for the hot path methods, None disables """
+        self._profiler = profiler
+        return self
+
+    def set_diagnostics_interval(self, interval):
+        """ Min seconds between diagnostic prints of one kind """
+        self._diagnostics.set_interval(interval)
+        return self
+
+    def _profiled_methods(self):
+        """ Names of the hot path methods, overridden by subclasses """
+        return []
+
+    def _metric_counters(self):
+        """ Cumulative counters, overridden by subclasses """
+        return {}
+
+    def _collect_metrics(self):
+        counters = self._metric_counters()
+        if self._profiler:
+            counters.update(self._profiler.counters())
+        return counters
+
+    def _start_instrumentation(self, role):
+        self._instrumented = True
+        if self._profiler:
+            self._profiler.instrument(self, self._profiled_methods())
+        if self._metrics:
+            self._metrics.start(self._collect_metrics, {"role": role})
+
+    def _stop_instrumentation(self):
+        if not self._instrumented:
+            return
+        self._instrumented = False
+        if self._metrics:
+            self._metrics.stop()
+        if self._profiler:
+            self._profiler.uninstrument(self, self._profiled_methods())
+            self._profiler.print_stats()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import socket
+import sys
+from socket import AF_INET, htons, inet_aton, gethostbyname
+from socket import timeout as socket_timeout
+
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)   # not available on Windows
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", _MsgHdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+
+class _SockAddrIn(ctypes.Structure):
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort),
+        ("sin_port", ctypes.c_uint16),
+        ("sin_addr", ctypes.c_ubyte * 4),
+        ("sin_zero", ctypes.c_ubyte * 8),
+    ]
+
+
+def _load_libc():
+    """ Return libc if it exports sendmmsg and recvmmsg, else None """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+_libc = _load_libc()
+
+
+def has_mmsg():
+    """ True if batched syscalls are available on this platform """
+    return _libc is not None
+
+
+def _buffer_address(buffer):
+    """ Address of a bytes-like object's data. Caller keeps buffer alive """
+    if isinstance(buffer, bytes):
+        return ctypes.cast(ctypes.c_char_p(buffer), ctypes.c_void_p).value
+    return ctypes.addressof(ctypes.c_char.from_buffer(buffer))
+
+
+class BatchSender:
+    """ Send many datagrams to one address per syscall.
+        Uses sendmmsg() through ctypes where libc provides it (Linux),
+        and falls back to a tight sendto() loop elsewhere.
+        Message headers point at fixed payload buffers given once with
+        set_buffers(), so a send only passes a count to the kernel.
+        Pointing them at arbitrary payloads on every send (send())
+        costs more in ctypes than the saved syscalls win. """
+
+    def __init__(self, sock, address, max_batch=64, use_mmsg=True):
+        """ Resolve address once, and preallocate message headers """
+        host, port = address
+        self._socket = sock
+        self._address = (gethostbyname(host), port)
+        self._max_batch = max_batch
+        self._mmsg = use_mmsg and has_mmsg() and sock.family == AF_INET
+
+        if self._mmsg:
+            self._sockaddr = _SockAddrIn(AF_INET, htons(port))
+            ctypes.memmove(self._sockaddr.sin_addr, inet_aton(self._address[0]), 4)
+            self._iovecs = (_IOVec * max_batch)()
+            self._msgs = (_MMsgHdr * max_batch)()
+            for i in range(max_batch):
+                hdr = self._msgs[i].msg_hdr
+                hdr.msg_name = ctypes.addressof(self._sockaddr)
+                hdr.msg_namelen = ctypes.sizeof(self._sockaddr)
+                hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+                hdr.msg_iovlen = 1
+        self._buffers = []
+
+    def uses_mmsg(self):
+        return self._mmsg
+
+    def set_buffers(self, buffers):
+        """ Point message headers at fixed, writable payload buffers once.
+            Caller keeps them alive, and rewrites their contents between sends """
+        if len(buffers) > self._max_batch:
+            raise ValueError("More buffers than max batch size!")
+        self._buffers = list(buffers)
+        if self._mmsg:
+            for i, buffer in enumerate(self._buffers):
+                self._iovecs[i].iov_base = _buffer_address(buffer)
+                self._iovecs[i].iov_len = len(buffer)
+        return self
+
+    def send_buffers(self, count, lengths=None):
+        """ Send the first count buffers given to set_buffers(), optionally
+            cut to new lengths. Return number of datagrams sent """
+        if not self._mmsg:
+            sendto = self._socket.sendto
+            address = self._address
+            for i in range(count):
+                buffer = self._buffers[i]
+                sendto(buffer if lengths is None else buffer[:lengths[i]], address)
+            return count
+        if lengths is not None:
+            for i in range(count):
+                self._iovecs[i].iov_len = lengths[i]
+        return self._sendmmsg(count)
+
+    def send(self, payloads):
+        """ Send bytes-like payloads, return number of datagrams sent """
+        if not self._mmsg:
+            sendto = self._socket.sendto
+            address = self._address
+            for payload in payloads:
+                sendto(payload, address)
+            return len(payloads)
+
+        sent = 0
+        for start in range(0, len(payloads), self._max_batch):
+            batch = payloads[start:start + self._max_batch]
+            for i, payload in enumerate(batch):
+                self._iovecs[i].iov_base = _buffer_address(payload)
+                self._iovecs[i].iov_len = len(payload)
+            sent += self._sendmmsg(len(batch))
+        return sent
+
+    def _sendmmsg(self, count):
+        """ Call sendmmsg until all count messages are sent """
+        done = 0
+        fd = self._socket.fileno()
+        while done < count:
+            result = _libc.sendmmsg(fd, ctypes.byref(self._msgs[done]), count - done, 0)
+            if result < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                if err in (errno.EAGAIN, errno.ENOBUFS):
+                    # kernel buffer full, drop rest of batch like sendto would
+                    break
+                raise OSError(err, os.strerror(err))
+            done += result
+        return done
+
+
+class BatchReceiver:
+    """ Receive up to batch_size datagrams per syscall.
+        Uses recvmmsg() through ctypes where libc provides it (Linux),
+        and falls back to draining the socket with recvfrom() elsewhere. """
+
+    def __init__(self, sock, batch_size=64, bufsize=2048, use_mmsg=True):
+        """ Preallocate receive buffers and message headers """
+        self._socket = sock
+        self._batch_size = batch_size
+        self._bufsize = bufsize
+        self._mmsg = use_mmsg and has_mmsg()
+
+        if self._mmsg:
+            self._buffers = (ctypes.c_char * (bufsize * batch_size))()
+            self._view = memoryview(self._buffers).cast("B")
+            self._offsets = range(0, bufsize * batch_size, bufsize)
+            self._iovecs = (_IOVec * batch_size)()
+            self._msgs = (_MMsgHdr * batch_size)()
+            base = ctypes.addressof(self._buffers)
+            for i in range(batch_size):
+                self._iovecs[i].iov_base = base + i * bufsize
+                self._iovecs[i].iov_len = bufsize
+                self._msgs[i].msg_hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+                self._msgs[i].msg_hdr.msg_iovlen = 1
+
+    def uses_mmsg(self):
+        return self._mmsg
+
+    def receive(self):
+        """ Wait (respecting socket timeout) for at least one datagram,
+            then return all datagrams currently queued, up to batch size.
+            With recvmmsg they are memoryviews into the receive buffers,
+            only valid until the next receive().
+            A non-blocking socket raises BlockingIOError if nothing is queued """
+        if not self._mmsg:
+            return self._receive_loop()
+
+        blocking = self._socket.gettimeout() != 0
+        if blocking:
+            self._wait_readable()
+        while True:
+            result = _libc.recvmmsg(self._socket.fileno(), self._msgs, self._batch_size, MSG_DONTWAIT, None)
+            if result >= 0:
+                break
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err == errno.EAGAIN:
+                if blocking:
+                    raise socket_timeout("timed out")
+                raise BlockingIOError(err, os.strerror(err))
+            raise OSError(err, os.strerror(err))
+
+        view = self._view
+        msgs = self._msgs
+        return [view[offset:offset + msgs[i].msg_len] for i, offset in zip(range(result), self._offsets)]
+
+    def _wait_readable(self):
+        """ Block until socket is readable, or raise socket timeout """
+        ready, _, _ = select.select([self._socket], [], [], self._socket.gettimeout())
+        if not ready:
+            raise socket_timeout("timed out")
+
+    def _receive_loop(self):
+        """ Portable fallback: one blocking recv, then drain without blocking.
+            A socket with a timeout can still wait in the drain (MSG_DONTWAIT
+            may be missing), so a timeout there ends the batch, it is not lost """
+        payload, _ = self._socket.recvfrom(self._bufsize)
+        payloads = [payload]
+        while MSG_DONTWAIT and len(payloads) < self._batch_size:
+            try:
+                payload, _ = self._socket.recvfrom(self._bufsize, MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError, socket_timeout):
+                break
+            payloads.append(payload)
+        return payloads
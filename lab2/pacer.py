@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import time
+from latency import LogHistogram
+
+class Pacer:
+    """ Deadline based packet pacer.
+        Packet n is due at t0 + n / frequency, so scheduling errors
+        do not add up over time. Waits by sleeping until shortly before
+        the deadline, and spinning the last stretch for precision.
+        The spin threshold adapts to the observed sleep overshoot.
+        Memory use is fixed, however long it runs. """
+
+    def __init__(self, frequency, spin_threshold=0.0005, max_lag=0.1):
+        """ Set target frequency (Hz), spin threshold (s) and
+            max lag (s) before the schedule is reset instead of bursting """
+        if frequency <= 0:
+            raise ValueError("Frequency must be positive!")
+
+        self._frequency = frequency
+        self._interval = 1 / frequency
+        self._spin_threshold = spin_threshold
+        self._min_spin = spin_threshold
+        self._max_spin = 0.002
+        self._spin_half_life = 0.5      # seconds for the threshold to decay halfway to min
+        self._last_decay = None
+        self._max_lag = max_lag
+        self._start = None
+        self._ticks = 0
+        self._first_departure = None
+        self._last_departure = None
+        self._departures = 0
+        self._overruns = 0
+        self._overrun_time = 0.0
+        self._jitter = LogHistogram()   # |inter-departure time - interval| in ns
+        self._frequency_changes = 0
+        self._rate_origin = None        # start of schedule, not moved by changes
+        self._rate_since = None         # time of last frequency change
+        self._past_ticks = 0.0          # frequency * time, before _rate_since
+
+    def start(self, at=None):
+        """ Start schedule at perf_counter time 'at' (default now) """
+        self._start = time.perf_counter() if at is None else at
+        self._ticks = 0
+        self._rate_origin = self._rate_since = self._start
+        self._past_ticks = 0.0
+        self._last_decay = self._start
+        return self
+
+    def set_frequency(self, frequency):
+        """ Change frequency, keeping the schedule anchored at the next deadline """
+        if frequency <= 0:
+            raise ValueError("Frequency must be positive!")
+
+        if self._start is not None:
+            self._start = self.next_deadline()
+            self._ticks = 0
+            now = time.perf_counter()
+            self._past_ticks += self._frequency * (now - self._rate_since)
+            self._rate_since = now
+            self._frequency_changes += 1
+        self._frequency = frequency
+        self._interval = 1 / frequency
+        return self
+
+    def get_frequency(self):
+        return self._frequency
+
+    def next_deadline(self):
+        """ Absolute perf_counter time of the next departure """
+        return self._start + self._ticks * self._interval
+
+    def wait(self):
+        """ Block until the next deadline, then record the departure """
+        deadline = self.next_deadline()
+        now = time.perf_counter()
+        remaining = deadline - now
+
+        self._decay_spin_threshold(now)
+        if remaining > self._spin_threshold:
+            wake = deadline - self._spin_threshold
+            time.sleep(remaining - self._spin_threshold)
+            self._adapt_spin_threshold(time.perf_counter() - wake)
+        if remaining > 0:
+            while time.perf_counter() < deadline:
+                pass
+        else:
+            # deadline already passed
+            self._overruns += 1
+            self._overrun_time -= remaining
+            if -remaining > self._max_lag:
+                # too far behind, re-anchor rather than burst to catch up
+                self._start = now
+                self._ticks = 0
+
+        self._ticks += 1
+        self._record(time.perf_counter())
+
+    def _adapt_spin_threshold(self, oversleep):
+        """ Grow spin threshold quickly when sleep overshoots it """
+        if oversleep > self._spin_threshold:
+            self._spin_threshold = min(oversleep * 1.5, self._max_spin)
+
+    def _decay_spin_threshold(self, now):
+        """ Let spin threshold decay back towards the configured minimum
+            by time, not by tick, so one oversleep costs as long a spell
+            of spinning at low frequencies as at high ones """
+        if self._spin_threshold > self._min_spin:
+            decay = 0.5 ** ((now - self._last_decay) / self._spin_half_life)
+            self._spin_threshold = max(self._min_spin, self._spin_threshold * decay)
+        self._last_decay = now
+
+    def _record(self, departure):
+        """ Record departure time and deviation from interval """
+        if self._last_departure is None:
+            self._first_departure = departure
+        else:
+            self._jitter.add(int(abs(departure - self._last_departure - self._interval) * 1e9))
+        self._last_departure = departure
+        self._departures += 1
+
+    def counters(self):
+        """ Cheap cumulative counters, safe to read while pacing """
+        return {
+            "departures": self._departures,
+            "overruns": self._overruns,
+            "overrun_time": self._overrun_time,
+        }
+
+    def _target_rate(self):
+        """ Frequency, time weighted over the departures if it was changed """
+        if not self._frequency_changes or self._departures < 2:
+            return self._frequency
+        end = self._last_departure
+        ticks = self._past_ticks + self._frequency * max(end - self._rate_since, 0.0)
+        return ticks / (end - self._rate_origin)
+
+    def stats(self):
+        """ Target and achieved rate, and inter-departure jitter (seconds).
+            The target is the mean frequency over time if it was changed """
+        duration = 0
+        if self._departures > 1:
+            duration = self._last_departure - self._first_departure
+        achieved = (self._departures - 1) / duration if duration > 0 else 0.0
+        target = self._target_rate()
+
+        return {
+            "target_rate": target,
+            "frequency_changes": self._frequency_changes,
+            "achieved_rate": achieved,
+            "rate_error": (achieved - target) / target,
+            "departures": self._departures,
+            "jitter_p50": self._jitter.percentile(50) / 1e9,
+            "jitter_p99": self._jitter.percentile(99) / 1e9,
+            "overruns": self._overruns,
+            "overrun_time": self._overrun_time,
+        }
@@ -1,25 +1,46 @@
 #!/usr/bin/env python3
 
 from abc import ABC, abstractmethod
+import selectors
 import time
-from socket import timeout as socket_timeout
+from socket import socketpair
+from framer import FramingError
+from sequence_log import SequenceLog
+from stream_stats import StreamStats
+from latency import LatencyStats
+from metrics import Instrumented
+import wire
 
-class Receiver:
+class Receiver(Instrumented):
     """ Abstract stream receiver.
         Capable of receiving text messages
         as packet stream, and processing payloads.
         Subclasses must implement _create_socket(), _prepare(),
-        _receive() and _close() differently depending on socket type """
+        _receive() and _close() differently depending on socket type.
+        Sockets are non-blocking and watched by one selector (epoll on Linux),
+        together with a wakeup socket used by stop(). """
 
     def __init__(self):
         """ Create socket, set defaults """
+        super().__init__()
         self._socket = None
         self._connection_socket = None
         self._port = 12000
         self._timeout = 60
-        self._next_sequence_num = 10001
-        self._valid_packets = 0
-        self._invalid_packets = 0
+        self._first_sequence_num = 10001
+        self._stats = StreamStats(first_expected=self._first_sequence_num)
+        self._log_path = "sequence.log"
+        self._log_format = "text"
+        self._sequence_log = None
+        self._timestamps = False
+        self._latency = LatencyStats()
+        self._selector = None
+        self._wakeup = None     # (read, write) socket pair to interrupt select
+        self._stopped = False
+        self._max_drain = 64    # max receive calls per readable event
+        self._bytes_received = 0
+        self._tick_interval = None  # seconds between _on_tick() calls, None = never
+        self._reporter = None       # FeedbackReporter, if the sender gets feedback
 
         self._create_socket()
 
@@ -36,6 +57,20 @@ class Receiver:
         self._timeout = timeout     # seconds
         return self
 
+    def set_log(self, path, fmt="text"):
+        """ Log sequence numbers to path in 'text' or 'binary' (uint32) format.
+            path None disables logging """
+        self._log_path = path
+        self._log_format = fmt
+        return self
+
+    def set_timestamps(self, enabled=True):
+        """ Expect a send timestamp after the sequence number in text payloads
+            (see Sender.set_timestamps), and measure delay and jitter.
+            Binary payloads flag their timestamps themselves """
+        self._timestamps = enabled
+        return self
+
     def listen(self):
         """ Prepare socket, and listen for incoming stream until timeout """
         if not self._port:
@@ -44,74 +79,198 @@ class Receiver:
         print(f"Listening on port {self._port}. Timeout: {self._timeout}s")
 
         try:
-            # Prepare socket to receive
+            if self._log_path:
+                self._sequence_log = SequenceLog(self._log_path, self._log_format)
+
+            self._selector = selectors.DefaultSelector()
+            self._wakeup = socketpair()
+            self._wakeup[0].setblocking(False)
+            self._register(self._wakeup[0], self._on_wakeup)
+
+            # Prepare socket(s) to receive, and register them
             self._prepare()
+            self._start_instrumentation("receiver")
 
-            timeout = time.time() + self._timeout   # timeout for while loop
-            self._socket.settimeout(1)  # refresh while loop at least every sec
-            while time.time() < timeout:
-                try:
-                    payload = self._receive()
-                    self._process(payload)
-                except socket_timeout:
-                    continue
+            now = time.monotonic()
+            deadline = now + self._timeout
+            next_tick = now + self._tick_interval if self._tick_interval else deadline
+            while not self._stopped:
+                now = time.monotonic()
+                remaining = deadline - now
+                if remaining <= 0:
+                    break
+                if now >= next_tick:
+                    self._on_tick()
+                    next_tick = max(next_tick + self._tick_interval, now)
+                for key, _ in self._selector.select(min(remaining, next_tick - now)):
+                    key.data(key.fileobj)
 
+        except FramingError as e:
+            print(f"PROTOCOL ERROR: {e}")
         except ValueError:  # empty payload
             print("Sender closed connection")
         except ConnectionError as e:
             print(f"CONNECTION ERROR: {e}")
-        except socket_timeout:
-            # TCP socket timeout before established connection
-            pass
         finally:
+            self._stop_instrumentation()
             self._close()
             self._print_status()
 
+    def stop(self):
+        """ Stop listening, safe to call from another thread """
+        self._stopped = True
+        if self._wakeup:
+            try:
+                self._wakeup[1].send(b"\0")
+            except OSError:
+                pass    # already closed
+
+    def _register(self, sock, callback):
+        """ Make socket non-blocking, and call callback(sock) when readable """
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ, callback)
+
+    def _unregister(self, sock):
+        self._selector.unregister(sock)
+
+    def _on_wakeup(self, sock):
+        """ stop() was called """
+        sock.recv(64)
+
+    def _on_readable(self, sock):
+        """ Receive and process everything queued on socket, within limit """
+        for _ in range(self._max_drain):
+            try:
+                payloads = self._receive()
+            except (BlockingIOError, InterruptedError):
+                return
+            for payload in payloads:
+                self._process(payload)
+
     @abstractmethod
     def _prepare(self):
-        """ Prepare socket.
+        """ Prepare socket, and register it with _register().
             Must be implemented by subclass. """
         pass
 
     @abstractmethod
     def _receive(self):
-        """ Receive packet from socket.
+        """ Receive one or more packets from socket, return them as a list.
+            Raise BlockingIOError when nothing is queued.
             Must be implemented by subclass """
         pass
 
     def _process(self, payload):
-        """ Check sequence number and log results """
-        seq_num = payload[:5]
-        self._log(seq_num)
-
-        if seq_num == str(self._next_sequence_num):
-            self._valid_packets += 1
-            self._next_sequence_num += 1
+        """ Check sequence number, measure delay and log results.
+            Payload is bytes-like, in text or binary wire format (auto-detected).
+            Only the header is decoded """
+        self._bytes_received += len(payload)
+        if wire.is_binary(payload):
+            try:
+                seq, send_ns, _ = wire.parse_header(payload)
+            except ValueError:
+                self._invalid(bytes(payload[:wire.HEADER.size]).hex())
+                return
+            seq_num = seq
+            self._log(seq)
         else:
-            print(f"Out of order: {seq_num}, expected {self._next_sequence_num}")
-            self._invalid_packets += 1
+            seq_field = bytes(payload[:5])
+            seq_num = seq_field.decode(errors="replace")
+            self._log(seq_num)
             try:
-                seq_num = int(seq_num)
-                if seq_num > self._next_sequence_num:
-                    # Act as if one or more previous packets are lost
-                    self._next_sequence_num = seq_num + 1
-                # else:
-                    # Act as if current packet arrived late
-                    # next seq = current seq
+                seq = int(seq_field)
             except ValueError:
                 # Payload starts with NaN
-                self._next_sequence_num += 1
+                self._invalid(seq_num)
+                return
+            send_ns = self._text_timestamp(payload) if self._timestamps else None
+
+        if send_ns:
+            received_ns = time.time_ns()
+            self._latency.update(send_ns, received_ns)
+            if self._reporter:
+                self._reporter.add_delay(received_ns - send_ns)
+
+        expected = self._stats.expected()
+        if not self._stats.update(seq):
+            # named like StreamStats counts them: ahead of expected is loss,
+            # behind it is reordered, late or duplicate
+            if seq > expected:
+                self._diagnostics.log("lost", "Lost {}: got {}, expected {}", seq - expected, seq_num, expected)
+            else:
+                self._diagnostics.log("out_of_order", "Out of order: {}, expected {}", seq_num, expected)
+
+    def _on_tick(self):
+        """ Called every _tick_interval while listening.
+            Subclasses may override, default does nothing """
+        pass
+
+    def _invalid(self, seq_num):
+        """ Register packet without valid sequence number """
+        self._diagnostics.log("invalid", "Invalid sequence number: {}", seq_num)
+        self._stats.invalid()
+
+    def _text_timestamp(self, payload):
+        """ Send timestamp (ns) of a text payload, None if missing """
+        try:
+            return int(bytes(payload[6:25]))
+        except ValueError:
+            return None
 
     def _log(self, sequence):
-        """ Log sequence to file"""
-        with open("sequence.log", "a") as file:
-            file.write(sequence + "\n")
+        """ Buffer sequence for logging, written to file in blocks """
+        if self._sequence_log:
+            self._sequence_log.append(sequence)
 
-    @abstractmethod
     def _close(self):
-        """ Close sockets in socket specific way """
-        pass
+        """ Flush sequence log, close selector.
+            Subclasses close sockets in socket specific way, and call this """
+        if self._sequence_log:
+            self._sequence_log.close()
+            self._sequence_log = None
+        if self._selector:
+            self._selector.close()
+            self._selector = None
+        if self._wakeup:
+            for sock in self._wakeup:
+                sock.close()
+            self._wakeup = None
+
+    def _profiled_methods(self):
+        return ["_receive", "_process"]
+
+    def _metric_counters(self):
+        """ Packets, bytes, losses and reordering so far """
+        stats = self._stats.stats()
+        return {
+            "packets_received": stats["received"],
+            "bytes_received": self._bytes_received,
+            "lost": stats["lost"],
+            "out_of_order": stats["out_of_order"],
+            "duplicates": stats["duplicates"],
+            "reordered": stats["reordered"],
+            "invalid": stats["invalid"],
+        }
+
+    def get_stats(self):
+        """ Loss, duplicate, reorder and late statistics of the stream,
+            and delay statistics if timestamps are enabled """
+        stats = self._stats.stats()
+        latency = self._latency.stats()
+        if latency["samples"]:
+            stats.update(latency)
+        return stats
 
     def _print_status(self):
-        print("Packets received:", self._valid_packets + self._invalid_packets)
-        print("Out of order:", self._invalid_packets)
+        stats = self._stats.stats()
+        print("Packets received:", stats["received"])
+        print("Out of order:", stats["out_of_order"])
+        print(f"Lost: {stats['lost']}, duplicates: {stats['duplicates']}, "
+              f"reordered: {stats['reordered']} (max distance {stats['max_reorder_distance']}), "
+              f"late: {stats['late']}, invalid: {stats['invalid']}, max gap: {stats['max_gap']}")
+        latency = self._latency.stats()
+        if latency["samples"]:
+            print(f"Delay min/mean/max: {latency['delay_min'] * 1e3:.3f}/"
+                  f"{latency['delay_mean'] * 1e3:.3f}/{latency['delay_max'] * 1e3:.3f}ms, "
+                  f"p50: {latency['delay_p50'] * 1e3:.3f}ms, p99: {latency['delay_p99'] * 1e3:.3f}ms, "
+                  f"jitter: {latency['jitter'] * 1e3:.3f}ms")
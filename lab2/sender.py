@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
 from abc import ABC, abstractmethod
+from metrics import Instrumented
+from pacer import Pacer
 import time
+import wire
 
-class Sender(ABC):
+class Sender(Instrumented, ABC):
     """ Abstract stream sender.
         Capable of sending text messages
         as packet stream of variable
@@ -13,6 +16,7 @@ class Sender(ABC):
 
     def __init__(self):
         """ Create socket, set defaults """
+        super().__init__()
         self._socket = None
         self._receiver_name = None
         self._receiver_port = None
@@ -20,9 +24,22 @@ class Sender(ABC):
         self._timeout = 60
         self._packet_counter = 0
         self._sequence_num = 10000
+        self._pacer = None
+        self._burst_size = 1    # packets per pacing tick
         # self._message = "A" * 1465  # nonsense text mesage, 1465 'A' = 1465 bytes
         self._message = "A" * 1450  # nonsense text mesage, 1450 'A' = 1450 bytes
         self._msg_terminator = "####"
+        self._payload_size = None   # bytes, None = fit message as is
+        self._seq_width = 5         # digits in sequence number field
+        self._payload_views = []    # preallocated payloads, one per packet in a burst
+        self._next_payload = 0
+        self._seq_offset = 0        # position of sequence number (or header) in payload
+        self._body_size = 0         # payload size without framing prefix
+        self._timestamps = False    # add send time field after sequence number
+        self._ts_width = 19         # digits in nanosecond timestamp field
+        self._start_time = None     # wall clock time to start streaming at
+        self._wire_format = "text"  # 'text' or 'binary' (see wire.py)
+        self._adapt_interval = None # seconds between _adapt() calls, None = fixed rate
 
         self._create_socket()
 
@@ -44,6 +61,43 @@ class Sender(ABC):
         self._timeout = timeout     # seconds
         return self
 
+    def set_message(self, message):
+        """ Set message text, repeated or cut to fit payload size if set """
+        if not message:
+            raise ValueError("Message must not be empty!")
+        self._message = message
+        return self
+
+    def set_payload_size(self, size):
+        """ Set total payload size in bytes, sequence number and terminator included """
+        self._payload_size = size
+        return self
+
+    def set_timestamps(self, enabled=True):
+        """ Add a send timestamp (ns since epoch) to every payload,
+            for one-way delay measurement '10001;1700000000000000000;AAAA....####' """
+        self._timestamps = enabled
+        return self
+
+    def set_wire_format(self, wire_format):
+        """ 'text' ('10001;AAAA....####', 5 digit sequence number) or
+            'binary' (versioned header with uint64 sequence number, see wire.py) """
+        if wire_format not in ("text", "binary"):
+            raise ValueError(f"Unknown wire format: {wire_format}")
+        self._wire_format = wire_format
+        return self
+
+    def set_sequence_start(self, seq):
+        """ Set sequence number of first packet (default 10001) """
+        self._sequence_num = seq - 1
+        return self
+
+    def set_start_time(self, start_time):
+        """ Start streaming at wall clock time start_time (time.time()),
+            to synchronize several senders """
+        self._start_time = start_time
+        return self
+
     def stream(self):
         """ Send UPD segments at a given frequency """
         if not self._receiver_name or not self._receiver_port:
@@ -55,47 +109,162 @@ class Sender(ABC):
 
             print(f"Streaming at {self._stream_frequency}Hz for {self._timeout}s")
 
-            send_interval = 1 / self._stream_frequency
-            timeout = time.perf_counter() + self._timeout
-            while time.perf_counter() < timeout:
-                start = time.perf_counter()
+            self._build_payloads()
+            if self._start_time:
+                self._wait_for_start()
 
-                payload = self._generate_payload()
-                self._send(payload)
-                self._packet_counter += 1
+            self._pacer = Pacer(self._stream_frequency / self._burst_size)
+            self._start_instrumentation("sender")
+            self._pacer.start()
+            timeout = self._pacer.next_deadline() + self._timeout
+            next_adapt = self._pacer.next_deadline()
+            while self._pacer.next_deadline() < timeout:
+                # wait for absolute deadline of next packet (or burst)
+                self._pacer.wait()
 
-                end = time.perf_counter()
-                elapsed = end - start
+                if self._burst_size == 1:
+                    payload = self._generate_payload()
+                    self._send(payload)
+                    self._packet_counter += 1
+                else:
+                    payloads = [self._generate_payload() for _ in range(self._burst_size)]
+                    self._packet_counter += self._send_burst(payloads)
 
-                # wait approx 1 send interval
-                time.sleep(max(0, send_interval - elapsed - 0.00057))
-                # time.sleep(0)
+                if self._adapt_interval and self._pacer.next_deadline() >= next_adapt:
+                    next_adapt = self._pacer.next_deadline() + self._adapt_interval
+                    self._adapt()
 
         except ConnectionError as e:
             print(f"CONNECTION ERROR: {e}")
         finally:
+            self._stop_instrumentation()
             self._close()
             self._print_status()
 
+    def _wait_for_start(self):
+        """ Sleep, then spin, until start time """
+        remaining = self._start_time - time.time()
+        if remaining > 0.001:
+            time.sleep(remaining - 0.001)
+        while time.time() < self._start_time:
+            pass
+
     @abstractmethod
     def _connect():
         """ Must be implemented by subclass using tcp socket """
         pass
 
+    def _build_payloads(self):
+        """ Preallocate payload buffers from a template with a seq num placeholder,
+            optional timestamp placeholder, the message and a terminator
+            '00000;AAAAAAA....####', or a binary header and the message """
+        if self._wire_format == "binary":
+            header = bytes(wire.HEADER.size)
+            terminator = b""
+        else:
+            header = b"0" * self._seq_width + b";"
+            if self._timestamps:
+                header += b"0" * self._ts_width + b";"
+            terminator = self._msg_terminator.encode()
+        message = self._message.encode()
+
+        if self._payload_size is not None:
+            message_size = self._payload_size - len(header) - len(terminator)
+            if message_size < 0:
+                raise ValueError("Payload size too small for header and terminator!")
+            message = (message * (message_size // len(message) + 1))[:message_size]
+
+        body = header + message + terminator
+        prefix = self._payload_prefix(len(body))
+        self._body_size = len(body)
+        self._seq_offset = len(prefix)
+        self._ts_offset = self._seq_offset + self._seq_width + 1
+        template = prefix + body
+        self._payload_views = [memoryview(bytearray(template)) for _ in range(self._burst_size)]
+        self._next_payload = 0
+
     def _generate_payload(self):
-        """ Generate a payload with a seq num, a nonsense message and a terminator
+        """ Patch next seq num into a preallocated payload, and return it as a view
             '10001;AAAAAAA....####' """
         self._sequence_num += 1
-        return str(self._sequence_num) + ";" + self._message + self._msg_terminator
+        payload = self._payload_views[self._next_payload]
+        self._next_payload = (self._next_payload + 1) % len(self._payload_views)
+
+        if self._wire_format == "binary":
+            timestamp = time.time_ns() if self._timestamps else 0
+            wire.pack_header(payload, self._seq_offset, self._sequence_num, timestamp, self._body_size)
+            return payload
+
+        # fixed width field, wraps after 10 ** width packets
+        seq_field = b"%0*d" % (self._seq_width, self._sequence_num % 10 ** self._seq_width)
+        payload[self._seq_offset:self._seq_offset + self._seq_width] = seq_field
+        if self._timestamps:
+            ts_field = b"%0*d" % (self._ts_width, time.time_ns())
+            payload[self._ts_offset:self._ts_offset + self._ts_width] = ts_field
+        return payload
+
+    def _adapt(self):
+        """ Called every _adapt_interval while streaming, to change rate
+            with _set_rate(). Subclasses may override, default does nothing """
+        pass
+
+    def _set_rate(self, frequency):
+        """ Change stream frequency (packets per second) while streaming """
+        self._stream_frequency = frequency
+        self._pacer.set_frequency(frequency / self._burst_size)
+
+    def _payload_prefix(self, length):
+        """ Bytes put in front of every payload of given length, for framing.
+            Subclasses may override, default is none """
+        return b""
 
     @abstractmethod
     def _send():
         """ Socket specific method to be implemented by subclass """
         pass
 
+    def _send_burst(self, payloads):
+        """ Send several payloads, return number sent.
+            Subclasses may override with a batched implementation """
+        for payload in payloads:
+            self._send(payload)
+        return len(payloads)
+
     def _close(self):
         self._socket.close()
         print("Socket closed")
 
+    def _profiled_methods(self):
+        return ["_send", "_send_burst"]
+
+    def _metric_counters(self):
+        """ Packets and bytes sent, and pacing overruns, so far """
+        counters = {
+            "packets_sent": self._packet_counter,
+            "bytes_sent": self._packet_counter * len(self._payload_views[0]) if self._payload_views else 0,
+        }
+        if self._pacer:
+            counters.update(self._pacer.counters())
+        return counters
+
+    def get_stats(self):
+        """ Packet count and pacing statistics of the last stream """
+        stats = {"packets_sent": self._packet_counter, "burst_size": self._burst_size}
+        if self._payload_views:
+            stats["payload_size"] = len(self._payload_views[0])
+        if self._pacer:
+            stats.update(self._pacer.stats())
+            # pacer counts bursts, report packets
+            stats["target_rate"] *= self._burst_size
+            stats["achieved_rate"] *= self._burst_size
+        return stats
+
     def _print_status(self):
         print(f"{self._packet_counter} packets sent")
+        if self._pacer:
+            stats = self.get_stats()
+            target = "mean target" if stats["frequency_changes"] else "target"
+            print(f"Rate: {stats['achieved_rate']:.1f}Hz "
+                  f"({target} {stats['target_rate']:.1f}Hz, error {stats['rate_error']:+.3%})")
+            print(f"Jitter p50: {stats['jitter_p50'] * 1e6:.1f}us, "
+                  f"p99: {stats['jitter_p99'] * 1e6:.1f}us")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+from array import array
+from queue import Queue
+from threading import Thread
+import time
+
+class SequenceLog:
+    """ Buffered sequence number log.
+        Sequence numbers are collected in memory and written in blocks,
+        when the buffer is full or flush_interval has passed,
+        by a background writer thread (or the caller if background=False).
+        Text format writes one sequence per line, binary format
+        writes native uint32 values (INVALID for non-numeric sequences). """
+
+    INVALID = 0xFFFFFFFF
+
+    def __init__(self, path="sequence.log", fmt="text", flush_size=4096,
+                 flush_interval=1.0, background=True):
+        """ Open log file for appending, start writer thread """
+        if fmt not in ("text", "binary"):
+            raise ValueError(f"Unknown log format: {fmt}")
+
+        self._fmt = fmt
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._file = open(path, "a" if fmt == "text" else "ab")
+        self._queue = None
+        self._writer = None
+
+        if background:
+            self._queue = Queue()
+            self._writer = Thread(target=self._write_loop, name="sequence-log", daemon=True)
+            self._writer.start()
+
+    def append(self, sequence):
+        """ Buffer one sequence number (str or int) """
+        self._pending.append(sequence)
+        if len(self._pending) >= self._flush_size \
+                or time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        """ Hand buffered sequence numbers over to be written """
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        if self._queue:
+            self._queue.put(batch)
+        else:
+            self._write(batch)
+
+    def close(self):
+        """ Flush everything still buffered, stop writer and close file """
+        self.flush()
+        if self._writer:
+            self._queue.put(None)
+            self._writer.join()
+        self._file.close()
+
+    def _write_loop(self):
+        """ Writer thread: write batches until None is received """
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            self._write(batch)
+
+    def _write(self, batch):
+        """ Write a batch in log format """
+        if self._fmt == "text":
+            self._file.write("\n".join(str(seq) for seq in batch) + "\n")
+        else:
+            self._file.write(array("I", (self._to_uint32(seq) for seq in batch)).tobytes())
+        self._file.flush()
+
+    def _to_uint32(self, sequence):
+        try:
+            return int(sequence) & 0xFFFFFFFF
+        except ValueError:
+            return self.INVALID
+
+
+def read_binary_log(path):
+    """ Read sequence numbers from a binary log into an array """
+    sequences = array("I")
+    with open(path, "rb") as file:
+        sequences.frombytes(file.read())
+    return sequences
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+class StreamStats:
+    """ Loss, duplicate, reorder and late statistics of a sequence stream.
+        Received sequence numbers are tracked in a sliding bitmap
+        covering the 'window' numbers up to the highest one seen,
+        so every update is O(1) for a fixed window size.
+        A packet older than the window is counted as late,
+        since it can no longer be told apart from a duplicate. """
+
+    def __init__(self, window=1024, first_expected=None):
+        """ Set window size, and optionally the first expected sequence number """
+        self._window = window
+        self._mask = (1 << window) - 1
+        self._bitmap = 0            # bit i set = sequence highest - i received
+        self._first = first_expected
+        self._highest = None if first_expected is None else first_expected - 1
+        self._received = 0
+        self._unique = 0
+        self._in_order = 0
+        self._duplicates = 0
+        self._reordered = 0
+        self._late = 0
+        self._invalid = 0
+        self._max_gap = 0
+        self._max_reorder_distance = 0
+        self._total_reorder_distance = 0
+
+    def update(self, seq):
+        """ Register a received sequence number.
+            Return True if it is the next one expected """
+        self._received += 1
+
+        if self._highest is None:
+            # first packet defines start of stream
+            self._first = self._highest = seq
+            self._bitmap = 1
+            self._unique += 1
+            self._in_order += 1
+            return True
+
+        ahead = seq - self._highest
+        if ahead > 0:
+            gap = ahead - 1
+            if gap > self._max_gap:
+                self._max_gap = gap
+            if ahead >= self._window:
+                self._bitmap = 1
+            else:
+                self._bitmap = ((self._bitmap << ahead) | 1) & self._mask
+            self._highest = seq
+            self._unique += 1
+            if gap == 0:
+                self._in_order += 1
+                return True
+            return False
+
+        distance = -ahead
+        if seq < self._first:
+            # older than start of stream
+            self._first = seq
+            self._late += 1
+            self._unique += 1
+        elif distance >= self._window:
+            self._late += 1
+            self._unique += 1
+        elif self._bitmap >> distance & 1:
+            self._duplicates += 1
+        else:
+            self._bitmap |= 1 << distance
+            self._unique += 1
+            self._reordered += 1
+            self._total_reorder_distance += distance
+            if distance > self._max_reorder_distance:
+                self._max_reorder_distance = distance
+        return False
+
+    def invalid(self):
+        """ Register a packet without a valid sequence number """
+        self._received += 1
+        self._invalid += 1
+
+    def expected(self):
+        """ Next sequence number expected in order """
+        return None if self._highest is None else self._highest + 1
+
+    def stats(self):
+        """ Counters as a dict """
+        expected = 0 if self._highest is None else self._highest - self._first + 1
+        return {
+            "received": self._received,
+            "in_order": self._in_order,
+            "out_of_order": self._received - self._in_order,
+            "lost": max(0, expected - self._unique),
+            "duplicates": self._duplicates,
+            "reordered": self._reordered,
+            "late": self._late,
+            "invalid": self._invalid,
+            "max_gap": self._max_gap,
+            "max_reorder_distance": self._max_reorder_distance,
+            "mean_reorder_distance": self._total_reorder_distance / self._reordered if self._reordered else 0.0,
+        }
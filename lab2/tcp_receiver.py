@@ -1,12 +1,28 @@
 #!/usr/bin/env python3
 
 from receiver import Receiver
+from framer import create_framer
 from socket import socket, AF_INET, SOCK_STREAM
 
 class TCPReceiver(Receiver):
     """ TCP stream receiver.
         Capable of receiving text messages
-        as TCP packet stream, and processing payload. """
+        as TCP packet stream, and processing payload.
+        Messages are reassembled across recv boundaries by a framer. """
+
+    def __init__(self):
+        """ Set TCP specific defaults """
+        self._framing = "auto"
+        self._framer = None
+        super().__init__()
+
+    def set_framing(self, framing):
+        """ 'auto' (detect 'binary', 'length' or 'terminator', see AutoFramer),
+            'terminator' (messages end with '####'),
+            'length' (4 byte length prefix, see TCPSender.set_framing) or
+            'binary' (binary wire format header length) """
+        self._framing = framing
+        return self
 
     def _create_socket(self):
         """ Create TCP socket """
@@ -14,21 +30,27 @@ class TCPReceiver(Receiver):
 
     def _prepare(self):
         """ Bind TCP socket to port, listen,
-            create connection socket for incomming request """
+            and wait for incomming request """
         self._socket.bind(("", self._port))
-        self._socket.settimeout(self._timeout)
         self._socket.listen(1)      # max 1 connection
+        self._register(self._socket, self._on_accept)
+
+    def _on_accept(self, sock):
+        """ Create connection socket for incomming request """
         self._connection_socket, _ = self._socket.accept()
+        self._unregister(self._socket)     # max 1 connection
+        self._framer = create_framer(self._framing)
+        self._register(self._connection_socket, self._on_readable)
 
     def _receive(self):
-        """ Accept request, and receive packet from socket """
-        payload = self._connection_socket.recv(2048)
-        if not payload:
+        """ Receive from socket into framer buffer, return complete messages """
+        if not self._framer.recv_into(self._connection_socket):
+            self._framer.messages()     # FramingError if the stream ended broken
             raise ValueError("Empty payload")   # sender closed connection
-        return payload.decode()
-
+        return self._framer.messages()
 
     def _close(self):
+        super()._close()
         if self._connection_socket:
             self._connection_socket.close()
         self._socket.close()
@@ -2,6 +2,7 @@
 
 from sender import Sender
 from socket import socket, AF_INET, SOCK_STREAM
+import struct
 
 class TCPSender(Sender):
     """ TCP stream sender.
@@ -9,6 +10,19 @@ class TCPSender(Sender):
         as TCP packet stream of variable
         frequency. """
 
+    def __init__(self):
+        """ Set TCP specific defaults """
+        self._framing = "terminator"
+        super().__init__()
+
+    def set_framing(self, framing):
+        """ 'terminator' (messages end with '####') or
+            'length' (also prefix every message with its 4 byte length) """
+        if framing not in ("terminator", "length"):
+            raise ValueError(f"Unknown framing: {framing}")
+        self._framing = framing
+        return self
+
     def _create_socket(self):
         """ Create TCP socket """
         self._socket = socket(AF_INET, SOCK_STREAM)
@@ -16,9 +30,15 @@ class TCPSender(Sender):
     def _connect(self):
         self._socket.connect((self._receiver_name, self._receiver_port))
 
+    def _payload_prefix(self, length):
+        """ Length prefix when using length framing """
+        if self._framing == "length":
+            return struct.pack("!I", length)
+        return b""
+
     def _send(self, payload):
         """ Send payload into TCP socket """
-        self._socket.send(payload.encode())
+        self._socket.sendall(payload)
 
 if __name__ == "__main__":
     rec_name = "192.168.1.223"
@@ -1,13 +1,39 @@
 #!/usr/bin/env python3
 
 from receiver import Receiver
-from socket import socket, AF_INET, SOCK_DGRAM
+from feedback import FeedbackReporter
+from mmsg import BatchReceiver
+from socket import socket, AF_INET, SOCK_DGRAM, MSG_PEEK
 
 class UDPReceiver(Receiver):
     """ UDP stream receiver.
         Capable of receiving text messages
         as UDP packet stream, and processing payload. """
 
+    def __init__(self):
+        """ Set UDP specific defaults """
+        self._batch_size = 1
+        self._batch_receiver = None
+        self._peer = None           # address of sender, for feedback
+        super().__init__()
+
+    def set_batch_size(self, size):
+        """ Receive up to 'size' datagrams per syscall (1 = plain recvfrom).
+            recvmmsg halves the syscall cost per datagram, but processing
+            dominates, and on loopback it did not lower loss (see
+            Benchmark.set_batching), so plain recvfrom is the default """
+        self._batch_size = size
+        return self
+
+    def set_feedback(self, interval=0.1):
+        """ Report loss and delay to the sender every interval (seconds),
+            for adaptive rate streaming (see UDPSender.set_rate_controller).
+            Delay is only reported for payloads with timestamps,
+            see set_timestamps(). None disables """
+        self._tick_interval = interval
+        self._reporter = FeedbackReporter() if interval else None
+        return self
+
     def _create_socket(self):
         """ Create UDP socket """
         self._socket = socket(AF_INET, SOCK_DGRAM)
@@ -15,13 +41,30 @@ class UDPReceiver(Receiver):
     def _prepare(self):
         """ Bind UDP socket to port """
         self._socket.bind(("", self._port))
+        self._register(self._socket, self._on_readable)
+        if self._batch_size > 1:
+            self._batch_receiver = BatchReceiver(self._socket, self._batch_size, 2048)
 
     def _receive(self):
-        """ Receive packet from socket """
-        payload, _ = self._socket.recvfrom(2048)
-        return payload.decode()
+        """ Receive packet(s) from socket """
+        if self._batch_receiver:
+            if self._reporter and self._peer is None:
+                # batches come without addresses, peek at the first one
+                _, self._peer = self._socket.recvfrom(1, MSG_PEEK)
+            return self._batch_receiver.receive()
+        payload, self._peer = self._socket.recvfrom(2048)
+        return [payload]
+
+    def _on_tick(self):
+        """ Send feedback report to the sender """
+        if self._reporter and self._peer:
+            try:
+                self._socket.sendto(self._reporter.report(self._stats.stats()), self._peer)
+            except OSError as e:
+                self._diagnostics.log("feedback", "Feedback not sent: {}", e)
 
     def _close(self):
+        super()._close()
         self._socket.close()
         print("Socket closed")
 
@@ -1,25 +1,131 @@
 #!/usr/bin/env python3
 
 from sender import Sender
-from socket import socket, AF_INET, SOCK_DGRAM
+from collections import deque
+from feedback import FeedbackTracker, is_report
+from mmsg import BatchSender
+import select
+from socket import socket, gethostbyname, AF_INET, SOCK_DGRAM
+import time
 
 class UDPSender(Sender):
     """ UDP stream sender.
         Capable of sending text messages
         as UDP packet stream of variable
-        frequency. """
+        frequency, fixed or adapted to feedback from the receiver. """
+
+    def __init__(self):
+        """ Set UDP specific defaults """
+        self._controller = None
+        self._tracker = None
+        self._feedback_timeout = 1.0
+        self._last_feedback = None
+        self._started = None
+        self._rate_history = deque(maxlen=1000)     # latest (seconds since start, rate, loss, queueing delay)
+        self._max_rate = None
+        super().__init__()
 
     def _create_socket(self):
         """ Create UDP socket """
         self._socket = socket(AF_INET, SOCK_DGRAM)
 
+    def set_burst_size(self, size):
+        """ Send 'size' datagrams per pacing tick, batched in one syscall
+            where supported. Stream frequency is still counted in packets """
+        self._burst_size = size
+        return self
+
+    def set_rate_controller(self, controller, poll_interval=0.01):
+        """ Adaptive rate: start at the stream frequency, and let controller
+            (see feedback.py) change it on every feedback report from the
+            receiver (see UDPReceiver.set_feedback). Reports are polled every
+            poll_interval seconds. Enables timestamps, for the delay.
+            None for fixed rate """
+        self._controller = controller
+        self._adapt_interval = poll_interval if controller else None
+        if controller:
+            self._timestamps = True
+        return self
+
+    def set_feedback_timeout(self, timeout):
+        """ Seconds without feedback before the rate is decreased anyway """
+        self._feedback_timeout = timeout
+        return self
+
+    def get_rate_history(self):
+        """ (seconds since start, rate, loss, queueing delay) of the latest reports """
+        return list(self._rate_history)
+
     def _connect(self):
-        """ Implemented with tcp socket only """
-        pass
+        """ Resolve receiver once, instead of on every sendto (no connection for UDP) """
+        self._address = (gethostbyname(self._receiver_name), self._receiver_port)
+        self._tracker = None
+        self._rate_history.clear()
+        self._max_rate = self._stream_frequency
+        self._batch_sender = BatchSender(self._socket, self._address, max_batch=self._burst_size)
 
     def _send(self, payload):
         """ Send payload into UDP socket """
-        self._socket.sendto(payload.encode(), (self._receiver_name, self._receiver_port))
+        self._socket.sendto(payload, self._address)
+
+    def _build_payloads(self):
+        """ Preallocate payloads, and point the batch sender at them once """
+        super()._build_payloads()
+        self._batch_sender.set_buffers(self._payload_views)
+
+    def _send_burst(self, payloads):
+        """ Send a burst with as few syscalls as possible. A burst is always
+            all preallocated payloads in order (see _generate_payload) """
+        return self._batch_sender.send_buffers(len(payloads))
+
+    def _adapt(self):
+        """ Apply feedback reports queued on the socket, or decrease
+            rate if they stopped coming """
+        now = time.monotonic()
+        if self._tracker is None:
+            self._tracker = FeedbackTracker()
+            self._last_feedback = self._started = now
+        while select.select([self._socket], [], [], 0)[0]:
+            try:
+                payload, _ = self._socket.recvfrom(2048)
+            except ConnectionError:
+                break   # ICMP port unreachable, receiver not up (yet)
+            if not is_report(payload):
+                continue
+            feedback = self._tracker.update(payload)
+            if feedback is None:
+                continue
+            self._last_feedback = now
+            loss, queueing_delay = feedback
+            self._change_rate(self._controller.update(self._stream_frequency, loss, queueing_delay),
+                              now, loss, queueing_delay)
+
+        if now - self._last_feedback > self._feedback_timeout:
+            self._last_feedback = now
+            self._diagnostics.log("feedback", "No feedback from receiver, decreasing rate")
+            self._change_rate(self._controller.timeout(self._stream_frequency), now, None, None)
+
+    def _change_rate(self, rate, now, loss, queueing_delay):
+        self._rate_history.append((now - self._started, rate, loss, queueing_delay))
+        self._max_rate = max(self._max_rate, rate)
+        if rate != self._stream_frequency:
+            self._set_rate(rate)
+
+    def get_stats(self):
+        """ Sender statistics, and feedback statistics in adaptive mode """
+        stats = super().get_stats()
+        if self._tracker:
+            stats.update(self._tracker.stats())
+            stats["final_rate"] = self._stream_frequency
+            stats["max_rate"] = self._max_rate
+        return stats
+
+    def _print_status(self):
+        super()._print_status()
+        if self._tracker:
+            stats = self.get_stats()
+            print(f"Adaptive rate: final {stats['final_rate']:.0f}Hz, max {stats['max_rate']:.0f}Hz, "
+                  f"{stats['reports']} feedback reports")
 
 if __name__ == "__main__":
     rec_name = "192.168.1.223"
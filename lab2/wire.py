@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import struct
+
+# Binary wire format, version 1. All fields big endian:
+#   magic       2 bytes     MAGIC, never an ASCII digit, so text payloads
+#                           ('10001;AAAA....####') are told apart by first byte
+#   version     uint8
+#   flags       uint8       FLAG_TIMESTAMP if timestamp is set
+#   sequence    uint64
+#   timestamp   uint64      send time, ns since epoch (0 if not set)
+#   length      uint32      total message length, header included
+# followed by the message.
+
+MAGIC = b"\xa7\x1e"
+VERSION = 1
+FLAG_TIMESTAMP = 0x01
+HEADER = struct.Struct("!2sBBQQI")
+
+
+def is_binary(payload):
+    """ True if payload starts with the binary header magic """
+    return payload[:2] == MAGIC
+
+
+def pack_header(buffer, offset, seq, timestamp_ns, length):
+    """ Write header into a writable buffer at offset """
+    flags = FLAG_TIMESTAMP if timestamp_ns else 0
+    HEADER.pack_into(buffer, offset, MAGIC, VERSION, flags, seq, timestamp_ns, length)
+
+
+def parse_header(payload):
+    """ Return (sequence, timestamp_ns or None, length) of a binary payload.
+        Raise ValueError if it is not a supported binary payload """
+    if len(payload) < HEADER.size:
+        raise ValueError("Payload shorter than header")
+    magic, version, flags, seq, timestamp_ns, length = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a binary payload")
+    if version != VERSION:
+        raise ValueError(f"Unsupported wire format version: {version}")
+    if not flags & FLAG_TIMESTAMP:
+        timestamp_ns = None
+    return seq, timestamp_ns, length
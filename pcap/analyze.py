@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+
+from collections import deque, OrderedDict
+from pathlib import Path
+import sys
+from decode import decode, address, TCP_SYN, TCP_FIN, TCP_RST, TCP_ACK
+from reader import CaptureReader
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _use_lab_modules():
+    """ Make the lab2 and lab1/B modules importable from here.
+        The lab2 wire format, framers and sequence statistics, and the
+        browser's HTTP response parser, are used as they are, so captures
+        are read exactly the way the programs that made them read them.
+        The labs are flat directories of scripts run from where they are,
+        not packages, so their directories go on sys.path. Appended, so
+        they can not shadow this directory or the standard library """
+    for directory in (ROOT / "lab2", ROOT / "lab1" / "B"):
+        if str(directory) not in sys.path:
+            sys.path.append(str(directory))
+
+
+_use_lab_modules()
+from framer import create_framer, FramingError
+from http_response import HTTPResponseParser
+from stream_stats import StreamStats
+import wire
+
+HTTP_METHODS = (b"GET ", b"HEAD ", b"POST ", b"PUT ", b"DELETE ", b"OPTIONS ", b"PATCH ")
+
+
+def lab2_sequence(payload):
+    """ Sequence number of a lab2 payload (text or binary wire format), else None """
+    if wire.is_binary(payload):
+        try:
+            return wire.parse_header(payload)[0]
+        except ValueError:
+            return None
+    if len(payload) >= 6 and payload[5] == 0x3B:    # '10001;...'
+        field = bytes(payload[:5])
+        if field.isdigit():
+            return int(field)
+    return None
+
+
+class RunningStats:
+    """ Count, min, mean and max, in constant memory """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def stats(self):
+        return {
+            "samples": self.count,
+            "min": self.min,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max,
+        }
+
+
+class _ByteCounter:
+    """ Sink for response bodies, only counts them """
+
+    def __init__(self):
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+
+
+class _Lab2Consumer:
+    """ In order bytes of a TCP lab2 stream, framed like TCPReceiver does """
+
+    def __init__(self):
+        self.framer = create_framer("auto")
+        self.stats = StreamStats(first_expected=None)
+
+    def data(self, time, data):
+        if self.framer is None:
+            return      # framing lost, the rest can not be split
+        self.framer.feed(data)
+        try:
+            messages = self.framer.messages()
+        except FramingError:
+            self.stats.invalid()
+            self.framer = None
+            return
+        for message in messages:
+            seq = lab2_sequence(message)
+            if seq is None:
+                self.stats.invalid()
+            else:
+                self.stats.update(seq)
+
+    def eof(self, time):
+        if self.framer is not None:
+            self.data(time, b"")    # counts a break after the last message
+
+
+class _HTTPRequestConsumer:
+    """ In order bytes of the client side of an HTTP connection """
+
+    def __init__(self, flow):
+        self.flow = flow
+        self.buffer = bytearray()
+        self.skip = 0       # request body bytes left to skip
+
+    def data(self, time, data):
+        if self.skip:
+            skipped = min(self.skip, len(data))
+            self.skip -= skipped
+            data = data[skipped:]
+        self.buffer += data
+        while True:
+            end = self.buffer.find(b"\r\n\r\n")
+            if end < 0:
+                if len(self.buffer) > 65536:
+                    self.buffer.clear()     # not HTTP after all
+                return
+            head = bytes(self.buffer[:end]).decode("iso-8859-1").split("\r\n")
+            del self.buffer[:end + 4]
+            method, target = (head[0].split(" ") + [""])[:2]
+            headers = dict(line.lower().split(":", 1) for line in head[1:] if ":" in line)
+            self.flow.requests.append({
+                "method": method,
+                "target": target,
+                "host": headers.get("host", "").strip(),
+                "request_time": time,
+            })
+            body = int(headers.get("content-length", "0").strip() or 0)
+            if body < 0:
+                raise ValueError(f"Invalid Content-Length: {body}")
+            skipped = min(body, len(self.buffer))
+            del self.buffer[:skipped]
+            self.skip = body - skipped
+
+    def eof(self, time):
+        pass
+
+
+class _HTTPResponseConsumer:
+    """ In order bytes of the server side of an HTTP connection,
+        parsed with the browser's HTTPResponseParser """
+
+    def __init__(self, flow):
+        self.flow = flow
+        self._new_response()
+
+    def _new_response(self):
+        self.body = _ByteCounter()
+        request = self.flow.requests[0] if self.flow.requests else None
+        method = request["method"] if request else "GET"
+        self.parser = HTTPResponseParser(method, self.body)
+        self.first_byte = None
+
+    def data(self, time, data):
+        while data:
+            if self.first_byte is None:
+                self.first_byte = time
+            self.parser.feed(data)
+            if not self.parser.is_complete():
+                return
+            self._complete(time)
+            data = self.parser.unused()
+            self._new_response()
+
+    def eof(self, time):
+        if self.first_byte is None:
+            return
+        try:
+            self.parser.feed_eof()
+        except ConnectionError:
+            return
+        self._complete(time)
+        self._new_response()
+
+    def _complete(self, time):
+        response = self.parser.get_response()
+        exchange = self.flow.requests.popleft() if self.flow.requests else {}
+        exchange.update({
+            "status": response.status,
+            "body_bytes": self.body.count,
+            "content_type": response.get_header("Content-Type"),
+            "response_start": self.first_byte,
+            "response_end": time,
+        })
+        if "request_time" in exchange:
+            exchange["time_to_first_byte"] = self.first_byte - exchange["request_time"]
+            exchange["duration"] = time - exchange["request_time"]
+        self.flow.add_exchange(exchange)
+
+
+class _Direction:
+    """ One direction of a flow: counters, and for TCP the reassembly
+        and retransmission state of its sequence space """
+
+    def __init__(self, max_pending, max_unacked):
+        self.packets = 0
+        self.bytes = 0
+        self.first = None
+        self.last = None
+        # TCP
+        self.last_raw = None        # last raw sequence number, for unwrapping
+        self.last_unwrapped = None
+        self.next = None            # next in order sequence number (unwrapped)
+        self.highest = None         # highest sequence number sent + 1
+        self.highest_time = None    # time highest was sent
+        self.pending = {}           # out of order segments, start seq -> bytes
+        self.pending_bytes = 0
+        self.max_pending = max_pending
+        self.unacked = deque(maxlen=max_unacked)    # (end seq, send time)
+        self.retransmissions = 0
+        self.retransmitted_bytes = 0
+        self.out_of_order = 0
+        self.gap_bytes = 0          # never captured, skipped to continue
+        self.fin = False
+        self.fin_acked = False
+        self.syn_time = None
+        self.consumer = None
+        self.kind = None
+        self.decode_error = None    # why the consumer gave up on the stream
+        # UDP
+        self.lab2 = None
+
+    def count(self, time, size):
+        self.packets += 1
+        self.bytes += size
+        if self.first is None:
+            self.first = time
+        self.last = time
+
+    def unwrap(self, seq):
+        """ 32 bit sequence number to a monotonic one, across wraparounds """
+        if self.last_raw is None:
+            self.last_raw = self.last_unwrapped = seq
+            return seq
+        delta = (seq - self.last_raw + 2 ** 31) % 2 ** 32 - 2 ** 31
+        unwrapped = self.last_unwrapped + delta
+        if delta > 0:
+            self.last_raw, self.last_unwrapped = seq, unwrapped
+        return unwrapped
+
+    def stats(self):
+        duration = (self.last - self.first) if self.first is not None else 0.0
+        stats = {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "throughput_bps": self.bytes * 8 / duration if duration > 0 else None,
+        }
+        if self.last_raw is not None:
+            stats.update({
+                "retransmissions": self.retransmissions,
+                "retransmitted_bytes": self.retransmitted_bytes,
+                "out_of_order": self.out_of_order,
+                "gap_bytes": self.gap_bytes,
+                "content": self.kind,
+            })
+            if self.decode_error:
+                stats["decode_error"] = self.decode_error
+        lab2 = self.lab2 or (self.consumer.stats if isinstance(self.consumer, _Lab2Consumer) else None)
+        if lab2:
+            stats["lab2"] = lab2.stats()
+        return stats
+
+
+class Flow:
+    """ A TCP connection or UDP flow between two endpoints """
+
+    def __init__(self, proto, client, server, max_pending, max_unacked, max_exchanges):
+        """ Set protocol and endpoints (packed address, port) """
+        self.proto = proto
+        self.client = client
+        self.server = server
+        self.key = None
+        self.last_seen = None
+        self.directions = (_Direction(max_pending, max_unacked), _Direction(max_pending, max_unacked))
+        self.rtt = RunningStats()
+        self.requests = deque()         # HTTP requests waiting for a response
+        self.exchanges = []
+        self.exchange_count = 0
+        self._max_exchanges = max_exchanges
+        self.reset = False
+
+    def add_exchange(self, exchange):
+        self.exchange_count += 1
+        if len(self.exchanges) < self._max_exchanges:
+            self.exchanges.append(exchange)
+
+    def report(self):
+        client, server = self.directions
+        first = min(t for t in (client.first, server.first) if t is not None)
+        last = max(t for t in (client.last, server.last) if t is not None)
+        report = {
+            "proto": self.proto,
+            "client": f"{address(self.client[0])}:{self.client[1]}",
+            "server": f"{address(self.server[0])}:{self.server[1]}",
+            "start": first,
+            "duration": last - first,
+            "client_to_server": client.stats(),
+            "server_to_client": server.stats(),
+        }
+        if self.proto == "tcp":
+            report["rtt"] = self.rtt.stats()
+            report["reset"] = self.reset
+        if self.exchange_count:
+            report["http_exchanges"] = self.exchanges
+            report["http_exchange_count"] = self.exchange_count
+        return report
+
+
+class CaptureAnalyzer:
+    """ Offline analysis of a pcap or pcapng capture.
+        Reconstructs TCP connections and UDP flows, and reports per flow
+        throughput, TCP retransmissions and RTT (data to ACK, including
+        the handshake), sequence level loss of lab2 streams (text or
+        binary wire format, over UDP or TCP), and the HTTP exchanges of
+        browser connections. Packets are streamed from the memory mapped
+        file, the state per flow is bounded, and flows are finished and
+        reported as soon as they close or go idle, so memory does not grow
+        with the size of the capture. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._max_pending = 1024 * 1024     # out of order bytes buffered per direction
+        self._max_unacked = 4096            # segments waiting for an RTT sample
+        self._max_exchanges = 1000          # HTTP exchanges kept per flow
+        self._idle_timeout = 300            # seconds of capture time
+        self._flows = OrderedDict()         # open flows, least recently active first
+        self._finished = []
+        self._finished_count = 0
+        self._callback = None
+        self._packets = 0
+        self._decoded = 0
+
+    def set_max_pending(self, size):
+        self._max_pending = size
+        return self
+
+    def set_max_exchanges(self, count):
+        self._max_exchanges = count
+        return self
+
+    def set_idle_timeout(self, timeout):
+        """ Finish flows without packets for timeout seconds (capture time) """
+        self._idle_timeout = timeout
+        return self
+
+    def analyze(self, path, callback=None):
+        """ Read capture, return report. Flows are reported when they finish:
+            passed to callback(flow report) and forgotten if given,
+            else collected in the returned report """
+        self._callback = callback
+        time = 0.0
+        with CaptureReader(path) as reader:
+            for timestamp, linktype, data in reader:
+                self._packets += 1
+                time = time if timestamp is None else timestamp
+                packet = decode(time, linktype, data)
+                if packet is None:
+                    continue
+                self._decoded += 1
+                if packet.proto == "tcp":
+                    self._tcp(packet)
+                else:
+                    self._udp(packet)
+                # drop views into the map before it is closed
+                packet.payload.release()
+                self._finish_idle(time)
+            data = None
+        while self._flows:
+            self._finish(next(iter(self._flows.values())))
+        return self.get_report()
+
+    def get_report(self):
+        return {
+            "packets": self._packets,
+            "decoded": self._decoded,
+            "flow_count": self._finished_count,
+            "flows": self._finished,
+        }
+
+    def _finish(self, flow):
+        """ Flush consumers, report and forget flow """
+        del self._flows[flow.key]
+        for direction in flow.directions:
+            if direction.consumer and not direction.fin:
+                self._consume(direction, direction.consumer.eof, direction.last)
+        self._finished_count += 1
+        if self._callback:
+            self._callback(flow.report())
+        else:
+            self._finished.append(flow.report())
+
+    def _finish_idle(self, time):
+        while self._flows:
+            flow = next(iter(self._flows.values()))
+            if time - flow.last_seen <= self._idle_timeout:
+                return
+            self._finish(flow)
+
+    def _flow(self, packet, opens):
+        """ Flow of packet and index of its direction (0 = client to server).
+            The sender of the first packet, or of a SYN, is the client """
+        src = (bytes(packet.src), packet.sport)
+        dst = (bytes(packet.dst), packet.dport)
+        key = (packet.proto,) + ((src, dst) if src < dst else (dst, src))
+        flow = self._flows.get(key)
+        if flow is None:
+            flow = Flow(packet.proto, src, dst, self._max_pending, self._max_unacked, self._max_exchanges)
+            flow.key = key
+            self._flows[key] = flow
+        else:
+            self._flows.move_to_end(key)
+            if opens and flow.client != src and not flow.directions[1].packets:
+                # SYN from the side first seen as server, e.g. capture started mid handshake
+                flow.client, flow.server = src, dst
+        flow.last_seen = packet.time
+        return flow, 0 if src == flow.client else 1
+
+    def _udp(self, packet):
+        flow, index = self._flow(packet, False)
+        direction = flow.directions[index]
+        direction.count(packet.time, len(packet.payload))
+        seq = lab2_sequence(packet.payload)
+        if seq is not None:
+            if direction.lab2 is None:
+                direction.lab2 = StreamStats(first_expected=None)
+            direction.lab2.update(seq)
+
+    def _tcp(self, packet):
+        flags = packet.flags
+        flow, index = self._flow(packet, flags & TCP_SYN and not flags & TCP_ACK)
+        direction = flow.directions[index]
+        other = flow.directions[1 - index]
+        payload = packet.payload
+        time = packet.time
+        direction.count(time, len(payload))
+        if flags & TCP_RST:
+            flow.reset = True
+
+        seq = direction.unwrap(packet.seq)
+        if flags & TCP_SYN:
+            if direction.syn_time is not None:
+                direction.retransmissions += 1
+            else:
+                direction.syn_time = time
+                direction.next = direction.highest = seq + 1
+                direction.highest_time = time
+                direction.unacked.append((seq + 1, time))
+            seq += 1
+        elif direction.next is None:
+            direction.next = direction.highest = seq     # capture started mid connection
+            direction.highest_time = time
+
+        if payload:
+            self._segment(flow, index, direction, seq, payload, time)
+        if flags & TCP_FIN:
+            end = seq + len(payload)
+            if direction.fin and end < direction.next:
+                direction.retransmissions += 1
+            elif end == direction.next:
+                direction.fin = True
+                direction.next += 1
+                if direction.consumer:
+                    self._consume(direction, direction.consumer.eof, time)
+            if end + 1 > direction.highest:
+                direction.highest = end + 1
+                direction.highest_time = time
+                direction.unacked.append((end + 1, time))
+
+        if flags & TCP_ACK and other.last_raw is not None:
+            self._acked(flow, other, other.unwrap(packet.ack), time)
+        if flow.reset or (direction.fin_acked and other.fin_acked):
+            self._finish(flow)
+
+    def _segment(self, flow, index, direction, seq, payload, time):
+        """ Reassemble data, count retransmissions and out of order segments """
+        end = seq + len(payload)
+        if end <= direction.next:
+            direction.retransmissions += 1
+            direction.retransmitted_bytes += len(payload)
+            self._karn(direction, seq)
+            return
+        if seq < direction.next:
+            # partly new
+            direction.retransmissions += 1
+            direction.retransmitted_bytes += direction.next - seq
+            self._karn(direction, seq)
+            self._deliver(flow, index, direction, payload[direction.next - seq:], time)
+        elif seq > direction.next:
+            if seq < direction.highest and time - direction.highest_time > self._reorder_window(flow):
+                direction.retransmissions += 1  # resent into a hole
+            else:
+                direction.out_of_order += 1
+            if len(payload) > len(direction.pending.get(seq, b"")):
+                direction.pending_bytes += len(payload) - len(direction.pending.get(seq, b""))
+                direction.pending[seq] = bytes(payload)
+            if direction.pending_bytes > direction.max_pending:
+                self._skip_gap(flow, index, direction, time)
+        else:
+            self._deliver(flow, index, direction, payload, time)
+
+        if end > direction.highest:
+            direction.highest = end
+            direction.highest_time = time
+            direction.unacked.append((end, time))
+
+        # segments that are now in order, found by their start
+        while direction.pending:
+            data = direction.pending.pop(direction.next, None)
+            if data is None:
+                break
+            direction.pending_bytes -= len(data)
+            self._deliver(flow, index, direction, data, time)
+
+    def _reorder_window(self, flow):
+        """ A hole filled sooner than this after the highest segment was
+            reordered, later it was resent. The min RTT, as a resend takes
+            at least one, or 3ms like Wireshark before there is a sample """
+        return flow.rtt.min if flow.rtt.count else 0.003
+
+    def _skip_gap(self, flow, index, direction, time):
+        """ Too much buffered behind a hole that was never captured:
+            drop what the stream already passed, and skip to the lowest
+            segment. The only scan of pending, and only on overflow """
+        for start in sorted(direction.pending):
+            if start > direction.next:
+                direction.gap_bytes += start - direction.next
+                direction.next = start
+                direction.consumer = None
+                direction.kind = direction.kind and f"{direction.kind} (gap)"
+            data = direction.pending.pop(start)
+            direction.pending_bytes -= len(data)
+            if start + len(data) > direction.next:
+                self._deliver(flow, index, direction, data[direction.next - start:], time)
+            if direction.pending_bytes <= direction.max_pending // 2:
+                return
+
+    def _deliver(self, flow, index, direction, data, time):
+        """ Hand in order bytes to the application level consumer """
+        direction.next += len(data)
+        if direction.kind is None:
+            direction.kind = self._classify(data)
+            direction.consumer = self._consumer(flow, index, direction.kind)
+        if direction.consumer:
+            self._consume(direction, direction.consumer.data, time, data)
+
+    def _consume(self, direction, handler, time, *data):
+        """ Pass data or end of stream to a consumer handler. A malformed
+            stream (Content-Length, chunk size, ...) stops decoding of that
+            direction only, the rest of the capture is analysed on """
+        try:
+            handler(time, *data)
+        except ValueError as e:
+            direction.consumer = None
+            direction.kind = f"{direction.kind} (undecodable)"
+            direction.decode_error = str(e)
+
+    def _classify(self, data):
+        head = bytes(data[:8])
+        if head.startswith(HTTP_METHODS):
+            return "http request"
+        if head.startswith(b"HTTP/1."):
+            return "http response"
+        payload = data[4:] if data[:1] == b"\0" else data     # length prefix framing
+        if lab2_sequence(payload) is not None or wire.is_binary(payload):
+            return "lab2"
+        return "other"
+
+    def _consumer(self, flow, index, kind):
+        if kind == "http request":
+            return _HTTPRequestConsumer(flow)
+        if kind == "http response":
+            return _HTTPResponseConsumer(flow)
+        if kind == "lab2":
+            return _Lab2Consumer()
+        return None
+
+    def _karn(self, direction, seq):
+        """ Retransmitted data gives ambiguous RTT samples (Karn), drop them """
+        while direction.unacked and direction.unacked[-1][0] > seq:
+            direction.unacked.pop()
+
+    def _acked(self, flow, direction, ack, time):
+        """ RTT sample from the newest segment of direction this ACK covers """
+        sent = None
+        while direction.unacked and direction.unacked[0][0] <= ack:
+            sent = direction.unacked.popleft()[1]
+        if sent is not None:
+            flow.rtt.add(time - sent)
+        if direction.fin and ack >= direction.next:
+            direction.fin_acked = True
+
+
+def print_report(report):
+    for flow in report["flows"]:
+        print_flow(flow)
+    print_summary(report)
+
+
+def print_summary(report):
+    print(f"\n{report['packets']} packets, {report['decoded']} TCP/UDP, {report['flow_count']} flows")
+
+
+def print_flow(flow):
+    up, down = flow["client_to_server"], flow["server_to_client"]
+    print(f"\n{flow['proto']} {flow['client']} -> {flow['server']}, {flow['duration']:.3f}s")
+    for name, stats in (("up", up), ("down", down)):
+        line = f"  {name}: {stats['packets']} packets, {stats['bytes']} bytes"
+        if stats["throughput_bps"]:
+            line += f", {stats['throughput_bps'] / 1e3:.1f} kbit/s"
+        if "retransmissions" in stats:
+            line += f", {stats['retransmissions']} retransmissions, content: {stats['content'] or '-'}"
+        if "decode_error" in stats:
+            line += f", decode error: {stats['decode_error']}"
+        print(line)
+        if "lab2" in stats:
+            lab2 = stats["lab2"]
+            print(f"  {name} lab2 stream: {lab2['received']} received, {lab2['lost']} lost, "
+                  f"{lab2['out_of_order']} out of order, {lab2['duplicates']} duplicates")
+    rtt = flow.get("rtt")
+    if rtt and rtt["samples"]:
+        print(f"  RTT: {rtt['samples']} samples, min/mean/max "
+              f"{rtt['min'] * 1e3:.2f}/{rtt['mean'] * 1e3:.2f}/{rtt['max'] * 1e3:.2f}ms")
+    for exchange in flow.get("http_exchanges", []):
+        line = f"  HTTP {exchange.get('method', '?')} {exchange.get('host', '')}{exchange.get('target', '')}"
+        line += f" -> {exchange['status']}, {exchange['body_bytes']} bytes"
+        if "time_to_first_byte" in exchange:
+            line += f", first byte {exchange['time_to_first_byte'] * 1e3:.1f}ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else ROOT / "lab1" / "B" / "capture.pcapng"
+    # stream flow reports as flows finish, nothing is kept
+    print_summary(CaptureAnalyzer().analyze(path, print_flow))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import ipaddress
+import struct
+from reader import LINKTYPE_NULL, LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL, LINKTYPE_LINUX_SLL2
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+PROTO_TCP = 6
+PROTO_UDP = 17
+IPV6_EXTENSIONS = (0, 43, 60)   # hop-by-hop, routing, destination options
+IPV6_FRAGMENT = 44
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+
+class Packet:
+    """ Decoded TCP or UDP packet.
+        Addresses are packed bytes (see address()), payload is a
+        memoryview into the capture, cut at the IP length so link layer
+        padding is not included. seq, ack and flags are TCP only. """
+
+    __slots__ = ("time", "proto", "src", "dst", "sport", "dport", "seq", "ack", "flags", "payload")
+
+    def __init__(self, time, proto, src, dst, sport, dport, seq, ack, flags, payload):
+        self.time = time
+        self.proto = proto
+        self.src = src
+        self.dst = dst
+        self.sport = sport
+        self.dport = dport
+        self.seq = seq
+        self.ack = ack
+        self.flags = flags
+        self.payload = payload
+
+
+def address(packed):
+    """ Printable IPv4 or IPv6 address """
+    return str(ipaddress.ip_address(bytes(packed)))
+
+
+def decode(time, linktype, data):
+    """ Decode link, IP and TCP/UDP headers, return Packet,
+        or None for other protocols, non-first fragments and truncated packets """
+    ethertype, offset = _link(linktype, data)
+    if ethertype == ETHERTYPE_IPV4:
+        return _ipv4(time, data, offset)
+    if ethertype == ETHERTYPE_IPV6:
+        return _ipv6(time, data, offset)
+    return None
+
+
+def _link(linktype, data):
+    """ (ethertype, offset of IP header) """
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None, 0
+        ethertype = struct.unpack_from("!H", data, 12)[0]
+        offset = 14
+        while ethertype in ETHERTYPE_VLAN and len(data) >= offset + 4:
+            ethertype = struct.unpack_from("!H", data, offset + 2)[0]
+            offset += 4
+        return ethertype, offset
+    if linktype == LINKTYPE_RAW:
+        version = data[0] >> 4 if data else 0
+        return {4: ETHERTYPE_IPV4, 6: ETHERTYPE_IPV6}.get(version), 0
+    if linktype == LINKTYPE_NULL:
+        # address family in host byte order of the capturing machine
+        if len(data) < 4:
+            return None, 0
+        family = data[0] or data[3]
+        return (ETHERTYPE_IPV4 if family == 2 else ETHERTYPE_IPV6 if family in (10, 24, 28, 30) else None), 4
+    if linktype == LINKTYPE_LINUX_SLL:
+        return (struct.unpack_from("!H", data, 14)[0] if len(data) >= 16 else None), 16
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return (struct.unpack_from("!H", data, 0)[0] if len(data) >= 20 else None), 20
+    return None, 0
+
+
+def _ipv4(time, data, offset):
+    if len(data) < offset + 20:
+        return None
+    ihl = (data[offset] & 0x0F) * 4
+    total_length, fragment = struct.unpack_from("!HxxH", data, offset + 2)
+    if fragment & 0x1FFF:
+        return None     # not first fragment, no transport header
+    proto = data[offset + 9]
+    src = data[offset + 12:offset + 16]
+    dst = data[offset + 16:offset + 20]
+    end = min(offset + total_length, len(data)) if total_length else len(data)     # 0 with TSO
+    return _transport(time, proto, src, dst, data, offset + ihl, end)
+
+
+def _ipv6(time, data, offset):
+    if len(data) < offset + 40:
+        return None
+    payload_length = struct.unpack_from("!H", data, offset + 4)[0]
+    proto = data[offset + 6]
+    src = data[offset + 8:offset + 24]
+    dst = data[offset + 24:offset + 40]
+    end = min(offset + 40 + payload_length, len(data)) if payload_length else len(data)
+    offset += 40
+    while proto in IPV6_EXTENSIONS or proto == IPV6_FRAGMENT:
+        if len(data) < offset + 8:
+            return None
+        if proto == IPV6_FRAGMENT:
+            if struct.unpack_from("!H", data, offset + 2)[0] & 0xFFF8:
+                return None     # not first fragment
+            proto, offset = data[offset], offset + 8
+        else:
+            proto, offset = data[offset], offset + (data[offset + 1] + 1) * 8
+    return _transport(time, proto, src, dst, data, offset, end)
+
+
+def _transport(time, proto, src, dst, data, offset, end):
+    if proto == PROTO_TCP:
+        if end < offset + 20:
+            return None
+        sport, dport, seq, ack, offset_flags = struct.unpack_from("!HHIIH", data, offset)
+        header = (offset_flags >> 12) * 4
+        return Packet(time, "tcp", src, dst, sport, dport, seq, ack, offset_flags & 0x3F,
+                      data[offset + header:end])
+    if proto == PROTO_UDP:
+        if end < offset + 8:
+            return None
+        sport, dport, length = struct.unpack_from("!HHH", data, offset)
+        end = min(end, offset + length) if length >= 8 else end
+        return Packet(time, "udp", src, dst, sport, dport, None, None, None, data[offset + 8:end])
+    return None
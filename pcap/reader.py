@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import mmap
+import struct
+
+# Link types (https://www.tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),   # little endian, microseconds
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),   # nanoseconds
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+PCAPNG_IDB = 1
+PCAPNG_PB = 2       # obsolete packet block
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+PCAPNG_TSRESOL = 9  # interface option
+
+
+class CaptureReader:
+    """ pcap and pcapng reader.
+        Memory maps the capture and yields packets lazily as
+        (timestamp, link type, data), with data a memoryview into the map,
+        so nothing is copied and memory use does not grow with file size.
+        Views must not be kept after close(). """
+
+    def __init__(self, path):
+        """ Open and map capture file, detect format """
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic = bytes(self._view[:4])
+        if magic == PCAPNG_SHB:
+            self._format = "pcapng"
+        elif magic in PCAP_MAGIC:
+            self._format = "pcap"
+        else:
+            self.close()
+            raise ValueError(f"Not a pcap or pcapng file: {path}")
+
+    def get_format(self):
+        return self._format
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        if self._format == "pcap":
+            return self._read_pcap()
+        return self._read_pcapng()
+
+    def close(self):
+        """ Unmap and close file """
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        try:
+            self._map.close()
+        except BufferError:
+            pass    # packet views still referenced, unmapped when collected
+        self._file.close()
+
+    def _read_pcap(self):
+        view = self._view
+        order, resolution = PCAP_MAGIC[bytes(view[:4])]
+        header = struct.Struct(order + "IIII")
+        linktype = struct.unpack_from(order + "I", view, 20)[0] & 0x0FFFFFFF
+        offset = 24
+        end = len(view)
+        while offset + header.size <= end:
+            seconds, fraction, captured, _ = header.unpack_from(view, offset)
+            offset += header.size
+            if offset + captured > end:
+                return  # truncated last packet
+            yield seconds + fraction * resolution, linktype, view[offset:offset + captured]
+            offset += captured
+
+    def _read_pcapng(self):
+        view = self._view
+        end = len(view)
+        offset = 0
+        order = "<"
+        interfaces = []     # (link type, timestamp resolution) per interface id
+
+        while offset + 12 <= end:
+            if bytes(view[offset:offset + 4]) == PCAPNG_SHB:
+                # section header, byte order magic tells the endianness of the section
+                order = "<" if bytes(view[offset + 8:offset + 12]) == b"\x4d\x3c\x2b\x1a" else ">"
+                interfaces = []
+            block_type, length = struct.unpack_from(order + "II", view, offset)
+            if length < 12 or offset + length > end:
+                return  # truncated or corrupt
+            body = offset + 8
+
+            if block_type == PCAPNG_IDB:
+                linktype = struct.unpack_from(order + "H", view, body)[0]
+                interfaces.append((linktype, self._tsresol(view, order, body + 8, offset + length - 4)))
+            elif block_type == PCAPNG_EPB:
+                interface, high, low, captured = struct.unpack_from(order + "IIII", view, body)
+                linktype, resolution = interfaces[interface]
+                data = body + 20
+                yield ((high << 32) | low) * resolution, linktype, view[data:data + captured]
+            elif block_type == PCAPNG_SPB:
+                original = struct.unpack_from(order + "I", view, body)[0]
+                linktype, _ = interfaces[0]
+                captured = min(original, length - 16)
+                yield None, linktype, view[body + 4:body + 4 + captured]
+            elif block_type == PCAPNG_PB:
+                interface, _, high, low, captured = struct.unpack_from(order + "HHIII", view, body)
+                linktype, resolution = interfaces[interface]
+                data = body + 20
+                yield ((high << 32) | low) * resolution, linktype, view[data:data + captured]
+
+            offset += length
+
+    def _tsresol(self, view, order, offset, end):
+        """ Timestamp resolution (seconds) from interface options, default microseconds """
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(order + "HH", view, offset)
+            if code == 0:
+                break
+            if code == PCAPNG_TSRESOL and length >= 1:
+                value = view[offset + 4]
+                return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+            offset += 4 + (length + 3) // 4 * 4
+        return 1e-6
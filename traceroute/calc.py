@@ -1,17 +1,38 @@
-import numpy as np
+from pathlib import Path
+from tracert_parser import load_traces
 
-sv1 = [34, 33, 33]
-sv2 = [216, 31, 112]
-sv3 = [32, 29, 29]
+def print_run_stats(traces):
+    """ End to end RTT (destination hop) of each run """
+    run_stats = traces.run_stats()
+    print("Mean | Std:")
+    for name, mean, std in zip(traces.names, run_stats["mean"], run_stats["std"]):
+        print(f"{name}: {mean:.2f} | {std:.2f}")
 
-jp1 = [249, 249, 259]
-jp2 = [251, 249, 250]
-jp3 = [252, 250, 249]
 
-print("Mean | Std:")
-print(f"sv1: {np.mean(sv1):.2f} | {np.std(sv1, ddof=1):.2f}")
-print(f"sv2: {np.mean(sv2):.2f} | {np.std(sv2, ddof=1):.2f}")
-print(f"sv3: {np.mean(sv3):.2f} | {np.std(sv3, ddof=1):.2f}")
-print(f"jp1: {np.mean(jp1):.2f} | {np.std(jp1, ddof=1):.2f}")
-print(f"jp2: {np.mean(jp2):.2f} | {np.std(jp2, ddof=1):.2f}")
-print(f"jp3: {np.mean(jp3):.2f} | {np.std(jp3, ddof=1):.2f}")
+def print_hop_stats(group, runs):
+    """ Per hop and end to end statistics over all runs to one destination """
+    print(f"\n{group}: hop | mean | std | p50 | p90 | loss")
+    hop_stats = runs.hop_stats()
+    for hop in range(runs.lengths.max()):
+        print(f"{hop + 1:3d} | {hop_stats['mean'][hop]:7.2f} | {hop_stats['std'][hop]:7.2f} | "
+              f"{hop_stats['p50'][hop]:7.2f} | {hop_stats['p90'][hop]:7.2f} | {hop_stats['loss'][hop]:.0%}")
+
+    total = runs.end_to_end_stats()
+    print(f"{group} end to end: {total['mean']:.2f} | {total['std']:.2f}, "
+          f"p99 {total['p99']:.2f}, loss {total['loss']:.0%}")
+
+
+if __name__ == "__main__":
+    # tracert output of three runs each, to Sweden (sv) and Japan (jp)
+    directory = Path(__file__).parent
+    groups = {
+        "sv": sorted(directory.glob("sv*.txt")),
+        "jp": sorted(directory.glob("jp*.txt")),
+    }
+    traces = load_traces(groups["sv"] + groups["jp"])
+
+    print_run_stats(traces)
+    start = 0
+    for group, paths in groups.items():
+        print_hop_stats(group, traces.select(slice(start, start + len(paths))))
+        start += len(paths)
@@ -0,0 +1,194 @@
+import selectors
+from socket import (
+    socket, gethostbyname, inet_ntoa, AF_INET, SOCK_DGRAM, SOCK_RAW,
+    IPPROTO_ICMP, IPPROTO_IP, IP_TTL
+)
+import struct
+import time
+import numpy as np
+from tracert_parser import TraceRuns
+
+ICMP_TIME_EXCEEDED = 11
+ICMP_UNREACHABLE = 3
+ICMP_PORT_UNREACHABLE = 3   # code, the destination itself answered
+UDP = 17
+
+
+def _raw_icmp_socket():
+    """ Default ICMP socket, needs root or CAP_NET_RAW """
+    return socket(AF_INET, SOCK_RAW, IPPROTO_ICMP)
+
+
+def parse_icmp(packet):
+    """ Parse an IPv4 packet with an ICMP error quoting a UDP probe.
+        Return (router, icmp type, icmp code, probe destination, source port,
+        destination port), or None if it is not such a packet """
+    if len(packet) < 20 or packet[0] >> 4 != 4:
+        return None
+    ihl = (packet[0] & 0x0F) * 4
+    if ihl < 20 or len(packet) < ihl + 8:
+        return None     # invalid header length, or truncated ICMP header
+    router = inet_ntoa(packet[12:16])
+    icmp_type, icmp_code = packet[ihl], packet[ihl + 1]
+    if icmp_type not in (ICMP_TIME_EXCEEDED, ICMP_UNREACHABLE):
+        return None
+
+    inner = ihl + 8     # quoted IP header after the ICMP header
+    if len(packet) < inner + 20:
+        return None
+    inner_ihl = (packet[inner] & 0x0F) * 4
+    if inner_ihl < 20 or packet[inner + 9] != UDP or len(packet) < inner + inner_ihl + 4:
+        return None
+    destination = inet_ntoa(packet[inner + 16:inner + 20])
+    sport, dport = struct.unpack_from("!HH", packet, inner + inner_ihl)
+    return router, icmp_type, icmp_code, destination, sport, dport
+
+
+class Prober:
+    """ Parallel UDP traceroute.
+        Sends the probes for all TTLs, to all destinations, at once
+        (TTL set with IP_TTL), and matches the ICMP replies read from
+        a non-blocking raw socket to probes by the quoted UDP ports.
+        The destination port of a probe tells its TTL and probe number,
+        the source port its destination.
+        Results are a TraceRuns, like those parsed from tracert files. """
+
+    def __init__(self):
+        """ Set defaults """
+        self._max_hops = 30
+        self._probes = 3
+        self._timeout = 2.0         # seconds to wait for replies after the last probe
+        self._send_interval = 0.0   # seconds between probes, routers rate limit ICMP
+        self._base_port = 33434
+        self._icmp_socket_factory = _raw_icmp_socket
+        self._recv_size = 2048
+
+    def set_max_hops(self, hops):
+        self._max_hops = hops
+        return self
+
+    def set_probes(self, probes):
+        """ Probes per TTL """
+        self._probes = probes
+        return self
+
+    def set_timeout(self, timeout):
+        self._timeout = timeout     # seconds
+        return self
+
+    def set_send_interval(self, interval):
+        self._send_interval = interval  # seconds
+        return self
+
+    def set_base_port(self, port):
+        self._base_port = port
+        return self
+
+    def set_icmp_socket_factory(self, factory):
+        """ Function returning the socket ICMP packets are read from.
+            Each datagram must be one IPv4 packet, like a raw socket reads,
+            so use a datagram socket pair, socketpair(AF_UNIX, SOCK_DGRAM),
+            not a stream one, which merges them. See SimulatedNetwork
+            (simulator.py) to run without raw sockets or a network """
+        self._icmp_socket_factory = factory
+        return self
+
+    def run(self, destinations):
+        """ Trace route to all destinations in parallel, return TraceRuns.
+            Hops that did not answer are nan, hops past the destination are cut """
+        addresses = [gethostbyname(destination) for destination in destinations]
+        shape = (len(addresses), self._max_hops, self._probes)
+        sent = np.full(shape, np.nan)
+        rtts = np.full(shape, np.nan)
+        hosts = [[""] * self._max_hops for _ in addresses]
+        reached = np.full(len(addresses), self._max_hops + 1)   # TTL of destination reply
+
+        icmp = self._icmp_socket_factory()
+        icmp.setblocking(False)
+        selector = selectors.DefaultSelector()
+        selector.register(icmp, selectors.EVENT_READ)
+        senders = [socket(AF_INET, SOCK_DGRAM) for _ in addresses]
+        ports = {}      # source port -> destination index
+        for index, sender in enumerate(senders):
+            sender.bind(("", 0))
+            ports[sender.getsockname()[1]] = index
+
+        def on_reply(packet, received):
+            parsed = parse_icmp(packet)
+            if parsed is None:
+                return
+            router, icmp_type, icmp_code, destination, sport, dport = parsed
+            index = ports.get(sport)
+            number = dport - self._base_port
+            if index is None or addresses[index] != destination or not 0 <= number < self._max_hops * self._probes:
+                return  # not one of our probes
+            ttl, probe = divmod(number, self._probes)
+            rtts[index, ttl, probe] = (received - sent[index, ttl, probe]) * 1000
+            hosts[index][ttl] = router
+            if icmp_type == ICMP_UNREACHABLE and icmp_code == ICMP_PORT_UNREACHABLE:
+                reached[index] = min(reached[index], ttl + 1)
+
+        def drain():
+            while True:
+                try:
+                    packet = icmp.recv(self._recv_size)
+                except (BlockingIOError, InterruptedError):
+                    return
+                on_reply(packet, time.perf_counter())
+
+        try:
+            # probe round by round, so each router sees one probe per round
+            for probe in range(self._probes):
+                for ttl in range(1, self._max_hops + 1):
+                    for index, (address, sender) in enumerate(zip(addresses, senders)):
+                        if ttl > reached[index]:
+                            continue    # destination already answered closer
+                        sender.setsockopt(IPPROTO_IP, IP_TTL, ttl)
+                        port = self._base_port + (ttl - 1) * self._probes + probe
+                        sent[index, ttl - 1, probe] = time.perf_counter()
+                        sender.sendto(b"\0" * 32, (address, port))
+                    drain()
+                    if self._send_interval:
+                        time.sleep(self._send_interval)
+
+            deadline = time.perf_counter() + self._timeout
+            while not self._done(rtts, reached):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                if selector.select(remaining):
+                    drain()
+        finally:
+            selector.close()
+            icmp.close()
+            for sender in senders:
+                sender.close()
+
+        return self._trace_runs(rtts, reached, destinations, hosts)
+
+    def _done(self, rtts, reached):
+        """ True if every probe up to each destination hop has an answer """
+        answered = ~np.isnan(rtts)
+        needed = np.arange(self._max_hops)[np.newaxis, :, np.newaxis] < reached[:, np.newaxis, np.newaxis]
+        return bool(np.all(answered | ~needed)) and bool(np.all(reached <= self._max_hops))
+
+    def _trace_runs(self, rtts, reached, destinations, hosts):
+        """ Cut hops past each destination, like tracert stops there """
+        lengths = np.minimum(reached, self._max_hops)
+        rtts[np.arange(self._max_hops)[np.newaxis, :] >= lengths[:, np.newaxis]] = np.nan
+        hops = int(lengths.max()) if len(lengths) else 0
+        hosts = [run_hosts[:length] + [""] * (hops - length) for run_hosts, length in zip(hosts, lengths)]
+        return TraceRuns(rtts[:, :hops], lengths, list(destinations), hosts)
+
+
+if __name__ == "__main__":
+    from calc import print_run_stats, print_hop_stats
+
+    # Needs root (raw ICMP socket)
+    destinations = ["www.squarespace.com", "www.conoha.jp"]
+    prober = Prober()
+    prober.set_send_interval(0.01)
+    traces = prober.run(destinations)
+    print_run_stats(traces)
+    for index, destination in enumerate(destinations):
+        print_hop_stats(destination, traces.select([index]))
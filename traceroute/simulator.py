@@ -0,0 +1,160 @@
+import heapq
+import selectors
+import socket as socket_module
+from socket import (
+    socket, socketpair, inet_aton, AF_INET, AF_UNIX, SOCK_DGRAM,
+    IPPROTO_IP, IP_TTL, SOL_SOCKET, SO_REUSEADDR
+)
+import struct
+import threading
+import time
+from prober import ICMP_TIME_EXCEEDED, ICMP_UNREACHABLE, ICMP_PORT_UNREACHABLE, UDP
+
+# Linux values, not exported by every Python build
+IP_RECVTTL = getattr(socket_module, "IP_RECVTTL", 12)
+IP_PKTINFO = getattr(socket_module, "IP_PKTINFO", 8)
+PROTO_ICMP = 1
+
+
+def icmp_error(router, icmp_type, icmp_code, source, destination, sport, dport):
+    """ IPv4 packet from router with an ICMP error quoting a UDP probe,
+        as a raw ICMP socket reads it (IP header included) """
+    inner = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 28, 0, 0, 1, UDP, 0, inet_aton(source), inet_aton(destination))
+    inner += struct.pack("!HHHH", sport, dport, 8, 0)
+    icmp = struct.pack("!BBHI", icmp_type, icmp_code, 0, 0) + inner
+    outer = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(icmp), 0, 0, 64, PROTO_ICMP, 0,
+                        inet_aton(router), inet_aton(destination))
+    return outer + icmp
+
+
+class SimulatedNetwork:
+    """ Fake routers for Prober, on loopback, without raw sockets.
+        Listens on the probe ports for UDP probes to 127.0.0.0/8
+        destinations, reads their TTL (IP_RECVTTL, loopback does not
+        decrement it) and destination (IP_PKTINFO), and answers like the
+        routers of a route would: Time Exceeded from the router at the
+        TTL, Port Unreachable from the destination, after the hop's delay.
+        Replies are written to one end of an AF_UNIX datagram socket pair,
+        the other end replaces the raw ICMP socket (see socket()).
+        Linux only. """
+
+    def __init__(self, routes, base_port=33434, ports=90):
+        """ Set routes, {destination: [(router or None if silent, delay in seconds), ...]}
+            with the destination as the last hop, and the probe port range """
+        self._routes = routes
+        self._base_port = base_port
+        self._ports = ports
+        self._listeners = []
+        self._replies = None        # (prober end, responder end)
+        self._scheduled = []        # heap of (due time, number, packet)
+        self._thread = None
+        self._stopped = False
+        self._probes = 0
+
+    def start(self):
+        for port in range(self._base_port, self._base_port + self._ports):
+            listener = socket(AF_INET, SOCK_DGRAM)
+            listener.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            listener.setsockopt(IPPROTO_IP, IP_RECVTTL, 1)
+            listener.setsockopt(IPPROTO_IP, IP_PKTINFO, 1)
+            listener.bind(("", port))
+            listener.setblocking(False)
+            self._listeners.append(listener)
+        self._replies = socketpair(AF_UNIX, SOCK_DGRAM)
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def socket(self):
+        """ Socket to read ICMP replies from, for Prober.set_icmp_socket_factory.
+            Prober closes it after run(), so a network serves one run """
+        return self._replies[0]
+
+    def stop(self):
+        self._stopped = True
+        self._thread.join()
+        for listener in self._listeners:
+            listener.close()
+        self._replies[1].close()
+
+    def get_probes(self):
+        return self._probes
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        for listener in self._listeners:
+            selector.register(listener, selectors.EVENT_READ)
+        try:
+            while not self._stopped:
+                timeout = 0.05
+                if self._scheduled:
+                    timeout = min(timeout, max(self._scheduled[0][0] - time.perf_counter(), 0))
+                for key, _ in selector.select(timeout):
+                    self._on_probe(key.fileobj)
+                now = time.perf_counter()
+                while self._scheduled and self._scheduled[0][0] <= now:
+                    self._replies[1].send(heapq.heappop(self._scheduled)[2])
+        finally:
+            selector.close()
+
+    def _on_probe(self, listener):
+        received = time.perf_counter()
+        _, ancillary, _, (source, sport) = listener.recvmsg(64, 256)
+        ttl = destination = None
+        for level, kind, data in ancillary:
+            if level == IPPROTO_IP and kind == IP_TTL:
+                ttl = struct.unpack("i", data[:4])[0]
+            elif level == IPPROTO_IP and kind == IP_PKTINFO:
+                destination = ".".join(str(byte) for byte in data[8:12])   # ipi_addr
+        self._probes += 1
+        route = self._routes.get(destination)
+        if not route or ttl is None or ttl > len(route):
+            return
+        router, delay = route[ttl - 1]
+        if router is None:
+            return      # silent router, probe times out
+        if ttl == len(route):
+            icmp_type, icmp_code = ICMP_UNREACHABLE, ICMP_PORT_UNREACHABLE
+        else:
+            icmp_type, icmp_code = ICMP_TIME_EXCEEDED, 0
+        packet = icmp_error(router, icmp_type, icmp_code, source, destination, sport, listener.getsockname()[1])
+        heapq.heappush(self._scheduled, (received + delay, self._probes, packet))
+
+
+if __name__ == "__main__":
+    # Self check of Prober and parse_icmp against a simulated network
+    import numpy as np
+    from calc import print_hop_stats
+    from prober import Prober, parse_icmp
+
+    packet = icmp_error("10.0.0.1", ICMP_TIME_EXCEEDED, 0, "127.0.0.1", "127.0.0.2", 40000, 33500)
+    assert parse_icmp(packet) == ("10.0.0.1", ICMP_TIME_EXCEEDED, 0, "127.0.0.2", 40000, 33500)
+    packet = icmp_error("127.0.0.2", ICMP_UNREACHABLE, ICMP_PORT_UNREACHABLE, "127.0.0.1", "127.0.0.2", 1, 2)
+    assert parse_icmp(packet)[1:3] == (ICMP_UNREACHABLE, ICMP_PORT_UNREACHABLE)
+    assert parse_icmp(packet[:40]) is None, "truncated quote accepted"
+    assert parse_icmp(packet[:22]) is None, "truncated ICMP header accepted"
+    assert parse_icmp(bytes([0x4F]) + packet[1:40]) is None, "header length past the end accepted"
+
+    routes = {
+        "127.0.0.2": [("10.0.0.1", 0.005), ("10.0.1.1", 0.010), ("127.0.0.2", 0.020)],
+        "127.0.0.3": [("10.0.0.1", 0.005), (None, 0), ("10.0.2.1", 0.015), ("10.0.2.2", 0.025), ("127.0.0.3", 0.030)],
+    }
+    base_port = 43434
+    network = SimulatedNetwork(routes, base_port, ports=10 * 3).start()
+    prober = Prober().set_max_hops(10).set_probes(3).set_timeout(0.5).set_base_port(base_port)
+    prober.set_icmp_socket_factory(network.socket)
+    traces = prober.run(list(routes))
+    network.stop()
+
+    for index, (destination, route) in enumerate(routes.items()):
+        assert traces.lengths[index] == len(route), f"{destination}: {traces.lengths[index]} hops"
+        for hop, (router, delay) in enumerate(route):
+            rtts = traces.rtts[index, hop]
+            if router is None:
+                assert np.all(np.isnan(rtts)), f"{destination} hop {hop + 1} answered"
+                continue
+            assert traces.hosts[index][hop] == router, f"{destination} hop {hop + 1}: {traces.hosts[index][hop]}"
+            assert np.all(np.abs(rtts - delay * 1000) < 10), f"{destination} hop {hop + 1}: {rtts}ms"
+        print_hop_stats(destination, traces.select([index]))
+    print(f"{network.get_probes()} probes received, all checks passed")
@@ -0,0 +1,125 @@
+from pathlib import Path
+import re
+import warnings
+import numpy as np
+
+# ' 11     *      238 ms   225 ms  sto4-er1.se.as8473.net [85.24.220.17]'
+HOP_LINE = re.compile(r"^\s*(\d+)\s+((?:(?:<?\d+\s*ms|\*)\s*)+)(.*)$")
+PROBE = re.compile(r"(<)?(\d+)\s*ms|\*")
+
+
+def parse_tracert(lines):
+    """ Parse Windows tracert output.
+        Return list of (hop, rtts, host), rtts in ms with nan for timeouts.
+        Header, footer and blank lines are skipped """
+    hops = []
+    for line in lines:
+        match = HOP_LINE.match(line)
+        if not match:
+            continue
+        hop, probes, host = match.groups()
+        rtts = []
+        for probe in PROBE.finditer(probes):
+            if probe.group(0) == "*":
+                rtts.append(np.nan)
+                continue
+            rtt = float(probe.group(2))
+            if probe.group(1):
+                # '<1 ms' (the only bound tracert prints) says the RTT is
+                # somewhere in [0, 1) ms, take the middle: 0.5 ms
+                rtt /= 2
+            rtts.append(rtt)
+        hops.append((int(hop), rtts, host.strip()))
+    return hops
+
+
+class TraceRuns:
+    """ RTTs of many traceroute runs, in an array of shape (runs, hops, probes).
+        Lost probes, and hops past the end of shorter runs, are nan.
+        lengths holds the number of hops of each run, so the destination
+        of run i is hop lengths[i] - 1. """
+
+    def __init__(self, rtts, lengths, names=None, hosts=None):
+        """ Set RTT array, hops per run, and optional run names and hop hosts """
+        self.rtts = rtts
+        self.lengths = lengths
+        self.names = names or [str(index) for index in range(len(rtts))]
+        self.hosts = hosts or [[] for _ in range(len(rtts))]
+
+    def select(self, runs):
+        """ TraceRuns with a subset of runs (index array, slice or boolean mask) """
+        indices = np.arange(len(self.rtts))[runs]
+        return TraceRuns(
+            self.rtts[indices],
+            self.lengths[indices],
+            [self.names[index] for index in indices],
+            [self.hosts[index] for index in indices]
+        )
+
+    def final_hops(self):
+        """ RTTs of the destination hop of each run, shape (runs, probes) """
+        return self.rtts[np.arange(len(self.rtts)), np.maximum(self.lengths - 1, 0)]
+
+    def hop_stats(self, percentiles=(50, 90, 99)):
+        """ Statistics per hop over all runs and probes, arrays of shape (hops,) """
+        return _stats(self.rtts.transpose(1, 0, 2).reshape(self.rtts.shape[1], -1), percentiles, self._hop_counts())
+
+    def run_stats(self, percentiles=(50, 90, 99)):
+        """ End to end statistics per run (destination hop probes), arrays of shape (runs,) """
+        return _stats(self.final_hops(), percentiles)
+
+    def end_to_end_stats(self, percentiles=(50, 90, 99)):
+        """ End to end statistics over all runs, as scalars """
+        stats = _stats(self.final_hops().reshape(1, -1), percentiles)
+        return {name: value[0] for name, value in stats.items()}
+
+    def _hop_counts(self):
+        """ Probes sent per hop (runs that reached it times probes) """
+        reached = self.lengths[:, np.newaxis] > np.arange(self.rtts.shape[1])
+        return reached.sum(axis=0) * self.rtts.shape[2]
+
+
+def _stats(samples, percentiles, sent=None):
+    """ Statistics per row of a 2D array with nan for losses.
+        sent is the number of probes per row (default row length) """
+    received = np.count_nonzero(~np.isnan(samples), axis=1)
+    if sent is None:
+        sent = np.full(len(samples), samples.shape[1])
+    with warnings.catch_warnings():
+        # rows with no replies give nan, without a warning per row
+        warnings.simplefilter("ignore", RuntimeWarning)
+        stats = {
+            "mean": np.nanmean(samples, axis=1),
+            "std": np.nanstd(samples, axis=1, ddof=1),
+            "min": np.nanmin(samples, axis=1),
+            "max": np.nanmax(samples, axis=1),
+        }
+        for p, values in zip(percentiles, np.nanpercentile(samples, percentiles, axis=1)):
+            stats[f"p{p}"] = values
+        stats["loss"] = np.where(sent > 0, 1 - received / np.maximum(sent, 1), np.nan)
+    return stats
+
+
+def load_traces(paths, probes=3):
+    """ Parse tracert files into one TraceRuns, runs in the order of paths
+        and named by file name without suffix """
+    parsed = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as file:
+            parsed.append(parse_tracert(file))
+
+    hops = max((hop for run in parsed for hop, _, _ in run), default=0)
+    rtts = np.full((len(parsed), hops, probes), np.nan)
+    lengths = np.zeros(len(parsed), dtype=int)
+    hosts = []
+    for index, run in enumerate(parsed):
+        run_hosts = [""] * hops
+        for hop, values, host in run:
+            values = values[:probes]
+            rtts[index, hop - 1, :len(values)] = values
+            run_hosts[hop - 1] = host
+        lengths[index] = max((hop for hop, _, _ in run), default=0)
+        hosts.append(run_hosts)
+
+    names = [Path(path).stem for path in paths]
+    return TraceRuns(rtts, lengths, names, hosts)